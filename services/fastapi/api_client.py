@@ -0,0 +1,187 @@
+"""
+Module of async client of FastAPI application for Telegram Bot.
+All calls share one pooled HTTP client with keep-alive connections.
+"""
+import os
+import json
+import time
+import logging
+from typing import List, Tuple, TypedDict, AsyncIterator
+import httpx
+
+from metrics import FASTAPI_LATENCY, observe
+
+
+class RepoRecord(TypedDict):
+    """
+    Repo of user with its latest release.
+    """
+    user_id: int
+    owner: str
+    repo_name: str
+    repo_uri: str
+    release: str
+    release_date: str
+
+
+class SubscriptionsPageRecord(TypedDict):
+    """
+    Page of subscriptions of user with cursors of next and previous pages.
+    """
+    repos: List[RepoRecord]
+    next: int | None
+    prev: int | None
+
+
+class IngestJobRepoRecord(TypedDict):
+    """
+    Progress of one repo in job of addition subscriptions.
+    """
+    owner: str
+    repo_name: str
+    status: str
+    release: str | None
+
+
+class IngestJobRecord(TypedDict):
+    """
+    Job of addition subscriptions.
+    """
+    job_id: str
+    user_id: int
+    status: str
+    total: int
+    done: int
+    repos: List[IngestJobRepoRecord]
+
+
+class FastAPIClient:
+    """
+    Typed wrapper around endpoints of FastAPI application.
+    Methods return None or False if request failed, so handlers of bot can answer user about error.
+    """
+    def __init__(self, base_uri: str = None,
+                 timeout: float = None,
+                 connect_timeout: float = None,
+                 max_connections: int = None):
+        """
+        :param base_uri: URI of FastAPI, env FASTAPI_URI by default
+        :param timeout: timeout of read response, env FASTAPI_TIMEOUT by default
+        :param connect_timeout: timeout of connect, env FASTAPI_CONNECT_TIMEOUT by default
+        :param max_connections: size of pool of connections, env FASTAPI_MAX_CONNECTIONS by default
+        """
+        base_uri = base_uri or os.environ.get('FASTAPI_URI', 'http://fastapi:8880')
+        if timeout is None:
+            timeout = float(os.environ.get('FASTAPI_TIMEOUT', 60))
+        if connect_timeout is None:
+            connect_timeout = float(os.environ.get('FASTAPI_CONNECT_TIMEOUT', 5))
+        if max_connections is None:
+            max_connections = int(os.environ.get('FASTAPI_MAX_CONNECTIONS', 50))
+        self.client = httpx.AsyncClient(base_url=base_uri,
+                                        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                                        limits=httpx.Limits(max_connections=max_connections,
+                                                            max_keepalive_connections=max_connections))
+
+    async def request(self, method: str, uri: str, expected: int, **kwargs) -> httpx.Response:
+        """
+        Send request to FastAPI.
+        :return: response if it has expected status code, else None
+        """
+        path = '/' + uri.strip('/').split('/')[0]
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, uri, **kwargs)
+            observe(FASTAPI_LATENCY, started, method, path, response.status_code)
+            if response.status_code == expected:
+                return response
+            logging.error('Wrong response of FastAPI %s %s: %s', method, uri, response.status_code)
+        except httpx.HTTPError as e:
+            observe(FASTAPI_LATENCY, started, method, path, 'error')
+            logging.error('Wrong request to FastAPI %s %s with error: %s', method, uri, e)
+        return None
+
+    async def add_user(self, user_id: int, username: str, first_name: str) -> bool:
+        """
+        Create user on first conversation with bot.
+        """
+        response = await self.request('POST', '/add_user', 201,
+                                      json={'user_id': user_id,
+                                            'username': username,
+                                            'first_name': first_name})
+        return response is not None
+
+    async def get_releases(self, user: int) -> List[RepoRecord] | None:
+        """
+        Get new releases of subscriptions of user.
+        """
+        response = await self.request('GET', f'/get_releases/{user}', 200)
+        return response.json() if response is not None else None
+
+    async def iter_releases(self, users: List[int] = None,
+                            hour: int = None,
+                            minute: int = None) -> AsyncIterator[Tuple[int, List[RepoRecord]]]:
+        """
+        Get new releases of many users by list of users or time of notifications.
+        Response is read by lines, so memory doesn't depend on size of wave.
+        :return: async iterator of tuple(user_id, releases) only for users with new releases
+        """
+        payload = {'users': users} if users is not None else {'hour': hour, 'minute': minute}
+        try:
+            async with self.client.stream('POST', '/get_releases', json=payload) as response:
+                if response.status_code != 200:
+                    logging.error('Wrong response of FastAPI POST /get_releases: %s',
+                                  response.status_code)
+                    return
+                async for line in response.aiter_lines():
+                    if line:
+                        releases = json.loads(line)
+                        yield releases['user_id'], releases['releases']
+        except httpx.HTTPError as e:
+            logging.error('Wrong request to FastAPI POST /get_releases with error: %s', e)
+
+    async def get_subscriptions_page(self, user: int, after: int = None, before: int = None,
+                                     limit: int = None) -> SubscriptionsPageRecord | None:
+        """
+        Get page of subscriptions of user after or before cursor of repo.
+        """
+        params = {key: value for key, value in
+                  (('after', after), ('before', before), ('limit', limit)) if value is not None}
+        response = await self.request('GET', f'/get_subscriptions/{user}/page', 200, params=params)
+        return response.json() if response is not None else None
+
+    async def add_repos(self, user: int, repos: List[Tuple[str, str]]) -> str | None:
+        """
+        Create job of addition subscriptions and return its id.
+        """
+        response = await self.request('POST', '/add_repos', 202,
+                                      json={'user_id': user, 'repos': repos})
+        return response.json()['job_id'] if response is not None else None
+
+    async def get_add_repos_job(self, job_id: str) -> IngestJobRecord | None:
+        """
+        Get progress of job of addition subscriptions.
+        """
+        response = await self.request('GET', f'/add_repos/{job_id}', 200)
+        return response.json() if response is not None else None
+
+    async def delete_subscriptions(self, user: int, repos_uri: List[str]) -> bool:
+        """
+        Delete subscriptions of user by list of repos.
+        """
+        response = await self.request('POST', '/delete_subscriptions', 200,
+                                      json={'user_id': user, 'repos': repos_uri})
+        return response is not None
+
+    async def delete_all_subscriptions(self, user: int) -> bool:
+        """
+        Delete all subscriptions of user.
+        """
+        response = await self.request('POST', '/delete_all_subscriptions', 200,
+                                      json={'user_id': user})
+        return response is not None
+
+    async def aclose(self) -> None:
+        """
+        Close all connections of pool.
+        """
+        await self.client.aclose()
@@ -3,85 +3,87 @@ Module for start FastAPI application.
 Manage databases for work bot and communication with users.
 """
 import logging
-from typing import List, Dict, Tuple, Literal
+from datetime import datetime as dt, timezone
+from typing import List, Dict, Literal
 import os
 import asyncio
-import json
 import uvicorn
 import click
 from starlette import status
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from getlogger import get_logger
 from database import Base, engine
 from database import sm as session_maker
-from querysets import UsersQueryset, ReposQueryset, SubscriptionsQueryset, NotificationsQueryset
-from schemas import UsersSchema, ReposSchema, SubscriptionsSchema, SubscriptionsByUserSchema
+from github_api import create_client
+from github_budget import GitHubBudgeter
+from release_poller import ReleasePoller
+from ingest import SubscriptionIngestor
+from cache import SubscriptionCache
+from leader import LeaderLease
+from metrics import LatencyMiddleware, render
+from migrations import run_migrations
+from responses import SUBSCRIPTION_KEYS, RELEASE_KEYS, JSONBytesResponse, dumps, rows_to_dicts
+from querysets import (UsersQueryset, ReposQueryset, ReposScheduleQueryset,
+                       SubscriptionsQueryset, NotificationsQueryset, IngestJobsQueryset,
+                       ReleasesQueryset)
+from schemas import (UsersSchema, SubscriptionsByUserSchema, SubscriptionsPageSchema,
+                     IngestJobSchema, ReleasesClaimSchema, ReleaseSourceSchema,
+                     ReleaseHistorySchema)
 
 
-def request_to_api_github(api_uri: str, logger: logging.Logger) -> Tuple[str, str]:
+async def check_releases(app: FastAPI, logger: logging.Logger) -> None:
     """
-    Send GET request to API GitHub for getting latest repository release.
-    Do 10 * 10 attempt get release info till don't get this
-    :param api_uri: URL of API GitHub.
+    Run check of releases for due repos by poller of application.
+    Only worker which holds leadership checks, so workers don't poll the same repos.
+    Leader also resumes jobs of addition subscriptions lost by restart of workers.
+    :param app: application FastAPI
     :param logger: logger
-    :return: tuple(release_number, release_data)
+    :return: None
     """
-    token = os.environ.get("GITHUB_API_TOKEN")
-
-    session = requests.Session()
-    retry = Retry(connect=10, backoff_factor=1)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-
-    new_release, new_release_date = None, None
+    if not await app.lease.acquire():
+        return
+    try:
+        await app.poller.check_releases()
+    except Exception as e:
+        logger.error('Wrong check releases with error: %s', e)
     try:
-        response = session.get(api_uri,
-                               timeout=10,
-                               headers={'Accept': 'application/vnd.github+json',
-                                        'Authorization': f'Bearer {token}',
-                                        'X-GitHub-Api-Version': '2022-11-28'})
-        if response.status_code == 200:
-            response = json.loads(response.text)
-            new_release = response['tag_name']
-            new_release_date = response['created_at']
-            logger.info(f'Success parse release info by api_uri: {api_uri}')
+        await app.ingestor.resume()
     except Exception as e:
-        logger.error(f"Wrong request API GitHub for api_uri: {api_uri}. Return error: {e}")
+        logger.error('Wrong resume jobs of addition subscriptions with error: %s', e)
 
-    return new_release, new_release_date
 
+PAGE_SIZE = int(os.environ.get('SUBSCRIPTIONS_PAGE_SIZE', 10))
+PAGE_SIZE_MAX = 100
+HISTORY_LIMIT = 100
+HISTORY_LIMIT_MAX = 1000
 
-async def check_releases(app: FastAPI, logger: logging.Logger) -> None:
+
+def to_utc(value: dt) -> dt:
     """
-    Select all data from table Repos and run getting info of release.
-    If repository has new release - do update in table Repos
-    and create new notification for users who have subscriptions.
-    :param app: application FastAPI
-    :param logger: logger
-    :return: None
+    Convert aware datetime to naive UTC like dates in database.
     """
-    async with app.session_maker.begin() as session:
-        select_all = await ReposQueryset.select_all(session)
-        for id_repo, uri, api_uri, owner, repo_name, _, release_date in select_all:
-            new_release, new_release_date = request_to_api_github(api_uri,
-                                                                  logger=logger)
-            if new_release and new_release_date:
-                keys_repo = ['uri', 'api_uri', 'owner',
-                             'repo_name', 'release', 'release_date']
-                values_repo = [uri, api_uri, owner, repo_name, new_release, new_release_date]
-                repo_as_dict = ReposSchema.model_validate(dict(zip(keys_repo,
-                                                                   values_repo))).model_dump()
-
-                if release_date < repo_as_dict['release_date']:
-                    await ReposQueryset.update(session, repo_as_dict)
-                    await NotificationsQueryset.create(session, id_repo)
-                    logger.info(f'Repo {repo_name}(by {owner}) was update success.')
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def page_cursors(ids: List[int], more: bool, after: int = None, before: int = None) -> Dict:
+    """
+    Cursors of next and previous pages of list of subscriptions.
+    Page read forward has next page if there are more repos and previous one if it isn't first,
+    page read backward always has next page and has previous one if there are more repos.
+    :param ids: id of repos of page in order of list
+    :param more: flag that there are more repos in direction of page
+    :param after: id of repo after which page starts
+    :param before: id of repo before which page ends
+    :return: dict with id of repo for after of next page and for before of previous page
+    """
+    return {'next': ids[-1] if ids and (before is not None or more) else None,
+            'prev': ids[0] if ids and (after is not None or before is not None and more)
+            else None}
 
 
 def create_app() -> FastAPI:
@@ -93,16 +95,28 @@ def create_app() -> FastAPI:
         async with app.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
             logger.info('Success connect to database and create tables.')
-        app.scheduler.start()
-        app.scheduler.add_job(check_releases, 'cron',
-                              day_of_week='mon-sun',
-                              hour=0, minute=0,
-                              args=[app, logger])
-        logger.info('Success create Job of parsing releases.')
+        await run_migrations(app.engine, logger)
+        await app.subscriptions_cache.start()
+        await app.ingestor.start()
+        if scheduling:
+            async with app.session_maker.begin() as session:
+                await ReposScheduleQueryset.create_missing(session, dt.utcnow())
+            app.scheduler.start()
+            app.scheduler.add_job(check_releases, 'interval',
+                                  seconds=int(os.environ.get('POLL_TICK_SECONDS', 60)),
+                                  coalesce=True, max_instances=1,
+                                  args=[app, logger])
+            logger.info('Success create Job of parsing releases.')
         logger.info('Startup FastAPI.')
 
         yield
 
+        if scheduling:
+            app.scheduler.shutdown(wait=False)
+            await app.lease.close()
+        await app.ingestor.stop()
+        await app.subscriptions_cache.stop()
+        await app.github.aclose()
         await app.engine.dispose()
         logger.info('Shutdown FastAPI.')
 
@@ -110,15 +124,34 @@ def create_app() -> FastAPI:
     debug = True
     if os.environ.get('FASTAPI_DEBUG') == 'on':
         debug = False
+    scheduling = os.environ.get('FASTAPI_SCHEDULER', 'off') == 'on'
     app = FastAPI(docs_url='/docs',
                   debug=debug,
                   lifespan=lifespan)
     app.engine = engine
     app.session_maker = session_maker
     app.scheduler = AsyncIOScheduler()
+    app.lease = LeaderLease(app.engine, logger)
+    app.github = create_client()
+    app.budgeter = GitHubBudgeter.from_env(logger)
+    app.subscriptions_cache = SubscriptionCache(app.engine, logger)
+    app.poller = ReleasePoller(app.session_maker, app.github, logger, budgeter=app.budgeter,
+                               cache=app.subscriptions_cache)
+    app.ingestor = SubscriptionIngestor(app.session_maker, app.poller, logger,
+                                        cache=app.subscriptions_cache)
 
     logger.info('Application FastAPI was created.')
 
+    app.add_middleware(LatencyMiddleware)
+
+    @app.get('/metrics', include_in_schema=False)
+    async def metrics():
+        """
+        Metrics of application in text format of Prometheus.
+        """
+        body, content_type = render()
+        return Response(body, media_type=content_type)
+
     @app.get('/get_releases/{user}', response_model=List[SubscriptionsByUserSchema])
     async def get_releases(request: Request, user: int):
         """
@@ -128,32 +161,128 @@ def create_app() -> FastAPI:
         try:
             async with request.app.session_maker.begin() as session:
                 res = await NotificationsQueryset.get_repos_by_user(session, user)
-                keys_subscriptions = ['user_id', 'owner', 'repo_name',
-                                      'repo_uri', 'release', 'release_date']
-                to_repo = SubscriptionsByUserSchema.model_validate
-                response = [to_repo(dict(zip(keys_subscriptions, repo))) for repo in res]
+                response = dumps(rows_to_dicts(res))
                 logger.info('Correct response new releases for user_id: %s', user)
-                return response
+                return JSONBytesResponse(response)
         except Exception as e:
             logger.info('Wrong send new releases for user_id %s with error: %s', user, e)
 
+    @app.post('/get_releases')
+    async def get_releases_bulk(request: Request, data: ReleasesClaimSchema):
+        """
+        Select and delete notifications of many users by list of users or time of notifications.
+        Response is streamed as NDJSON: one line {"user_id": ..., "releases": [...]} by user.
+        """
+        async def stream():
+            users = 0
+            async with request.app.session_maker.begin() as session:
+                if data.users is not None:
+                    rows = await NotificationsQueryset.claim_by_users(session, data.users)
+                else:
+                    rows = await NotificationsQueryset.claim_by_time(session,
+                                                                     data.hour, data.minute)
+                user_id, releases = None, []
+                async for row in rows:
+                    if row[0] != user_id and releases:
+                        yield dumps({'user_id': user_id, 'releases': releases}) + b'\n'
+                        users += 1
+                        releases = []
+                    user_id = row[0]
+                    releases.append(dict(zip(SUBSCRIPTION_KEYS, row)))
+                if releases:
+                    yield dumps({'user_id': user_id, 'releases': releases}) + b'\n'
+                    users += 1
+            logger.info('Correct response new releases for %s users.', users)
+
+        return StreamingResponse(stream(), media_type='application/x-ndjson')
+
     @app.get('/get_subscriptions/{user}', response_model=List[SubscriptionsByUserSchema])
     async def get_subscriptions(request: Request, user: int):
         """
         Select all subscriptions on repos by user.
+        List is read from cache of subscriptions if it has it,
+        cache keeps encoded JSON, so hit returns it as is.
         """
+        cache = request.app.subscriptions_cache
+        response = cache.get(user)
+        if response is not None:
+            return JSONBytesResponse(response)
         try:
+            generation = cache.generation
             async with request.app.session_maker.begin() as session:
                 res = await SubscriptionsQueryset.get_repos_by_user(session, user)
-                keys_subscriptions = ['user_id', 'owner', 'repo_name',
-                                      'repo_uri', 'release', 'release_date']
-                to_repo = SubscriptionsByUserSchema.model_validate
-                response = [to_repo(dict(zip(keys_subscriptions, repo))) for repo in res]
+                repos = rows_to_dicts(res)
+                response = dumps(repos)
                 logger.info('Correct response subscriptions for user_id: %s', user)
-                return response
+            cache.set(user, response, [repo['repo_uri'] for repo in repos], generation)
+            return JSONBytesResponse(response)
         except Exception as e:
             logger.info('Wrong send subscriptions for user_id %s with error: %s', user, e)
 
+    @app.get('/get_subscriptions/{user}/page', response_model=SubscriptionsPageSchema)
+    async def get_subscriptions_page(request: Request, user: int,
+                                     after: int | None = None, before: int | None = None,
+                                     limit: int = Query(PAGE_SIZE, ge=1, le=PAGE_SIZE_MAX)):
+        """
+        Select page of subscriptions of user in order of full list.
+        Next page is requested by after=next, previous page by before=prev.
+        """
+        async with request.app.session_maker() as session:
+            rows, more = await SubscriptionsQueryset.get_page(session, user, limit,
+                                                              after=after, before=before)
+        page = {'repos': rows_to_dicts(row[1:] for row in rows),
+                **page_cursors([row[0] for row in rows], more, after=after, before=before)}
+        return JSONBytesResponse(dumps(page))
+
+    @app.get('/releases_history', response_model=List[ReleaseHistorySchema])
+    async def get_releases_history(request: Request, since: dt, until: dt | None = None,
+                                   user: int | None = None, uri: str | None = None,
+                                   limit: int = Query(HISTORY_LIMIT, ge=1,
+                                                      le=HISTORY_LIMIT_MAX)):
+        """
+        Select releases from history published from since till until (now by default),
+        newest first. Releases can be filtered by subscriptions of user and by uri of repo.
+        """
+        since, until = to_utc(since), to_utc(until) if until else dt.utcnow()
+        if since >= until:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail='since must be earlier than until')
+        async with request.app.session_maker() as session:
+            releases = await ReleasesQueryset.get_range(session, since, until, limit,
+                                                        user=user, uri=uri)
+        return JSONBytesResponse(dumps(rows_to_dicts(releases, RELEASE_KEYS)))
+
+    @app.get('/github_budget')
+    async def github_budget(request: Request):
+        """
+        Show current budget of requests by every token API GitHub.
+        """
+        return request.app.budgeter.state()
+
+    @app.get('/db_pool')
+    async def db_pool(request: Request):
+        """
+        Show settings, usage and waits of checkouts of pool of connections of this worker.
+        """
+        return request.app.engine.pool.stats()
+
+    @app.get('/subscriptions_cache')
+    async def subscriptions_cache(request: Request):
+        """
+        Show counters of cache of subscriptions of this worker.
+        """
+        return request.app.subscriptions_cache.stats()
+
+    @app.post('/release_source')
+    async def release_source(request: Request, data: ReleaseSourceSchema):
+        """
+        Choose source of releases for repos: rest, graphql, atom or null for global source.
+        """
+        async with request.app.session_maker.begin() as session:
+            updated = await ReposQueryset.set_source(session, data.repos, data.source)
+        logger.info('Source of releases %s was set for %s repos.', data.source, updated)
+        return {'updated': updated}
+
     @app.post('/add_user',
               status_code=status.HTTP_201_CREATED)
     async def add_user(request: Request, data: UsersSchema):
@@ -169,46 +298,42 @@ def create_app() -> FastAPI:
                         data.model_dump()['user_id'], e)
 
     @app.post('/add_repos',
-              status_code=status.HTTP_201_CREATED)
+              status_code=status.HTTP_202_ACCEPTED)
     async def add_repos(request: Request, data: Dict[str, int | List[List[str]]]):
         """
         Add subscriptions of user by list of repos.
-        By every repository get release and release data and put on table Repos and Subscriptions.
-        If repos have in table Repos and have new release:
-        update for all user who can notifications on this repo.
+        Only create job and return its id, repos are resolved in background.
+        Progress of job is available by /add_repos/{job_id}.
         """
-        subscriptions = {'user_id': data['user_id']}
         try:
-            for repo in data['repos']:
-                uri = f'https://github.com/{repo[0]}/{repo[1]}'
-                api_uri = f'https://api.github.com/repos/{repo[0]}/{repo[1]}/releases/latest'
-                release, release_date = request_to_api_github(api_uri, logger)
-                if release and release_date:
-                    keys_repo = ['uri', 'api_uri', 'owner',
-                                 'repo_name', 'release', 'release_date']
-                    values_repo = [uri, api_uri, repo[0], repo[1], release, release_date]
-
-                    async with request.app.session_maker.begin() as session:
-                        repo_as_dict = ReposSchema.model_validate(dict(zip(keys_repo,
-                                                                           values_repo))
-                                                                  ).model_dump()
-                        id_repo, _, is_update = await ReposQueryset.create(session,
-                                                                           repo_as_dict)
-                    logger.info('Success create %s(by %s) in table Repos.', repo[1], repo[0])
-
-                    if is_update:
-                        async with request.app.session_maker.begin() as session:
-                            await ReposQueryset.update(session, repo_as_dict)
-                            await NotificationsQueryset.create(session, id_repo)
-
-                    subscriptions['repo_id'] = id_repo
-                    async with request.app.session_maker.begin() as session:
-                        await SubscriptionsQueryset.create(session,
-                                                           SubscriptionsSchema
-                                                           .model_validate(subscriptions)
-                                                           .model_dump())
+            job_id = await request.app.ingestor.enqueue(data['user_id'], data['repos'])
+            logger.info('Job %s of addition %s repos for user_id %s was created.',
+                        job_id, len(data['repos']), data['user_id'])
+            return {'job_id': job_id}
         except Exception as e:
             logger.error('Wrong create repo with error: %s', e)
+            return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                content={'job_id': None})
+
+    @app.get('/add_repos/{job_id}', response_model=IngestJobSchema)
+    async def add_repos_status(request: Request, job_id: str):
+        """
+        Show progress of job of addition subscriptions by every repo.
+        """
+        async with request.app.session_maker() as session:
+            job = await IngestJobsQueryset.get(session, job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Job not found')
+        (job_id, user_id, job_status, _, _), repos = job
+        keys_repo = ['owner', 'repo_name', 'status', 'release']
+        repos = [dict(zip(keys_repo, repo)) for repo in repos]
+        return IngestJobSchema.model_validate({'job_id': job_id,
+                                               'user_id': user_id,
+                                               'status': job_status,
+                                               'total': len(repos),
+                                               'done': sum(repo['status'] != 'pending'
+                                                           for repo in repos),
+                                               'repos': repos})
 
     @app.post('/delete_subscriptions',
               status_code=status.HTTP_200_OK)
@@ -224,6 +349,8 @@ def create_app() -> FastAPI:
                 await NotificationsQueryset.delete_by_user_and_repos(session,
                                                                      data['user_id'],
                                                                      data['repos'])
+                await request.app.subscriptions_cache.publish(session, users=[data['user_id']])
+            request.app.subscriptions_cache.invalidate(users=[data['user_id']])
             logger.info('Success delete subscriptions(amount %s) for user_id %s.',
                         len(data['repos']), data['user_id'])
         except Exception as e:
@@ -240,6 +367,8 @@ def create_app() -> FastAPI:
             async with request.app.session_maker.begin() as session:
                 await SubscriptionsQueryset.delete_by_user(session, user['user_id'])
                 await NotificationsQueryset.delete_by_user(session, user['user_id'])
+                await request.app.subscriptions_cache.publish(session, users=[user['user_id']])
+            request.app.subscriptions_cache.invalidate(users=[user['user_id']])
             logger.info('Success delete all subscriptions for user_id %s.', user['user_id'])
         except Exception as e:
             logger.error('Wrong delete all subscriptions for user_id %s with error %s',
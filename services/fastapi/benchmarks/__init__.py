@@ -0,0 +1,3 @@
+"""
+Benchmarks of services. Run them from services/fastapi as modules: python -m benchmarks.<name>
+"""
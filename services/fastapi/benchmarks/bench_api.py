@@ -0,0 +1,187 @@
+"""
+Load benchmark of HTTP API on dataset of benchmarks.seed.
+Every endpoint is driven separately with fixed concurrency, its DB time is taken
+from difference of db_query_duration_seconds of /metrics before and after run,
+so API must run with one worker or with PROMETHEUS_MULTIPROC_DIR.
+Results are written to JSON file with commit of tree, so runs can be compared.
+
+/get_releases and /delete_subscriptions change data: seed again before next run.
+/add_repos only enqueues jobs, jobs request API GitHub in background.
+
+Run from services/fastapi with API started on seeded database:
+    python -m benchmarks.seed -y
+    python -m benchmarks.bench_api --requests 5000 --concurrency 50 --output bench_api.json
+"""
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime as dt
+import click
+import httpx
+
+ENDPOINTS = ['get_releases', 'get_subscriptions', 'add_repos', 'delete_subscriptions', 'add_user']
+
+
+def make_request(endpoint: str, idx: int, users: int, repos: int) -> tuple:
+    """
+    Request of endpoint for seeded users and repos.
+    :return: tuple(method, path, json body, expected status)
+    """
+    user = random.randint(1, users)
+    repo_ids = random.sample(range(1, repos + 1), 5)
+    if endpoint == 'get_releases':
+        return 'GET', f'/get_releases/{user}', None, 200
+    if endpoint == 'get_subscriptions':
+        return 'GET', f'/get_subscriptions/{user}', None, 200
+    if endpoint == 'add_repos':
+        return 'POST', '/add_repos', {'user_id': user,
+                                      'repos': [[f'owner{g}', f'repo{g}'] for g in repo_ids]}, 202
+    if endpoint == 'delete_subscriptions':
+        return 'POST', '/delete_subscriptions', {
+            'user_id': user,
+            'repos': [f'https://github.com/owner{g}/repo{g}' for g in repo_ids]}, 200
+    return 'POST', '/add_user', {'user_id': users + idx + 1, 'username': f'bench{idx}',
+                                 'first_name': 'Bench'}, 201
+
+
+async def db_time(client: httpx.AsyncClient) -> tuple:
+    """
+    Total time and amount of queries of querysets from /metrics, None if it's unavailable.
+    """
+    try:
+        response = await client.get('/metrics')
+    except httpx.HTTPError:
+        return None, None
+    total, count = 0.0, 0
+    for line in response.text.splitlines():
+        if line.startswith('db_query_duration_seconds_sum'):
+            total += float(line.rsplit(' ', 1)[1])
+        elif line.startswith('db_query_duration_seconds_count'):
+            count += int(float(line.rsplit(' ', 1)[1]))
+    return total, count
+
+
+def percentile(values: list, value: float) -> float:
+    """
+    Percentile of sorted latencies in milliseconds.
+    """
+    return round(values[min(int(len(values) * value), len(values) - 1)] * 1000, 2)
+
+
+async def drive(client: httpx.AsyncClient, endpoint: str, requests: int, concurrency: int,
+                users: int, repos: int, offset: int) -> dict:
+    """
+    Send requests to endpoint with concurrency and collect latencies.
+    """
+    latencies, errors = [], 0
+    queue = iter(range(offset, offset + requests))
+
+    async def worker():
+        nonlocal errors
+        for idx in queue:
+            method, path, body, expected = make_request(endpoint, idx, users, repos)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code != expected:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    db_before, queries_before = await db_time(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    db_after, queries_after = await db_time(client)
+
+    latencies.sort()
+    if db_before is None or db_after is None:
+        db_ms, db_queries = None, None
+    else:
+        db_ms = round((db_after - db_before) / requests * 1000, 3)
+        db_queries = round((queries_after - queries_before) / requests, 2)
+    return {'requests': requests,
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(requests / elapsed, 1),
+            'latency_mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'latency_p50_ms': percentile(latencies, 0.5),
+            'latency_p95_ms': percentile(latencies, 0.95),
+            'latency_p99_ms': percentile(latencies, 0.99),
+            'db_ms_per_request': db_ms,
+            'db_queries_per_request': db_queries}
+
+
+def commit_of_tree() -> str | None:
+    """
+    Short hash of HEAD, None outside of git repo.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(base_uri: str, endpoints: list, requests: int, warmup: int, concurrency: int,
+              users: int, repos: int) -> dict:
+    """
+    Drive every endpoint after warmup and return results by endpoints.
+    """
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_uri, timeout=60, limits=limits) as client:
+        offset = 0
+        for endpoint in endpoints:
+            if warmup:
+                await drive(client, endpoint, warmup, concurrency, users, repos, offset)
+                offset += warmup
+            results[endpoint] = await drive(client, endpoint, requests, concurrency,
+                                            users, repos, offset)
+            offset += requests
+            result = results[endpoint]
+            click.echo(f'{endpoint:22} {result["throughput_rps"]:8.1f} rps  '
+                       f'p50 {result["latency_p50_ms"]:7.2f} ms  '
+                       f'p95 {result["latency_p95_ms"]:7.2f} ms  '
+                       f'p99 {result["latency_p99_ms"]:7.2f} ms  '
+                       f'db {result["db_ms_per_request"]} ms/req  '
+                       f'errors {result["errors"]}')
+    return results
+
+
+@click.command()
+@click.option('--base-uri', '-b', default='http://localhost:8880')
+@click.option('--endpoint', '-e', 'endpoints', multiple=True, type=click.Choice(ENDPOINTS),
+              help='Endpoint to drive, all by default.')
+@click.option('--requests', '-n', default=2000, help='Requests to every endpoint.')
+@click.option('--warmup', '-w', default=100)
+@click.option('--concurrency', '-c', default=50)
+@click.option('--users', '-u', default=100_000, help='Users of seed.')
+@click.option('--repos', '-r', default=50_000, help='Repos of seed.')
+@click.option('--seed', default=0, help='Seed of random choice of users and repos.')
+@click.option('--output', '-o', default='bench_api.json')
+def main(base_uri: str, endpoints: tuple, requests: int, warmup: int, concurrency: int,
+         users: int, repos: int, seed: int, output: str) -> None:
+    """
+    Benchmark endpoints of API and write results to JSON file.
+    """
+    random.seed(seed)
+    endpoints = list(endpoints) or ENDPOINTS
+    results = asyncio.run(run(base_uri, endpoints, requests, warmup, concurrency, users, repos))
+    report = {'commit': commit_of_tree(),
+              'created_at': dt.utcnow().isoformat(timespec='seconds'),
+              'params': {'base_uri': base_uri, 'requests': requests, 'warmup': warmup,
+                         'concurrency': concurrency, 'users': users, 'repos': repos,
+                         'seed': seed},
+              'endpoints': results}
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    click.echo(f'Results were written to {output}.')
+
+
+if __name__ == '__main__':
+    main()
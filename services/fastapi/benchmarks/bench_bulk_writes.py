@@ -0,0 +1,96 @@
+"""
+Benchmark of write path of poll cycle.
+Compare statements per changed repo with set-based statements:
+count database round trips and time of write of new releases and notifications.
+All data is created in one transaction which is rolled back at the end.
+
+Run from services/fastapi with env of database:
+    python -m benchmarks.bench_bulk_writes --repos 1000 --subscribers 5
+"""
+import asyncio
+import time
+from datetime import datetime as dt
+import click
+from sqlalchemy import event, text
+
+from database import Base, engine
+from database import sm as session_maker
+from querysets import ReposQueryset, NotificationsQueryset
+
+
+class RoundTrips:
+    """
+    Counter of statements sent to database.
+    """
+    def __init__(self):
+        self.amount = 0
+        event.listen(engine.sync_engine, 'before_cursor_execute', self.count)
+
+    def count(self, *_):
+        """
+        Count one statement.
+        """
+        self.amount += 1
+
+
+async def seed(session, repos: int, subscribers: int):
+    """
+    Create repos with old release and subscriptions on them.
+    Return list of tuple(repo_id, uri).
+    """
+    query = text("""INSERT INTO repos (uri, api_uri, owner, repo_name, release, release_date) 
+    SELECT 'https://bench.invalid/' || g, 'https://bench.invalid/api/' || g, 'bench', 
+    'repo' || g, 'v0', TIMESTAMP '2000-01-01' FROM generate_series(1, :repos) AS g 
+    RETURNING id, uri;""")
+    created = (await session.execute(query, {'repos': repos})).all()
+    query = text("""INSERT INTO subscriptions (user_id, repo_id) 
+    SELECT -u, r.id FROM repos AS r, generate_series(1, :subscribers) AS u 
+    WHERE r.uri LIKE 'https://bench.invalid/%' ON CONFLICT DO NOTHING;""")
+    await session.execute(query, {'subscribers': subscribers})
+    return created
+
+
+async def run(repos: int, subscribers: int):
+    """
+    Write the same changes by two paths and print round trips and time of every path.
+    """
+    counter = RoundTrips()
+    async with session_maker() as session:
+        await session.begin()
+        await (await session.connection()).run_sync(Base.metadata.create_all)
+        created = await seed(session, repos, subscribers)
+        release_date = dt(2030, 1, 1)
+
+        counter.amount, start = 0, time.perf_counter()
+        for id_repo, uri in created:
+            await ReposQueryset.update(session, {'uri': uri, 'release': 'v1',
+                                                 'release_date': release_date})
+            await NotificationsQueryset.create(session, id_repo)
+        per_repo = counter.amount, time.perf_counter() - start
+
+        await session.execute(text("DELETE FROM notifications WHERE user_id < 0;"))
+        counter.amount, start = 0, time.perf_counter()
+        await ReposQueryset.bulk_update(session, [(id_repo, 'v2', release_date)
+                                                  for id_repo, _ in created])
+        await NotificationsQueryset.bulk_create(session, [id_repo for id_repo, _ in created])
+        bulk = counter.amount, time.perf_counter() - start
+        await session.rollback()
+    await engine.dispose()
+
+    click.echo(f'changed repos: {repos}, subscribers per repo: {subscribers}')
+    for name, (round_trips, seconds) in (('per repo', per_repo), ('bulk', bulk)):
+        click.echo(f'{name:>8}: {round_trips:>6} round trips, {seconds * 1000:>9.1f} ms')
+
+
+@click.command()
+@click.option('--repos', '-r', default=1000)
+@click.option('--subscribers', '-s', default=5)
+def main(repos: int, subscribers: int) -> None:
+    """
+    Run benchmark of write path of poll cycle.
+    """
+    asyncio.run(run(repos, subscribers))
+
+
+if __name__ == '__main__':
+    main()
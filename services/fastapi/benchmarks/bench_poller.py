@@ -0,0 +1,166 @@
+"""
+Benchmark of throughput of poller against local fake API GitHub.
+Database gets repos owner{N}/repo{N} whose api_uri points to fake API (tables are
+truncated like by benchmarks.seed), fake API is started in separate process
+with chosen latency and faults. Every cycle makes all repos due and runs full
+check_releases: first cycle is cold, next cycles send conditional requests
+after new releases of --bump share of repos.
+Print wall-clock time of cycle, repos per second and calls to API by status.
+
+Source graphql sends batched queries to /graphql of fake API instead of REST requests.
+
+Run from services/fastapi with env of database:
+    python -m benchmarks.bench_poller --repos 10000 --latency-ms 80 --error-rate 0.01 -y
+    python -m benchmarks.bench_poller --repos 10000 --source graphql -y
+"""
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime as dt, timedelta
+import click
+import httpx
+from sqlalchemy import text
+
+from database import Base, engine
+from database import sm as session_maker
+from github_api import create_client
+from github_budget import GitHubBudgeter
+from migrations import run_migrations
+from querysets import ReposScheduleQueryset
+from release_poller import ReleasePoller
+from benchmarks.seed import TABLES
+
+
+async def prepare(repos: int, subscribers: int, fake_uri: str) -> None:
+    """
+    Truncate tables and insert repos of fake API with old releases and their subscribers.
+    """
+    logger = logging.getLogger(__name__)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine, logger)
+    async with session_maker.begin() as session:
+        await session.execute(text(f"""TRUNCATE {', '.join(TABLES)} RESTART IDENTITY;"""))
+        await session.execute(text("""INSERT INTO repos
+        (uri, api_uri, owner, repo_name, release, release_date)
+        SELECT 'https://github.com/owner' || g || '/repo' || g,
+        :fake_uri || '/repos/owner' || g || '/repo' || g || '/releases/latest',
+        'owner' || g, 'repo' || g, 'v0', TIMESTAMP '2020-01-01'
+        FROM generate_series(0, :repos - 1) AS g ORDER BY g;"""),
+                              {'fake_uri': fake_uri, 'repos': repos})
+        await session.execute(text("""INSERT INTO subscriptions (user_id, repo_id)
+        SELECT u, r.id FROM generate_series(1, :subscribers) AS u CROSS JOIN repos AS r;"""),
+                              {'subscribers': subscribers})
+        await ReposScheduleQueryset.create_missing(session, dt.utcnow())
+
+
+async def make_due() -> None:
+    """
+    Make all repos due for next cycle.
+    """
+    async with session_maker.begin() as session:
+        await session.execute(text("""UPDATE repos_schedule SET next_check_at=:now;"""),
+                              {'now': dt.utcnow() - timedelta(seconds=1)})
+
+
+async def run(repos: int, cycles: int, bump: float, concurrency: int, slice_size: int,
+              subscribers: int, tokens: int, port: int, source: str,
+              fake_options: list) -> list:
+    """
+    Start fake API, run cycles of poller and collect results.
+    """
+    fake_uri = f'http://127.0.0.1:{port}'
+    os.environ['GITHUB_GRAPHQL_URI'] = f'{fake_uri}/graphql'
+    fake = subprocess.Popen([sys.executable, '-m', 'benchmarks.fake_github',
+                             '--port', str(port), '--repos', str(repos), *fake_options])
+    results = []
+    logger = logging.getLogger('bench_poller')
+    try:
+        async with httpx.AsyncClient(base_url=fake_uri) as control:
+            for _ in range(50):
+                try:
+                    await control.get('/_stats')
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+            await prepare(repos, subscribers, fake_uri)
+
+            client = create_client(max_connections=concurrency)
+            budgeter = GitHubBudgeter([f'fake-token-{idx}' for idx in range(tokens)], logger)
+            poller = ReleasePoller(session_maker, client, logger, budgeter=budgeter,
+                                   concurrency=concurrency, slice_size=slice_size, source=source)
+            for cycle in range(cycles):
+                if cycle:
+                    await control.post('/_control/bump', params={'fraction': bump})
+                    await make_due()
+                await control.get('/_stats', params={'reset': 1})
+                start = time.perf_counter()
+                await poller.check_releases()
+                elapsed = time.perf_counter() - start
+                calls = (await control.get('/_stats', params={'reset': 1})).json()
+                async with session_maker() as session:
+                    notifications = (await session.execute(
+                        text("""SELECT count(*) FROM notifications;"""))).scalar()
+                    await session.execute(text("""DELETE FROM notifications;"""))
+                    await session.commit()
+                result = {'cycle': cycle + 1,
+                          'kind': 'cold' if cycle == 0 else 'warm',
+                          'seconds': round(elapsed, 3),
+                          'repos_per_second': round(repos / elapsed, 1),
+                          'api_calls': sum(calls.values()),
+                          'api_calls_per_repo': round(sum(calls.values()) / repos, 3),
+                          'responses': calls,
+                          'notifications': notifications}
+                results.append(result)
+                click.echo(f'cycle {result["cycle"]} ({result["kind"]}): '
+                           f'{elapsed:.2f} s, {result["repos_per_second"]} repos/s, '
+                           f'{result["api_calls"]} calls {calls}, '
+                           f'{notifications} notifications')
+            await client.aclose()
+    finally:
+        fake.terminate()
+        fake.wait()
+        await engine.dispose()
+    return results
+
+
+@click.command(context_settings={'ignore_unknown_options': True})
+@click.option('--repos', '-r', default=10_000)
+@click.option('--cycles', default=3)
+@click.option('--bump', default=0.05, help='Share of repos with new release before warm cycle.')
+@click.option('--concurrency', '-c', default=50)
+@click.option('--slice-size', default=500)
+@click.option('--subscribers', default=1, help='Users subscribed to every repo.')
+@click.option('--tokens', default=2, help='Fake tokens of budgeter.')
+@click.option('--port', '-p', default=8083)
+@click.option('--source', type=click.Choice(['rest', 'graphql']), default='rest')
+@click.option('--output', '-o', default=None, help='JSON file of results.')
+@click.option('--yes', '-y', is_flag=True, help='Truncate tables without confirmation.')
+@click.argument('fake_options', nargs=-1, type=click.UNPROCESSED)
+def main(repos: int, cycles: int, bump: float, concurrency: int, slice_size: int,
+         subscribers: int, tokens: int, port: int, source: str, output: str, yes: bool,
+         fake_options: tuple) -> None:
+    """
+    Benchmark cycles of poller. Unknown options (--latency-ms, --error-rate, ...)
+    are passed to benchmarks.fake_github.
+    """
+    if not yes:
+        click.confirm(f'Tables {", ".join(TABLES)} will be truncated. Continue?', abort=True)
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(repos, cycles, bump, concurrency, slice_size, subscribers,
+                              tokens, port, source, list(fake_options)))
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump({'params': {'repos': repos, 'bump': bump, 'concurrency': concurrency,
+                                  'slice_size': slice_size, 'tokens': tokens,
+                                  'source': source,
+                                  'fake_options': list(fake_options)},
+                       'cycles': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Microbenchmark of queries with literal values against bound parameters.
+Literal values make unique text of SQL on every call, so asyncpg parses and plans
+it again, bound parameters reuse prepared statement from cache of connection.
+All data is created in one transaction which is rolled back at the end.
+
+Run from services/fastapi with env of database:
+    python -m benchmarks.bench_prepared_statements --calls 2000
+"""
+import asyncio
+import statistics
+import time
+from datetime import datetime as dt
+import click
+from sqlalchemy import text
+
+from database import Base, engine, statement_cache_size
+from database import sm as session_maker
+from querysets import (ReposQueryset, SubscriptionsQueryset,
+                       NotificationsQueryset, NotificationJobsQueryset)
+
+USERS = 1000
+
+
+async def literal_repos_by_user(session, idx):
+    """
+    Subscriptions of user with literal user id.
+    """
+    await session.execute(text(f"""SELECT s.user_id, r.owner, r.repo_name,
+    r.uri, r.release, r.release_date FROM subscriptions AS s
+    JOIN repos AS r ON s.repo_id=r.id WHERE s.user_id={-(idx % USERS) - 1}
+    ORDER BY r.repo_name, r.owner ASC;"""))
+
+
+async def bound_repos_by_user(session, idx):
+    await SubscriptionsQueryset.get_repos_by_user(session, -(idx % USERS) - 1)
+
+
+async def literal_update_repo(session, idx):
+    """
+    Update of repo with quoted literal values.
+    """
+    await session.execute(text(f"""UPDATE repos SET release='v{idx}',
+    release_date='{dt(2030, 1, 1)}' WHERE uri='https://bench.invalid/{idx % USERS + 1}';"""))
+
+
+async def bound_update_repo(session, idx):
+    await ReposQueryset.update(session, {'uri': f'https://bench.invalid/{idx % USERS + 1}',
+                                         'release': f'v{idx}',
+                                         'release_date': dt(2030, 1, 1)})
+
+
+async def literal_delete_notifications(session, idx):
+    """
+    Delete of notifications with literal list IN (...).
+    """
+    uris = ', '.join(f"'https://bench.invalid/{idx % USERS + k}'" for k in range(1, 4))
+    await session.execute(text(f"""DELETE FROM notifications AS n
+    WHERE n.user_id={-(idx % USERS) - 1} AND n.repo_id IN (SELECT r.id FROM repos AS r
+    WHERE r.uri IN ({uris}));"""))
+
+
+async def bound_delete_notifications(session, idx):
+    await NotificationsQueryset.delete_by_user_and_repos(
+        session, -(idx % USERS) - 1,
+        [f'https://bench.invalid/{idx % USERS + k}' for k in range(1, 4)])
+
+
+async def literal_create_job(session, idx):
+    """
+    Insert of job with literal values.
+    """
+    await session.execute(text(f"""INSERT INTO notificationjobs
+    (user_id, chat_id, hour, minute) VALUES ({-idx - 1}, {-idx - 1}, 9, 30);"""))
+
+
+async def bound_create_job(session, idx):
+    await NotificationJobsQueryset.create(session, (-idx - 1_000_001, -idx - 1, 9, 30))
+
+
+QUERIES = {
+    'repos by user': (literal_repos_by_user, bound_repos_by_user),
+    'update repo': (literal_update_repo, bound_update_repo),
+    'delete by repos': (literal_delete_notifications, bound_delete_notifications),
+    'create job': (literal_create_job, bound_create_job),
+}
+
+
+async def seed(session):
+    """
+    Create repos, subscriptions and notifications of bench users.
+    """
+    await session.execute(text("""INSERT INTO repos
+    (uri, api_uri, owner, repo_name, release, release_date)
+    SELECT 'https://bench.invalid/' || g, 'https://bench.invalid/api/' || g, 'bench',
+    'repo' || g, 'v0', TIMESTAMP '2000-01-01' FROM generate_series(1, :users) AS g;"""),
+                          {'users': USERS})
+    await session.execute(text("""INSERT INTO subscriptions (user_id, repo_id)
+    SELECT -((r.id + k) % :users) - 1, r.id FROM repos AS r, generate_series(1, 10) AS k
+    WHERE r.uri LIKE 'https://bench.invalid/%' ON CONFLICT DO NOTHING;"""),
+                          {'users': USERS})
+    await session.execute(text("""INSERT INTO notifications (user_id, repo_id)
+    SELECT s.user_id, s.repo_id FROM subscriptions AS s WHERE s.user_id < 0
+    ON CONFLICT DO NOTHING;"""))
+
+
+async def measure(session, query, calls: int, first: int = 0):
+    """
+    Latencies of calls of query in microseconds.
+    """
+    latencies = []
+    for idx in range(first, first + calls):
+        start = time.perf_counter()
+        await query(session, idx)
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return latencies
+
+
+async def run(calls: int):
+    """
+    Run every query by literal values and by bound parameters and print latencies.
+    """
+    async with session_maker() as session:
+        await session.begin()
+        await (await session.connection()).run_sync(Base.metadata.create_all)
+        await seed(session)
+        click.echo(f'calls: {calls}, prepared_statement_cache_size: {statement_cache_size}')
+        click.echo(f'{"query":>16} {"path":>8} {"mean":>8} {"p50":>8} {"p95":>8}  (us)')
+        for name, paths in QUERIES.items():
+            for path, query in zip(('literal', 'bound'), paths):
+                await measure(session, query, 10, calls)
+                latencies = sorted(await measure(session, query, calls))
+                click.echo(f'{name:>16} {path:>8} {statistics.fmean(latencies):>8.0f} '
+                           f'{latencies[len(latencies) // 2]:>8.0f} '
+                           f'{latencies[int(len(latencies) * 0.95)]:>8.0f}')
+        await session.rollback()
+    await engine.dispose()
+
+
+@click.command()
+@click.option('--calls', '-c', default=2000)
+def main(calls: int) -> None:
+    """
+    Run microbenchmark of prepared statements.
+    """
+    asyncio.run(run(calls))
+
+
+if __name__ == '__main__':
+    main()
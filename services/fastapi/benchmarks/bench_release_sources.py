@@ -0,0 +1,155 @@
+"""
+Benchmark of sources of releases against local stand-in of GitHub.
+Local server serves REST API /repos/{owner}/{repo}/releases/latest and Atom feeds
+/{owner}/{repo}/releases.atom with ETag, so both sources make cold requests (200)
+and then conditional requests (304) like on next checks of poller.
+Print time and requests per second of every source and pass.
+
+Run from services/fastapi:
+    python -m benchmarks.bench_release_sources --repos 1000 --entries 10
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime as dt, timedelta
+import click
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from github_api import create_client
+from release_sources import RestSource, AtomSource
+
+Repo = namedtuple('Repo', ['id', 'uri', 'api_uri', 'owner', 'repo_name',
+                           'release', 'release_date', 'release_source'])
+NOTES = 'Release notes with list of changes. ' * 40
+
+
+def release_json(owner: str, repo: str) -> bytes:
+    """
+    Body of latest release like REST API GitHub with notes of release.
+    """
+    return json.dumps({'url': f'https://api.github.com/repos/{owner}/{repo}/releases/1',
+                       'html_url': f'https://github.com/{owner}/{repo}/releases/tag/v1.0.0',
+                       'tag_name': 'v1.0.0', 'name': 'v1.0.0', 'draft': False,
+                       'prerelease': False, 'created_at': '2023-11-01T10:00:00Z',
+                       'published_at': '2023-11-01T10:00:00Z',
+                       'author': {'login': owner, 'id': 1, 'type': 'User'},
+                       'assets': [], 'body': NOTES}).encode()
+
+
+def releases_atom(owner: str, repo: str, entries: int) -> bytes:
+    """
+    Feed of releases like GitHub, the newest entry is first.
+    """
+    date = dt(2023, 11, 1, 10)
+    items = []
+    for idx in range(entries):
+        tag = f'v1.0.{entries - idx - 1}'
+        updated = (date - timedelta(days=idx)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        items.append(f"""<entry>
+<id>tag:github.com,2008:Repository/1/{tag}</id>
+<updated>{updated}</updated>
+<link rel="alternate" type="text/html" href="https://github.com/{owner}/{repo}/releases/tag/{tag}"/>
+<title>{tag}</title>
+<content type="html">{NOTES}</content>
+<author><name>{owner}</name></author>
+</entry>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="en-US">
+<id>tag:github.com,2008:https://github.com/{owner}/{repo}/releases</id>
+<title>Release notes from {repo}</title>
+<updated>{date.strftime('%Y-%m-%dT%H:%M:%SZ')}</updated>
+{''.join(items)}
+</feed>""".encode()
+
+
+def create_fake_github(entries: int, counter: dict) -> FastAPI:
+    """
+    Fake GitHub: latest release by REST API and feeds of releases with ETag.
+    :param entries: amount of entries in every feed
+    :param counter: dict status: amount of responses, filled by server
+    """
+    app = FastAPI(docs_url=None, redoc_url=None)
+
+    def conditional(request: Request, body: bytes, media_type: str) -> Response:
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            counter[304] = counter.get(304, 0) + 1
+            return Response(status_code=304, headers={'ETag': etag})
+        counter[200] = counter.get(200, 0) + 1
+        return Response(body, media_type=media_type, headers={'ETag': etag})
+
+    @app.get('/repos/{owner}/{repo}/releases/latest')
+    async def latest_release(request: Request, owner: str, repo: str):
+        return conditional(request, release_json(owner, repo), 'application/json')
+
+    @app.get('/{owner}/{repo}/releases.atom')
+    async def feed(request: Request, owner: str, repo: str):
+        return conditional(request, releases_atom(owner, repo, entries), 'application/atom+xml')
+
+    return app
+
+
+async def measure(source, repos, concurrency, cache):
+    """
+    Check all repos by source, return time, results and validators for next pass.
+    """
+    start = time.perf_counter()
+    checked = await source.fetch_many(repos, asyncio.Semaphore(concurrency), cache)
+    elapsed = time.perf_counter() - start
+    validators = {source.cache_key(repo): (info.etag, info.last_modified)
+                  for repo, info in checked if info and info.etag}
+    return elapsed, checked, validators
+
+
+async def run(repos_amount: int, entries: int, concurrency: int, port: int):
+    """
+    Start fake GitHub and check repos by REST and Atom sources.
+    """
+    counter = {}
+    server = uvicorn.Server(uvicorn.Config(create_fake_github(entries, counter), port=port,
+                                           log_level='warning', access_log=False))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base_uri = f'http://localhost:{port}'
+    repos = [Repo(idx, f'https://github.com/owner{idx}/repo{idx}',
+                  f'{base_uri}/repos/owner{idx}/repo{idx}/releases/latest',
+                  f'owner{idx}', f'repo{idx}', None, None, None)
+             for idx in range(repos_amount)]
+    logger = logging.getLogger('bench_release_sources')
+    logger.setLevel(logging.WARNING)
+
+    async with create_client(max_connections=concurrency) as client:
+        for source in (RestSource(client, logger), AtomSource(client, logger, base_uri=base_uri)):
+            cache = {}
+            for name in ('cold', 'warm'):
+                counter.clear()
+                elapsed, checked, cache = await measure(source, repos, concurrency, cache)
+                found = sum(1 for _, info in checked if info and (info.release or info.not_modified))
+                click.echo(f'{source.name:5} {name}: {elapsed:.2f} s, '
+                           f'{len(repos) / elapsed:.0f} requests/s, '
+                           f'found {found}/{len(repos)}, responses {dict(sorted(counter.items()))}')
+
+    server.should_exit = True
+    await server_task
+
+
+@click.command()
+@click.option('--repos', '-r', 'repos_amount', default=1000)
+@click.option('--entries', '-e', default=10)
+@click.option('--concurrency', '-c', default=50)
+@click.option('--port', '-p', default=8082)
+def main(repos_amount: int, entries: int, concurrency: int, port: int) -> None:
+    """
+    Compare REST and Atom sources of releases on local fake GitHub.
+    """
+    asyncio.run(run(repos_amount, entries, concurrency, port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of serialization of lists of repos: before and after fast path.
+Before: row -> dict -> SubscriptionsByUserSchema with strftime, validation by
+response_model and encoding by json of FastAPI.
+After: rows with date formatted by database -> dicts -> orjson bytes in JSONBytesResponse.
+Both endpoints are called in process through ASGI without network and database,
+so only work of application is measured.
+
+Run from services/fastapi:
+    python -m benchmarks.bench_serialization --rows 10 --rows 1000 --rows 5000
+"""
+import asyncio
+import time
+from datetime import datetime as dt, timedelta
+from typing import List
+import click
+import httpx
+from fastapi import FastAPI
+
+from responses import JSONBytesResponse, dumps, orjson, rows_to_dicts
+from schemas import SubscriptionsByUserSchema
+
+KEYS = ['user_id', 'owner', 'repo_name', 'repo_uri', 'release', 'release_date']
+
+
+def make_rows(amount: int) -> tuple:
+    """
+    Rows like from database: with datetime and with date formatted by to_char.
+    """
+    start = dt(2023, 1, 1, 12, 30)
+    rows = [(1, f'owner{idx}', f'repo{idx}', f'https://github.com/owner{idx}/repo{idx}',
+             f'v1.{idx % 50}.0', start + timedelta(hours=idx)) for idx in range(amount)]
+    formatted = [row[:5] + (row[5].strftime('%Y.%m.%d %H:%M:%S'),) for row in rows]
+    return rows, formatted
+
+
+def create_app(rows: list, formatted: list) -> FastAPI:
+    """
+    Application with endpoint of old path and endpoint of fast path.
+    """
+    app = FastAPI()
+
+    @app.get('/before', response_model=List[SubscriptionsByUserSchema])
+    async def before():
+        to_repo = SubscriptionsByUserSchema.model_validate
+        return [to_repo(dict(zip(KEYS, repo))) for repo in rows]
+
+    @app.get('/after', response_model=List[SubscriptionsByUserSchema])
+    async def after():
+        return JSONBytesResponse(dumps(rows_to_dicts(formatted)))
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, calls: int) -> tuple:
+    """
+    Mean time of request in milliseconds and size of body.
+    """
+    response = await client.get(path)
+    start = time.perf_counter()
+    for _ in range(calls):
+        await client.get(path)
+    return (time.perf_counter() - start) / calls * 1000, len(response.content)
+
+
+async def run(sizes: tuple, calls: int) -> None:
+    """
+    Compare paths for every size of list.
+    """
+    click.echo(f'encoder of fast path: {"orjson" if orjson is not None else "json"}')
+    for size in sizes:
+        rows, formatted = make_rows(size)
+        app = create_app(rows, formatted)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                     base_url='http://bench') as client:
+            assert (await client.get('/before')).json() == (await client.get('/after')).json()
+            size_calls = max(calls * 1000 // max(size, 1000), 5)
+            before, length = await measure(client, '/before', size_calls)
+            after, _ = await measure(client, '/after', size_calls)
+        click.echo(f'{size:6} rows ({length / 1024:7.1f} KiB): before {before:8.2f} ms, '
+                   f'after {after:7.2f} ms, x{before / after:.1f}')
+
+
+@click.command()
+@click.option('--rows', '-r', 'sizes', multiple=True, type=int)
+@click.option('--calls', '-n', default=200, help='Calls of endpoint for list of 1000 rows.')
+def main(sizes: tuple, calls: int) -> None:
+    """
+    Benchmark serialization of list endpoints.
+    """
+    asyncio.run(run(sizes or (10, 100, 1000, 5000), calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Check of GraphQL source against local fake API GitHub.
+benchmarks.fake_github is started in process, request_to_graphql_github gets
+batches of existing repos, repos without releases and unknown repos, and every
+alias is compared with latest release of the same repo by REST API.
+Check fails if any alias differs, unknown repos break their batch
+or cost of queries isn't counted.
+
+Run from services/fastapi:
+    python -m benchmarks.check_graphql --repos 500 --unknown 0.1
+"""
+import os
+import sys
+import asyncio
+import logging
+import random
+import click
+
+from github_api import create_client, request_to_api_github
+from github_graphql import request_to_graphql_github, graphql_batch_size
+from benchmarks.fake_github import FakeGitHub
+
+
+async def run(repos: int, unknown: float, bump: float, port: int, seed: int) -> bool:
+    """
+    Compare answers of GraphQL and REST for all repos before and after new releases.
+    :return: True if all answers are equal
+    """
+    logger = logging.getLogger('check_graphql')
+    fake = FakeGitHub(repos=repos, seed=seed)
+    server = await asyncio.start_server(fake.handle, '127.0.0.1', port)
+    base_uri = f'http://127.0.0.1:{port}'
+    shuffle = random.Random(seed)
+    names = [(f'owner{idx}', f'repo{idx}') for idx in range(repos)]
+    names += [(f'owner{idx}', f'missing{idx}') for idx in range(int(repos * unknown))]
+    shuffle.shuffle(names)
+    batch_size = graphql_batch_size()
+
+    ok = True
+    async with server, create_client() as client:
+        for name in ('cold', 'after bump'):
+            if name != 'cold':
+                fake.bump(bump)
+            fake.stats.clear()
+            infos, cost = [], 0
+            for start in range(0, len(names), batch_size):
+                batch_infos, rate_limit = await request_to_graphql_github(
+                    client, names[start:start + batch_size], logger)
+                infos.extend(batch_infos)
+                cost += rate_limit.get('cost') or 0
+            graphql_stats = dict(fake.stats)
+            expected = await asyncio.gather(*(
+                request_to_api_github(client,
+                                      f'{base_uri}/repos/{owner}/{repo}/releases/latest',
+                                      logger)
+                for owner, repo in names))
+            wrong = [(owner, repo) for (owner, repo), info, rest in zip(names, infos, expected)
+                     if info is None or
+                     (info.release, info.release_date) != (rest.release, rest.release_date)]
+            batches = (len(names) + batch_size - 1) // batch_size
+            ok = ok and not wrong and cost == batches
+            click.echo(f'{name}: {len(names)} repos in {batches} queries, cost {cost}, '
+                       f'found {sum(1 for info in infos if info and info.release)}, '
+                       f'differ from REST {len(wrong)} {wrong[:5]}, '
+                       f'fake {dict(sorted(graphql_stats.items()))}')
+    return ok
+
+
+@click.command()
+@click.option('--repos', '-r', default=500)
+@click.option('--unknown', default=0.1, help='Share of unknown repos added to list.')
+@click.option('--bump', default=0.2, help='Share of repos with new release before second pass.')
+@click.option('--port', '-p', default=8084)
+@click.option('--seed', default=0)
+def main(repos: int, unknown: float, bump: float, port: int, seed: int) -> None:
+    """
+    Check GraphQL source on fake API GitHub, exit code 1 on difference with REST.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    os.environ['GITHUB_GRAPHQL_URI'] = f'http://127.0.0.1:{port}/graphql'
+    sys.exit(0 if asyncio.run(run(repos, unknown, bump, port, seed)) else 1)
+
+
+if __name__ == '__main__':
+    main()
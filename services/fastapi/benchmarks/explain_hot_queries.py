@@ -0,0 +1,199 @@
+"""
+Check of plans of hot queries at scale.
+Tables are created in separate schema without indexes of migrations, filled
+by generate_series, then migrations build indexes online and every statement
+of hot methods of querysets is explained instead of execution: no Seq Scan
+on big tables is allowed.
+Schema is dropped at the end.
+
+Run from services/fastapi with env of database:
+    python -m benchmarks.explain_hot_queries --rows 1000000
+"""
+import sys
+import json
+import asyncio
+import logging
+import time
+from datetime import datetime as dt, timedelta
+import click
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import engine
+from migrations import MIGRATIONS, run_migrations
+import models
+from querysets import (ReposQueryset, ReposScheduleQueryset,
+                       SubscriptionsQueryset, NotificationsQueryset)
+
+SCHEMA = 'explain_hot_queries'
+BIG_TABLES = {'repos', 'subscriptions', 'notifications', 'notificationjobs', 'repos_schedule'}
+
+class EmptyResult:
+    """
+    Result of statement which was explained instead of execution.
+    """
+    rowcount = 0
+
+    def all(self) -> list:
+        return []
+
+    def first(self) -> None:
+        return None
+
+    def scalar(self) -> None:
+        return None
+
+    def scalars(self) -> 'EmptyResult':
+        return self
+
+
+class ExplainSession:
+    """
+    Session for methods of querysets: every statement is explained instead of execution,
+    so plans of real statements of querysets are checked.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.plans = []
+
+    async def execute(self, statement, params=None) -> EmptyResult:
+        if isinstance(params, list):
+            params = params[0] if params else {}
+        explain = await self.connection.execute(text(f'EXPLAIN (FORMAT JSON) {statement.text}'),
+                                                params or {})
+        plan = explain.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        self.plans.append(plan[0]['Plan'])
+        return EmptyResult()
+
+    stream = execute
+
+
+# Методы querysets с параметрами, которые попадают в индексы
+HOT_QUERIES = {
+    'ReposQueryset.get_ids': lambda session: ReposQueryset.get_ids(
+        session, [f'https://github.com/owner{g % 1000}/repo{g}' for g in range(1, 101)]),
+    'SubscriptionsQueryset.get_repos_by_user': lambda session:
+        SubscriptionsQueryset.get_repos_by_user(session, 42),
+    'SubscriptionsQueryset.get_page': lambda session:
+        SubscriptionsQueryset.get_page(session, 42, 10, after=500),
+    'SubscriptionsQueryset.delete_by_user_and_repos': lambda session:
+        SubscriptionsQueryset.delete_by_user_and_repos(session, 42,
+                                                       ['https://github.com/owner1/repo1']),
+    'NotificationsQueryset.bulk_create': lambda session:
+        NotificationsQueryset.bulk_create(session, list(range(1, 501))),
+    'NotificationsQueryset.get_repos_by_user': lambda session:
+        NotificationsQueryset.get_repos_by_user(session, 42),
+    'NotificationsQueryset.delete_by_user': lambda session:
+        NotificationsQueryset.delete_by_user(session, 42),
+    'NotificationsQueryset.claim_by_time': lambda session:
+        NotificationsQueryset.claim_by_time(session, 9, 30),
+    'ReposScheduleQueryset.claim_due': lambda session:
+        ReposScheduleQueryset.claim_due(session, dt.utcnow(), 500,
+                                        dt.utcnow() + timedelta(minutes=15)),
+}
+
+
+async def seed(connection, rows: int) -> None:
+    """
+    Fill tables: rows subscriptions of rows // 10 users on rows // 10 repos,
+    notification of every 10th subscription, one notification job of every user.
+    """
+    params = {'rows': rows, 'repos': max(rows // 10, 1)}
+    statements = [
+        """INSERT INTO repos (uri, api_uri, owner, repo_name, release, release_date)
+        SELECT 'https://github.com/owner' || (g % 1000) || '/repo' || g,
+        'https://api.github.com/repos/owner' || (g % 1000) || '/repo' || g || '/releases/latest',
+        'owner' || (g % 1000), 'repo' || g, 'v1', TIMESTAMP '2020-01-01' + g * INTERVAL '1 minute'
+        FROM generate_series(1, :repos) AS g;""",
+        """INSERT INTO subscriptions (user_id, repo_id, repo_name, owner)
+        SELECT g / 10 + 1, r.id, r.repo_name, r.owner FROM generate_series(0, :rows - 1) AS g
+        JOIN repos AS r ON r.id = (g * 7919) % :repos + 1 ON CONFLICT DO NOTHING;""",
+        """INSERT INTO notifications (user_id, repo_id)
+        SELECT s.user_id, s.repo_id FROM subscriptions AS s WHERE s.repo_id % 10 = 0;""",
+        """INSERT INTO notificationjobs (user_id, chat_id, hour, minute)
+        SELECT g, g, g % 24, g % 60 FROM generate_series(1, :repos) AS g;""",
+        """INSERT INTO repos_schedule (repo_id, next_check_at)
+        SELECT g, now() AT TIME ZONE 'utc' + (g - :repos / 100) * INTERVAL '1 second'
+        FROM generate_series(1, :repos) AS g;""",
+    ]
+    for statement in statements:
+        await connection.execute(text(statement), params)
+
+
+def scans(plan: dict) -> list:
+    """
+    Flat list of tuple(node type, relation, index) of all scans of plan.
+    """
+    found = []
+    if 'Relation Name' in plan:
+        found.append((plan['Node Type'], plan['Relation Name'], plan.get('Index Name')))
+    for child in plan.get('Plans', []):
+        found.extend(scans(child))
+    return found
+
+
+async def run(rows: int, keep: bool) -> bool:
+    """
+    Create and fill schema, apply migrations and check plans of hot queries.
+    :return: True if all hot queries use indexes
+    """
+    logger = logging.getLogger(__name__)
+    logging.basicConfig(level=logging.INFO)
+    check_engine = create_async_engine(engine.url, connect_args={
+        'server_settings': {'search_path': SCHEMA}})
+    async with engine.begin() as connection:
+        await connection.execute(text(f"""DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;"""))
+        await connection.execute(text(f"""CREATE SCHEMA {SCHEMA};"""))
+
+    ok = True
+    try:
+        async with check_engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+            for migration in MIGRATIONS:
+                if migration.index_name:
+                    await connection.execute(text(f"""DROP INDEX IF EXISTS
+                    {migration.index_name};"""))
+            start = time.perf_counter()
+            await seed(connection, rows)
+            click.echo(f'seed of {rows} rows: {time.perf_counter() - start:.1f} s')
+
+        start = time.perf_counter()
+        applied = await run_migrations(check_engine, logger)
+        click.echo(f'migrations {applied}: {time.perf_counter() - start:.1f} s')
+
+        async with check_engine.connect() as connection:
+            connection = await connection.execution_options(isolation_level='AUTOCOMMIT')
+            await connection.execute(text(f"""ANALYZE {', '.join(sorted(BIG_TABLES))};"""))
+            for name, call in HOT_QUERIES.items():
+                session = ExplainSession(connection)
+                await call(session)
+                found = [scan for plan in session.plans for scan in scans(plan)]
+                seq = [relation for node, relation, _ in found
+                       if node == 'Seq Scan' and relation in BIG_TABLES]
+                ok = ok and not seq
+                click.echo(f'{"FAIL" if seq else "ok":>4} {name}')
+                for node, relation, index in found:
+                    click.echo(f'       {node} on {relation}{f" using {index}" if index else ""}')
+    finally:
+        if not keep:
+            async with engine.begin() as connection:
+                await connection.execute(text(f"""DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;"""))
+        await check_engine.dispose()
+        await engine.dispose()
+    return ok
+
+
+@click.command()
+@click.option('--rows', '-r', default=1_000_000)
+@click.option('--keep', is_flag=True, help='Keep schema with data after check.')
+def main(rows: int, keep: bool) -> None:
+    """
+    Check that hot queries use index scans at scale.
+    """
+    if not asyncio.run(run(rows, keep)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Local stand-in of REST API GitHub for latest releases with injection of faults.
+Repos owner{N}/repo{N} for N < --repos exist like in benchmarks.seed, a share of them
+has no releases (404). Every response waits latency from chosen distribution,
+a share of requests gets 5xx or connection reset. Rate limit of every token is counted
+in fixed window and sent in headers X-RateLimit-*, exhausted token gets 403.
+Latest release has ETag, conditional request of not changed release gets 304.
+POST /graphql answers aliased queries of github_graphql: latestRelease of every alias,
+error with path of alias for unknown repo and rateLimit with cost of query,
+cost is counted in own window of resource graphql.
+
+Server is plain asyncio HTTP/1.1 with keep-alive, so reset is a real abort of TCP connection.
+Control routes for benchmarks:
+    POST /_control/bump?fraction=0.1  new release for share of repos
+    GET /_stats                       counters of responses, ?reset=1 resets them
+
+Run from services/fastapi:
+    python -m benchmarks.fake_github --port 8083 --latency lognormal --latency-ms 80 --error-rate 0.01
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from collections import Counter
+from datetime import datetime as dt, timedelta
+from urllib.parse import parse_qs, urlsplit
+import click
+
+REASONS = {200: 'OK', 304: 'Not Modified', 403: 'Forbidden', 404: 'Not Found',
+           500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+RELEASE_DATE = dt(2023, 1, 1)
+
+
+class FakeGitHub:
+    """
+    State of fake API: releases of repos, windows of rate limit of tokens and counters.
+    """
+    def __init__(self, repos: int = 50_000, latency: str = 'fixed', latency_ms: float = 0,
+                 jitter_ms: float = 0, no_release: float = 0.05, error_rate: float = 0,
+                 reset_rate: float = 0, rate_limit: int = 1_000_000, rate_window: int = 3600,
+                 seed: int = 0):
+        """
+        :param repos: amount of existing repos
+        :param latency: distribution of latency: fixed, uniform or lognormal
+        :param latency_ms: mean latency in milliseconds
+        :param jitter_ms: half width of uniform or standard deviation of lognormal
+        :param no_release: share of repos without releases
+        :param error_rate: share of requests answered by 5xx
+        :param reset_rate: share of requests with reset of connection
+        :param rate_limit: requests of token in window
+        :param rate_window: window of rate limit in seconds
+        :param seed: seed of random
+        """
+        self.repos = repos
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.no_release = no_release
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.random = random.Random(seed)
+        self.versions = {}
+        self.windows = {}
+        self.stats = Counter()
+
+    def delay(self) -> float:
+        """
+        Latency of next response in seconds.
+        """
+        if self.latency == 'uniform':
+            value = self.random.uniform(self.latency_ms - self.jitter_ms,
+                                        self.latency_ms + self.jitter_ms)
+        elif self.latency == 'lognormal' and self.latency_ms > 0:
+            sigma = math.sqrt(math.log(1 + (self.jitter_ms / self.latency_ms) ** 2))
+            value = self.random.lognormvariate(math.log(self.latency_ms) - sigma ** 2 / 2, sigma)
+        else:
+            value = self.latency_ms
+        return max(value, 0) / 1000
+
+    def repo_index(self, owner: str, repo: str) -> int | None:
+        """
+        Index of existing repo by names owner{N}/repo{N}.
+        """
+        if not owner.startswith('owner') or repo != f'repo{owner[5:]}' or not owner[5:].isdigit():
+            return None
+        idx = int(owner[5:])
+        return idx if idx < self.repos else None
+
+    def has_release(self, idx: int) -> bool:
+        return (idx * 7919) % 10_000 >= self.no_release * 10_000
+
+    def bump(self, fraction: float) -> int:
+        """
+        Publish new release in share of repos.
+        :return: amount of bumped repos
+        """
+        bumped = self.random.sample(range(self.repos), int(self.repos * fraction))
+        for idx in bumped:
+            self.versions[idx] = self.versions.get(idx, 0) + 1
+        return len(bumped)
+
+    def rate_headers(self, token: str, cost: int = 1, resource: str = 'core') -> tuple:
+        """
+        Count cost of request of token in its window of resource.
+        :return: tuple(limited, headers of rate limit)
+        """
+        now = time.time()
+        start, used = self.windows.get((resource, token), (now, 0))
+        if now >= start + self.rate_window:
+            start, used = now, 0
+        limited = used + cost > self.rate_limit
+        if not limited:
+            used += cost
+        self.windows[(resource, token)] = (start, used)
+        return limited, {'X-RateLimit-Limit': str(self.rate_limit),
+                         'X-RateLimit-Remaining': str(self.rate_limit - used),
+                         'X-RateLimit-Reset': str(int(start + self.rate_window)),
+                         'X-RateLimit-Resource': resource}
+
+    def graphql(self, token: str, body: bytes) -> tuple:
+        """
+        Answer aliased query of latest releases with variables o{N} and n{N} of alias r{N}.
+        Cost of query is 1 point for every 100 aliases like in API GitHub.
+        :return: tuple(status, headers, body)
+        """
+        variables = json.loads(body or b'{}').get('variables') or {}
+        aliases = sorted(int(key[1:]) for key in variables
+                         if key.startswith('o') and key[1:].isdigit())
+        cost = max(math.ceil(len(aliases) / 100), 1)
+        limited, rate_headers = self.rate_headers(token, cost, 'graphql')
+        if limited:
+            self.stats['graphql 403'] += 1
+            return 403, rate_headers, b'{"message": "API rate limit exceeded"}'
+
+        data, errors = {}, []
+        for alias in aliases:
+            owner, repo = variables[f'o{alias}'], variables.get(f'n{alias}', '')
+            idx = self.repo_index(owner, repo)
+            if idx is None:
+                data[f'r{alias}'] = None
+                errors.append({'type': 'NOT_FOUND', 'path': [f'r{alias}'],
+                               'message': f"Could not resolve to a Repository "
+                                          f"with the name '{owner}/{repo}'."})
+                self.stats['graphql not_found'] += 1
+            elif not self.has_release(idx):
+                data[f'r{alias}'] = {'latestRelease': None}
+                self.stats['graphql no_release'] += 1
+            else:
+                version = self.versions.get(idx, 0)
+                created_at = RELEASE_DATE + timedelta(days=idx % 365 + version)
+                data[f'r{alias}'] = {'latestRelease': {
+                    'tagName': f'v1.{version}.0',
+                    'createdAt': created_at.strftime('%Y-%m-%dT%H:%M:%SZ')}}
+                self.stats['graphql release'] += 1
+        data['rateLimit'] = {'cost': cost,
+                             'remaining': int(rate_headers['X-RateLimit-Remaining']),
+                             'resetAt': dt.utcfromtimestamp(
+                                 int(rate_headers['X-RateLimit-Reset'])
+                             ).strftime('%Y-%m-%dT%H:%M:%SZ')}
+        answer = {'data': data, **({'errors': errors} if errors else {})}
+        self.stats['graphql 200'] += 1
+        return 200, {**rate_headers, 'Content-Type': 'application/json'}, json.dumps(answer).encode()
+
+    def latest_release(self, idx: int, owner: str, repo: str, headers: dict) -> tuple:
+        """
+        Answer of latest release with ETag.
+        :return: tuple(status, headers, body)
+        """
+        version = self.versions.get(idx, 0)
+        etag = f'"{hashlib.md5(f"{idx}:{version}".encode()).hexdigest()}"'
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, b''
+        created_at = RELEASE_DATE + timedelta(days=idx % 365 + version)
+        body = json.dumps({
+            'url': f'https://api.github.com/repos/{owner}/{repo}/releases/{version + 1}',
+            'html_url': f'https://github.com/{owner}/{repo}/releases/tag/v1.{version}.0',
+            'tag_name': f'v1.{version}.0', 'name': f'v1.{version}.0',
+            'draft': False, 'prerelease': False,
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'published_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'assets': [], 'body': 'Release notes. ' * 50}).encode()
+        return 200, {'ETag': etag, 'Content-Type': 'application/json'}, body
+
+    async def respond(self, method: str, target: str, headers: dict,
+                      body: bytes = b'') -> tuple | None:
+        """
+        Route request.
+        :return: tuple(status, headers, body) or None for reset of connection
+        """
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == '/_stats':
+            body = json.dumps({str(key): value for key, value in self.stats.items()}).encode()
+            if query.get('reset'):
+                self.stats.clear()
+            return 200, {'Content-Type': 'application/json'}, body
+        if url.path == '/_control/bump' and method == 'POST':
+            bumped = self.bump(float(query.get('fraction', ['0.1'])[0]))
+            return 200, {'Content-Type': 'application/json'}, json.dumps({'bumped': bumped}).encode()
+
+        await asyncio.sleep(self.delay())
+        if self.random.random() < self.reset_rate:
+            self.stats['reset'] += 1
+            return None
+        if self.random.random() < self.error_rate:
+            status = self.random.choice((500, 502, 503))
+            self.stats[status] += 1
+            return status, {'Content-Type': 'application/json'}, b'{"message": "Server Error"}'
+
+        token = headers.get('authorization', '').removeprefix('Bearer ')
+        if url.path == '/graphql' and method == 'POST':
+            return self.graphql(token, body)
+        limited, rate_headers = self.rate_headers(token)
+        if limited:
+            self.stats[403] += 1
+            return 403, rate_headers, b'{"message": "API rate limit exceeded"}'
+
+        parts = url.path.strip('/').split('/')
+        idx = None
+        if len(parts) == 5 and parts[0] == 'repos' and parts[3:] == ['releases', 'latest']:
+            idx = self.repo_index(parts[1], parts[2])
+        if idx is None or not self.has_release(idx):
+            self.stats[404] += 1
+            return 404, rate_headers, b'{"message": "Not Found"}'
+        status, headers, body = self.latest_release(idx, parts[1], parts[2], headers)
+        self.stats[status] += 1
+        return status, {**rate_headers, **headers}, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve requests of one keep-alive connection.
+        """
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = b''
+                if int(headers.get('content-length', 0)):
+                    body = await reader.readexactly(int(headers['content-length']))
+
+                answer = await self.respond(method, target, headers, body)
+                if answer is None:
+                    writer.transport.abort()
+                    return
+                status, response_headers, body = answer
+                response_headers['Content-Length'] = str(len(body))
+                writer.write(f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'.encode()
+                             + ''.join(f'{key}: {value}\r\n'
+                                       for key, value in response_headers.items()).encode()
+                             + b'\r\n' + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(fake: FakeGitHub, host: str, port: int) -> None:
+    """
+    Serve fake API till cancel.
+    """
+    server = await asyncio.start_server(fake.handle, host, port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+@click.command()
+@click.option('--host', '-h', default='127.0.0.1')
+@click.option('--port', '-p', default=8083)
+@click.option('--repos', '-r', default=50_000)
+@click.option('--latency', type=click.Choice(['fixed', 'uniform', 'lognormal']), default='fixed')
+@click.option('--latency-ms', default=0.0)
+@click.option('--jitter-ms', default=0.0)
+@click.option('--no-release', default=0.05, help='Share of repos without releases.')
+@click.option('--error-rate', default=0.0, help='Share of 5xx answers.')
+@click.option('--reset-rate', default=0.0, help='Share of reset connections.')
+@click.option('--rate-limit', default=1_000_000, help='Requests of token in window.')
+@click.option('--rate-window', default=3600, help='Window of rate limit in seconds.')
+@click.option('--seed', default=0)
+def main(host: str, port: int, **kwargs) -> None:
+    """
+    Run fake API GitHub.
+    """
+    click.echo(f'Fake API GitHub on http://{host}:{port}')
+    asyncio.run(serve(FakeGitHub(**kwargs), host, port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Local fake Telegram for bot in webhook mode.
+Serve fake Bot API, which answers every method and records sent messages,
+and send updates to webhook of bot like Telegram does.
+Print rejected updates, latency of webhook and time from update to reply of bot.
+
+Start this tool first, then bot with env:
+    TELEGRAM_BOT_MODE=webhook TELEGRAM_WEBHOOK_SECRET=secret
+    TELEGRAM_API_URL=http://localhost:8081/bot python bot.py
+
+Run from services/fastapi:
+    python -m benchmarks.fake_telegram --webhook http://localhost:8443/telegram --secret secret
+"""
+import asyncio
+import itertools
+import statistics
+import time
+from urllib.parse import parse_qsl
+import click
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Rchecker', 'username': 'fake_bot',
+            'can_join_groups': False, 'can_read_all_group_messages': False,
+            'supports_inline_queries': False}
+
+
+def create_fake_api(replies: dict) -> FastAPI:
+    """
+    Fake Bot API: getMe returns bot, sendMessage returns message, other methods return True.
+    :param replies: dict chat_id: list of time of messages, filled by sendMessage
+    """
+    app = FastAPI(docs_url=None, redoc_url=None)
+    message_ids = itertools.count(1)
+
+    @app.post('/bot{token}/{method}')
+    async def bot_api(request: Request, method: str):
+        """
+        Answer method of Bot API.
+        """
+        form = dict(parse_qsl((await request.body()).decode()))
+        if method == 'getMe':
+            return {'ok': True, 'result': BOT_USER}
+        if method == 'sendMessage':
+            chat_id = int(form['chat_id'])
+            replies.setdefault(chat_id, []).append(time.monotonic())
+            return {'ok': True, 'result': {'message_id': next(message_ids),
+                                           'date': int(time.time()),
+                                           'chat': {'id': chat_id, 'type': 'private'},
+                                           'from': BOT_USER,
+                                           'text': form.get('text', '')}}
+        return {'ok': True, 'result': True}
+
+    return app
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """
+    Update with private message of user.
+    """
+    message = {'message_id': update_id, 'date': int(time.time()),
+               'chat': {'id': chat_id, 'type': 'private'},
+               'from': {'id': chat_id, 'is_bot': False, 'first_name': f'User{chat_id}'},
+               'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0,
+                                'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def run(webhook: str, secret: str, updates: int, concurrency: int, text: str,
+              api_port: int, startup_timeout: float, timeout: float):
+    """
+    Start fake Bot API, wait webhook of bot, send updates and collect replies.
+    """
+    replies = {}
+    server = uvicorn.Server(uvicorn.Config(create_fake_api(replies), port=api_port,
+                                           log_level='warning'))
+    api_task = asyncio.create_task(server.serve())
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        click.echo(f'fake Bot API on port {api_port}, waiting webhook {webhook}')
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                await client.post(webhook, json={})
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise click.ClickException('Webhook of bot is unavailable.')
+                await asyncio.sleep(1)
+
+        rejected = await client.post(webhook, json=make_update(0, 1, text),
+                                     headers={SECRET_HEADER: 'wrong'})
+        click.echo(f'update with wrong secret: {rejected.status_code}')
+
+        semaphore = asyncio.Semaphore(concurrency)
+        sent_at, latencies, failed = {}, [], []
+
+        async def send(idx):
+            chat_id = 10 ** 9 + idx
+            async with semaphore:
+                sent_at[chat_id] = start = time.monotonic()
+                try:
+                    response = await client.post(webhook, json=make_update(idx + 1, chat_id, text),
+                                                 headers={SECRET_HEADER: secret})
+                    if response.status_code != 200:
+                        failed.append(response.status_code)
+                except httpx.HTTPError as e:
+                    failed.append(str(e))
+                latencies.append(time.monotonic() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[send(idx) for idx in range(updates)])
+        sending = time.perf_counter() - start
+
+        deadline = time.monotonic() + timeout
+        while len(replies) < len(sent_at) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+    server.should_exit = True
+    await api_task
+
+    latencies.sort()
+    to_reply = sorted(replies[chat_id][0] - sent_at[chat_id]
+                      for chat_id in sent_at if chat_id in replies)
+    click.echo(f'updates: {updates}, failed: {len(failed)}, sent in {sending:.2f} s '
+               f'({updates / sending:.0f} updates/s)')
+    click.echo(f'webhook latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+               f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+    if to_reply:
+        click.echo(f'replied chats: {len(to_reply)}/{updates}, update to first reply: '
+                   f'mean {statistics.fmean(to_reply) * 1000:.0f} ms, '
+                   f'p95 {to_reply[int(len(to_reply) * 0.95)] * 1000:.0f} ms')
+    else:
+        click.echo('no replies of bot')
+
+
+@click.command()
+@click.option('--webhook', '-w', default='http://localhost:8443/telegram')
+@click.option('--secret', '-s', required=True)
+@click.option('--updates', '-u', default=200)
+@click.option('--concurrency', '-c', default=20)
+@click.option('--text', '-t', default='/start')
+@click.option('--api-port', default=8081)
+@click.option('--startup-timeout', default=60.0)
+@click.option('--timeout', default=60.0)
+def main(webhook: str, secret: str, updates: int, concurrency: int, text: str,
+         api_port: int, startup_timeout: float, timeout: float) -> None:
+    """
+    Send updates to bot in webhook mode by fake Telegram.
+    """
+    asyncio.run(run(webhook, secret, updates, concurrency, text,
+                    api_port, startup_timeout, timeout))
+
+
+if __name__ == '__main__':
+    main()
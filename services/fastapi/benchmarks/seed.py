@@ -0,0 +1,93 @@
+"""
+Seed local database with large dataset for benchmarks of API.
+Rows are generated by generate_series on server, so millions of rows take seconds.
+Users have ids 1..users, repos are owner{N}/repo{N} with ids 1..repos,
+subscriptions are spread evenly over users, pending notifications are taken
+from subscriptions in order of insert, so every user gets some.
+All tables of users, repos and their subscriptions are truncated before seed.
+
+Run from services/fastapi with env of database:
+    python -m benchmarks.seed --users 100000 --repos 50000 --subscriptions 2000000 --notifications 500000
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime as dt
+import click
+from sqlalchemy import text
+
+from database import Base, engine
+from database import sm as session_maker
+from migrations import run_migrations
+from querysets import ReposScheduleQueryset
+
+TABLES = ['users', 'repos', 'repos_cache', 'repos_schedule', 'subscriptions', 'notifications',
+          'notificationjobs', 'instant_alerts', 'ingest_jobs', 'ingest_job_repos',
+          'releases']
+
+STEPS = [
+    ('users', """INSERT INTO users (user_id, username, first_name)
+    SELECT g, 'user' || g, 'User' || g FROM generate_series(1, :users) AS g;"""),
+    ('repos', """INSERT INTO repos (uri, api_uri, owner, repo_name, release, release_date)
+    SELECT 'https://github.com/owner' || g || '/repo' || g,
+    'https://api.github.com/repos/owner' || g || '/repo' || g || '/releases/latest',
+    'owner' || g, 'repo' || g, 'v1.' || (g % 50) || '.0',
+    (now() AT TIME ZONE 'utc') - (g % 1000) * interval '1 day'
+    FROM generate_series(1, :repos) AS g ORDER BY g;"""),
+    ('subscriptions', """INSERT INTO subscriptions (user_id, repo_id, repo_name, owner)
+    SELECT 1 + g % :users, r.id, r.repo_name, r.owner FROM generate_series(0, :subscriptions - 1)
+    AS g JOIN repos AS r ON r.id = 1 + ((g % :users) * 7919 + g / :users) % :repos
+    ON CONFLICT DO NOTHING;"""),
+    ('notifications', """INSERT INTO notifications (user_id, repo_id)
+    SELECT s.user_id, s.repo_id FROM subscriptions AS s LIMIT :notifications
+    ON CONFLICT DO NOTHING;"""),
+    ('notificationjobs', """INSERT INTO notificationjobs (user_id, chat_id, hour, minute)
+    SELECT g, g, g % 24, g % 60 FROM generate_series(1, :users, 10) AS g;"""),
+]
+
+
+async def seed(volumes: dict) -> None:
+    """
+    Create schema, truncate tables and insert generated rows.
+    """
+    logger = logging.getLogger(__name__)
+    logging.basicConfig(level=logging.INFO)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine, logger)
+
+    async with session_maker.begin() as session:
+        await session.execute(text(f"""TRUNCATE {', '.join(TABLES)} RESTART IDENTITY;"""))
+    for table, query in STEPS:
+        start = time.perf_counter()
+        async with session_maker.begin() as session:
+            result = await session.execute(text(query), volumes)
+        click.echo(f'{table}: {result.rowcount} rows in {time.perf_counter() - start:.1f} s')
+
+    async with session_maker.begin() as session:
+        await ReposScheduleQueryset.create_missing(session, dt.utcnow())
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text("""VACUUM ANALYZE;"""))
+    await engine.dispose()
+    click.echo('Tables are analyzed.')
+
+
+@click.command()
+@click.option('--users', '-u', default=100_000)
+@click.option('--repos', '-r', default=50_000)
+@click.option('--subscriptions', '-s', default=2_000_000)
+@click.option('--notifications', '-n', default=500_000)
+@click.option('--yes', '-y', is_flag=True, help='Truncate tables without confirmation.')
+def main(users: int, repos: int, subscriptions: int, notifications: int, yes: bool) -> None:
+    """
+    Seed database for benchmarks of API.
+    """
+    if not yes:
+        click.confirm(f'Tables {", ".join(TABLES)} will be truncated. Continue?', abort=True)
+    asyncio.run(seed({'users': users, 'repos': repos,
+                      'subscriptions': subscriptions, 'notifications': notifications}))
+
+
+if __name__ == '__main__':
+    main()
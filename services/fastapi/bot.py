@@ -2,26 +2,70 @@
 Module of Async Telegram Bot.
 """
 import os
+import asyncio
 import datetime
 import logging
 import re
-import json
 import pytz
-import requests
 import yaml
 
-from telegram import Update, ReplyKeyboardMarkup, BotCommand
+from telegram import (Update, ReplyKeyboardMarkup, BotCommand,
+                      InlineKeyboardButton, InlineKeyboardMarkup)
 from telegram.ext import (Application, ContextTypes,
                           CommandHandler, MessageHandler,
-                          ConversationHandler)
+                          ConversationHandler, CallbackQueryHandler)
 from telegram.ext.filters import Regex, ALL
 
-from database import sm as session_maker
-from querysets import NotificationJobsQueryset
+from database import engine, sm as session_maker
+from querysets import (NotificationJobsQueryset, InstantAlertsQueryset, BotDispatchesQueryset,
+                       BotShownSubscriptionsQueryset)
+from pubsub import Listener
+from release_poller import RELEASES_CHANNEL
 from bot_menu_schema import menu_schema
+from api_client import FastAPIClient
+from bot_webhook import run_webhook
+from metrics import start_metrics_server
+from send_limiter import OutboundRateLimiter, BULK
+from update_processor import PerUserUpdateProcessor
 
 
 TIMEZONE = pytz.timezone('Europe/Moscow')
+ADD_REPOS_POLLS = 300
+ADD_REPOS_POLL_INTERVAL = 1
+ONE_MINUTE = datetime.timedelta(minutes=1)
+ONE_DAY = datetime.timedelta(days=1)
+DISPATCH_CATCH_UP = 10
+DISPATCH_CONCURRENCY = int(os.environ.get('DISPATCH_CONCURRENCY', 20))
+ALERT_DEBOUNCE = float(os.environ.get('ALERT_DEBOUNCE', 2))
+SUBSCRIPTIONS_PAGE_SIZE = int(os.environ.get('SUBSCRIPTIONS_PAGE_SIZE', 10))
+MESSAGE_LIMIT = 4096
+REPO_INFO = '{}. [{}(by {})]({}), релиз № {} от {} '
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """
+    Split text to messages not longer than limit of Telegram by boundaries of lines,
+    so links of Markdown aren't broken. Too long line is cut.
+    :param text: text of message
+    :param limit: max length of one message
+    :return: list of messages
+    """
+    messages, lines, length = [], [], 0
+    for line in text.split('\n'):
+        while len(line) > limit:
+            if lines:
+                messages.append('\n'.join(lines))
+                lines, length = [], 0
+            messages.append(line[:limit])
+            line = line[limit:]
+        if lines and length + 1 + len(line) > limit:
+            messages.append('\n'.join(lines))
+            lines, length = [], 0
+        length += len(line) + (1 if lines else 0)
+        lines.append(line)
+    if lines:
+        messages.append('\n'.join(lines))
+    return messages
 
 
 def create_bot():
@@ -41,22 +85,32 @@ def create_bot():
         """
         Before start bot init this commands and run its.
         """
-        async with application.sm.begin() as session:
-            current_jobs = await NotificationJobsQueryset.select(session)
-            if current_jobs:
-                for user_id, chat_id, hour, minute in current_jobs:
-                    application.job_queue.run_daily(callback=send_notifications,
-                                                    time=datetime.time(hour=hour,
-                                                                       minute=minute,
-                                                                       tzinfo=TIMEZONE),
-                                                    user_id=user_id,
-                                                    chat_id=chat_id)
+        application.api = FastAPIClient()
+        now = datetime.datetime.now(TIMEZONE)
+        application.bot_data['dispatched_at'] = now.replace(second=0, microsecond=0)
+        application.job_queue.run_repeating(callback=dispatch_notifications,
+                                            interval=60,
+                                            first=60 - now.second - now.microsecond / 10 ** 6)
+        application.bot_data['alert_repos'] = set()
+        application.bot_data['alert_task'] = None
+        application.releases_listener = Listener(engine, RELEASES_CHANNEL,
+                                                 lambda event: receive_releases(application,
+                                                                                event),
+                                                 logging.getLogger(__name__))
+        await application.releases_listener.start()
         command_info = [
             BotCommand('start', 'чтобы начать беседу'),
             BotCommand('cancel', 'закончить эту беседу что бы начать такую же')
         ]
         await application.bot.set_my_commands(command_info)
 
+    async def post_shutdown(application: Application):
+        """
+        After stop bot close connections to FastAPI and channel of releases.
+        """
+        await application.releases_listener.stop()
+        await application.api.aclose()
+
     async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Send hello message to concrete user.
@@ -67,11 +121,8 @@ def create_bot():
         first_name = ''
         if update.message.from_user.first_name:
             first_name = update.message.from_user.first_name
-        send_user = {'user_id': update.message.from_user.id,
-                     'username': username,
-                     'first_name': first_name}
-        uri = 'http://fastapi:8880/add_user'
-        requests.post(uri, json=send_user, timeout=60)
+        await context.application.api.add_user(update.message.from_user.id,
+                                               username, first_name)
 
         us_name = username if username else first_name if first_name else 'Stranger'
 
@@ -94,45 +145,47 @@ def create_bot():
                                        parse_mode='Markdown')
         return 0
 
-    def get_releases(user):
+    def format_releases(releases):
         """
-        Send get request of FastAPI and select all repos
-        whom have new release by user who have subscriptions on repo.
+        Format list of repos with new release as message.
         """
-        uri = f'http://fastapi:8880/get_releases/{user}'
-        response = requests.get(uri, timeout=60)
         subscriptions_repos = 'Список обновленных релизов: \n{}'
-        if response.status_code == 200:
-            response_subscriptions = json.loads(response.text)
-            if response_subscriptions:
-                subscript = ''
-                for idx, repo in enumerate(response_subscriptions):
-                    if repo['user_id'] == user:
-                        repo_info = "{}. [{}(by {})]({}), релиз № {} от {} \n"
-                        subscript += repo_info.format(idx + 1,
-                                                      repo['repo_name'],
-                                                      repo['owner'],
-                                                      repo['repo_uri'],
-                                                      repo['release'],
-                                                      repo['release_date'])
-            else:
-                subscript = 'Обновлений не обнаружено.\U0001F61E'
+        if releases:
+            subscript = ''.join([REPO_INFO.format(idx + 1,
+                                                  repo['repo_name'],
+                                                  repo['owner'],
+                                                  repo['repo_uri'],
+                                                  repo['release'],
+                                                  repo['release_date']) + '\n'
+                                 for idx, repo in enumerate(releases)])
         else:
-            subscript = 'Неизвестная ошибка чтения списка обновленных релизов.\U0001F47D'
+            subscript = 'Обновлений не обнаружено.\U0001F61E'
+        return subscriptions_repos.format(subscript)
 
-        subscriptions_repos = subscriptions_repos.format(subscript)
-        return subscriptions_repos
+    async def get_releases(api: FastAPIClient, user):
+        """
+        Send get request of FastAPI and select all repos
+        whom have new release by user who have subscriptions on repo.
+        """
+        response_subscriptions = await api.get_releases(user)
+        if response_subscriptions is not None:
+            return format_releases([repo for repo in response_subscriptions
+                                    if repo['user_id'] == user])
+        subscript = 'Неизвестная ошибка чтения списка обновленных релизов.\U0001F47D'
+        return 'Список обновленных релизов: \n{}'.format(subscript)
 
     async def check_releases(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Check repos on new release from subscriptions by user.
         """
         await update.message.reply_text('Секундочку... это может занять некоторе время.')
-        subscriptions_repos = get_releases(update.message.from_user.id)
+        subscriptions_repos = await get_releases(context.application.api,
+                                                 update.message.from_user.id)
 
-        await context.bot.send_message(chat_id=update.effective_chat.id,
-                                       text=subscriptions_repos,
-                                       parse_mode='Markdown', disable_web_page_preview=True)
+        for text in split_message(subscriptions_repos):
+            await context.bot.send_message(chat_id=update.effective_chat.id,
+                                           text=text,
+                                           parse_mode='Markdown', disable_web_page_preview=True)
         await start_communication(update, context)
         return 0
 
@@ -149,46 +202,90 @@ def create_bot():
                                        reply_markup=reply_markup, parse_mode='Markdown')
         return 1
 
-    def get_subscription(user):
+    async def get_subscription_page(api: FastAPIClient, user, after=None, before=None, start=1):
         """
-        Select list of subscriptions on repo by user.
+        Select one page of subscriptions on repo by user and format it as message
+        with buttons of next and previous pages.
+        :param api: client of FastAPI
+        :param user: id of user
+        :param after: id of repo after which page starts
+        :param before: id of repo before which page ends
+        :param start: number of first repo of page in full list
+        :return: tuple(text, inline keyboard or None,
+                       shown repos as number: [owner, repo_name, uri])
         """
-        uri = f'http://fastapi:8880/get_subscriptions/{user}'
-        response = requests.get(uri, timeout=60)
-
+        page = await api.get_subscriptions_page(user, after=after, before=before,
+                                                limit=SUBSCRIPTIONS_PAGE_SIZE)
         subscriptions_repos = 'Твой список подписок: \n{}'
-        repos = {}
-        if response.status_code == 200:
-            response_subscriptions = json.loads(response.text)
-            if response_subscriptions:
-                subscript = ''
-                for idx, repo in enumerate(response_subscriptions):
-                    if repo['user_id'] == user:
-                        repo_info = "{}. [{}(by {})]({}), релиз № {} от {} \n"
-                        subscript += repo_info.format(idx + 1,
-                                                      repo['repo_name'],
-                                                      repo['owner'],
-                                                      repo['repo_uri'],
-                                                      repo['release'],
-                                                      repo['release_date'])
-                        repos[idx + 1] = [repo['owner'], repo['repo_name'], f"'{repo['repo_uri']}'"]
-            else:
-                subscript = 'Подписок не обнаружено.\U0001F61E'
-        else:
-            subscript = 'Неизвестная ошибка чтения списка подписок.\U0001F47D'
+        if page is None:
+            return subscriptions_repos.format('Неизвестная ошибка чтения списка подписок.'
+                                              '\U0001F47D'), None, {}
+        if not page['repos']:
+            return subscriptions_repos.format('Подписок не обнаружено.\U0001F61E'), None, {}
+
+        subscript = '\n'.join([REPO_INFO.format(start + idx,
+                                                repo['repo_name'],
+                                                repo['owner'],
+                                                repo['repo_uri'],
+                                                repo['release'],
+                                                repo['release_date'])
+                               for idx, repo in enumerate(page['repos'])])
+        buttons = []
+        if page['prev'] is not None:
+            prev_start = max(start - SUBSCRIPTIONS_PAGE_SIZE, 1)
+            buttons.append(InlineKeyboardButton('\u2B05 Назад',
+                                                callback_data=f'subs:b:{page["prev"]}:{prev_start}'))
+        if page['next'] is not None:
+            next_start = start + len(page['repos'])
+            buttons.append(InlineKeyboardButton('Дальше \u27A1',
+                                                callback_data=f'subs:a:{page["next"]}:{next_start}'))
+        shown = {start + idx: [repo['owner'], repo['repo_name'], repo['repo_uri']]
+                 for idx, repo in enumerate(page['repos'])}
+        return (subscriptions_repos.format(subscript),
+                InlineKeyboardMarkup([buttons]) if buttons else None, shown)
+
+    async def send_subscription_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Send first page of list subscriptions.
+        Numbers of shown repos are kept in database for deletion by numbers on any replica.
+        """
+        text, reply_markup, shown = await get_subscription_page(context.application.api,
+                                                                update.message.from_user.id)
+        async with context.application.sm.begin() as session:
+            await BotShownSubscriptionsQueryset.add(session, update.effective_chat.id,
+                                                    update.message.from_user.id, shown,
+                                                    replace=True)
+        await context.bot.send_message(chat_id=update.effective_chat.id,
+                                       text=text, reply_markup=reply_markup,
+                                       parse_mode='Markdown', disable_web_page_preview=True)
 
-        return subscriptions_repos.format(subscript), repos
+    async def turn_subscription_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Show next or previous page of list subscriptions in the same message.
+        Only requested page is selected from FastAPI.
+        """
+        query = update.callback_query
+        _, direction, cursor, start = query.data.split(':')
+        cursor = int(cursor)
+        text, reply_markup, shown = await get_subscription_page(
+            context.application.api, query.from_user.id,
+            after=cursor if direction == 'a' else None,
+            before=cursor if direction == 'b' else None,
+            start=int(start))
+        async with context.application.sm.begin() as session:
+            await BotShownSubscriptionsQueryset.add(session, update.effective_chat.id,
+                                                    query.from_user.id, shown)
+        await query.answer()
+        await query.edit_message_text(text=text, reply_markup=reply_markup,
+                                      parse_mode='Markdown', disable_web_page_preview=True)
 
     async def list_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
-        Send of list subscriptions.
+        Send of list subscriptions by pages.
         """
-        subscriptions_repos, _ = get_subscription(update.message.from_user.id)
-        subscriptions_repos += '\n'.join(replicas['list_subscription_add'])
-
+        await send_subscription_page(update, context)
         await context.bot.send_message(chat_id=update.effective_chat.id,
-                                       text=subscriptions_repos,
-                                       parse_mode='Markdown', disable_web_page_preview=True)
+                                       text='\n'.join(replicas['list_subscription_add']))
         await manage_subscription(update, context)
         return 1
 
@@ -229,17 +326,130 @@ def create_bot():
                                        reply_markup=reply_markup)
         return 4
 
-    async def send_notifications(context):
+    async def dispatch_notifications(context: ContextTypes.DEFAULT_TYPE):
         """
-        Send notifications if its have.
+        Send notifications to all users whose time has come.
+        One tick per minute: users are selected by time of notifications,
+        their new releases are streamed by one bulk request and sent in parallel.
+        Minutes missed by delay of tick are dispatched too.
+        Every minute is claimed in database, so only one replica of bot dispatches it.
         """
-        user_id = context._user_id
-        chat_id = context._chat_id
-        subscriptions_repos = get_releases(user_id)
-        if subscriptions_repos:
-            await context.bot.send_message(chat_id=chat_id,
-                                           text=subscriptions_repos,
-                                           parse_mode='Markdown', disable_web_page_preview=True)
+        now = datetime.datetime.now(TIMEZONE).replace(second=0, microsecond=0)
+        dispatched_at = context.bot_data.get('dispatched_at', now - ONE_MINUTE)
+        minutes = []
+        while dispatched_at < now and len(minutes) < DISPATCH_CATCH_UP:
+            dispatched_at += ONE_MINUTE
+            minutes.append(dispatched_at)
+        context.bot_data['dispatched_at'] = now
+
+        for minute in minutes:
+            async with context.application.sm.begin() as session:
+                claimed = await BotDispatchesQueryset.claim(session, minute.replace(tzinfo=None),
+                                                            (now - ONE_DAY).replace(tzinfo=None))
+                users = []
+                if claimed:
+                    users = await NotificationJobsQueryset.select_by_time(session,
+                                                                          minute.hour,
+                                                                          minute.minute)
+            if not users:
+                continue
+            await deliver(context.application, dict(users), send_empty=True)
+            logging.info('Notifications of %02d:%02d were sent to %s users. Limiter: %s',
+                         minute.hour, minute.minute, len(users),
+                         context.bot.rate_limiter.stats())
+
+    async def deliver(application: Application, chats, send_empty):
+        """
+        Claim new releases of users by one bulk request and send them in parallel.
+        :param application: application of bot
+        :param chats: dict user_id: chat_id
+        :param send_empty: send message "no updates" to users without new releases
+        :return: amount of sent messages
+        """
+        chats = dict(chats)
+        semaphore = asyncio.Semaphore(DISPATCH_CONCURRENCY)
+        tasks = set()
+
+        async def send(chat_id, text):
+            try:
+                for chunk in split_message(text):
+                    await application.bot.send_message(chat_id=chat_id, text=chunk,
+                                                       parse_mode='Markdown',
+                                                       disable_web_page_preview=True,
+                                                       rate_limit_args=BULK)
+            except Exception as e:
+                logging.error('Wrong send notifications to chat %s with error: %s',
+                              chat_id, e)
+            finally:
+                semaphore.release()
+
+        async def schedule(chat_id, text):
+            await semaphore.acquire()
+            task = asyncio.create_task(send(chat_id, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        sent = 0
+        async for user_id, releases in application.api.iter_releases(users=list(chats)):
+            chat_id = chats.pop(user_id, None)
+            if chat_id is not None:
+                await schedule(chat_id, format_releases(releases))
+                sent += 1
+        if send_empty:
+            for chat_id in chats.values():
+                await schedule(chat_id, format_releases([]))
+                sent += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        return sent
+
+    def receive_releases(application: Application, event):
+        """
+        Collect repos with new releases from channel of poller.
+        Events of one poll cycle are gathered for ALERT_DEBOUNCE and sent by one wave.
+        """
+        application.bot_data['alert_repos'].update(repo_id for repo_id, _ in event['releases'])
+        task = application.bot_data['alert_task']
+        if task is None or task.done():
+            application.bot_data['alert_task'] = asyncio.create_task(send_alerts(application))
+
+    async def send_alerts(application: Application):
+        """
+        Send new releases at once to users with instant notifications
+        who have subscriptions on updated repos.
+        Releases are claimed like by daily notifications, so they aren't sent twice.
+        """
+        while application.bot_data['alert_repos']:
+            await asyncio.sleep(ALERT_DEBOUNCE)
+            repos = application.bot_data['alert_repos']
+            application.bot_data['alert_repos'] = set()
+            try:
+                async with application.sm.begin() as session:
+                    users = await InstantAlertsQueryset.select_by_repos(session, repos)
+                if users:
+                    sent = await deliver(application, dict(users), send_empty=False)
+                    logging.info('Instant notifications of %s repos were sent to %s users.',
+                                 len(repos), sent)
+            except Exception as e:
+                logging.error('Wrong send instant notifications with error: %s', e)
+
+    async def toggle_instant_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Turn on or turn off instant notifications of user.
+        """
+        async with context.application.sm.begin() as session:
+            deleted = await InstantAlertsQueryset.delete(session, update.message.from_user.id)
+            if not deleted:
+                await InstantAlertsQueryset.create(session, update.message.from_user.id,
+                                                   update.effective_message.chat_id)
+        if deleted:
+            text = 'Мгновенные уведомления отключены. \U0001F515'
+        else:
+            text = ('Мгновенные уведомления включены. '
+                    'Я напишу тебе, как только выйдет новый релиз! \U000026A1')
+        await update.message.reply_text(text)
+        await manage_subscription(update, context)
+        return 1
 
     async def set_notification(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -247,24 +457,11 @@ def create_bot():
         """
         parse_libs = re.findall(r'^([0,1]?\d|[2][0-3]):([0-5]\d)$', update.message.text)[0]
         if parse_libs:
-            if context.job_queue.jobs():
-                for job in context.job_queue.jobs():
-                    if job.user_id == update.message.from_user.id:
-                        job.schedule_removal()
-                        async with context.application.sm.begin() as session:
-                            await NotificationJobsQueryset.delete(session,
-                                                                  update.message.from_user.id)
-
             hour = int(parse_libs[0])
             minute = int(parse_libs[1])
 
-            context.job_queue.run_daily(callback=send_notifications,
-                                        time=datetime.time(hour=hour, minute=minute,
-                                                           tzinfo=pytz.timezone('Europe/Moscow')),
-                                        user_id=update.message.from_user.id,
-                                        chat_id=update.effective_message.chat_id
-                                        )
             async with context.application.sm.begin() as session:
+                await NotificationJobsQueryset.delete(session, update.message.from_user.id)
                 await NotificationJobsQueryset.create(session,
                                                       (update.message.from_user.id,
                                                        update.effective_message.chat_id,
@@ -282,12 +479,8 @@ def create_bot():
         """
         Delete all notifications by user.
         """
-        if context.job_queue.jobs():
-            for job in context.job_queue.jobs():
-                if job.user_id == update.message.from_user.id:
-                    job.schedule_removal()
-                    async with context.application.sm.begin() as session:
-                        await NotificationJobsQueryset.delete(session, update.message.from_user.id)
+        async with context.application.sm.begin() as session:
+            await NotificationJobsQueryset.delete(session, update.message.from_user.id)
         await update.message.reply_text('Ты успешно отписался от всех уведомлений! \U0001F515')
         await manage_subscription(update, context)
         return 1
@@ -321,37 +514,79 @@ def create_bot():
     async def add_repos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Send post request and create repo(s).
+        Handler answers at once, result of job is reported by job of job_queue.
         """
         parse_libs = re.findall(r'(https://github.com/([^/]+)/([^/,]+))', update.message.text)
         libs = []
         for lib in parse_libs:
             libs.append((lib[1], lib[2]))
 
-        await update.message.reply_text('Секундочку... это может занять некоторе время.')
-
-        send_repos = {'user_id': update.message.from_user.id,
-                      'repos': libs}
-        uri = 'http://fastapi:8880/add_repos'
-        response = requests.post(uri, json=send_repos, timeout=60)
-
-        if response.status_code == 201:
-            if len(parse_libs) == 0:
-                text = 'Не удалось определить путь до библиотеки{}'
-                await update.message.reply_text(text.format('\U0001F61E'))
-            elif len(parse_libs) == 1:
-                text = 'Библиотека {}(by {}) добавлена в список отслеживания{}'
-                await update.message.reply_text(text.format(libs[0][1],
-                                                            libs[0][0],
-                                                            '\U0001F44C'))
-            elif len(parse_libs) > 1:
-                multi_libs = ', '.join([f'{lib[1]}(by {lib[0]})' for lib in libs])
-                text = 'Библиотеки {} добавлены к отслеживанию{}'
-                await update.message.reply_text(text.format(multi_libs,
-                                                            '\U0001F44C'))
-            await add_subscription(update, context)
-
+        if not libs:
+            text = 'Не удалось определить путь до библиотеки{}'
+            await update.message.reply_text(text.format('\U0001F61E'))
+            return 2
+
+        job_id = await context.application.api.add_repos(update.message.from_user.id, libs)
+        if job_id is None:
+            await update.message.reply_text('Не удалось добавить подписки{}'.format('\U0001F47D'))
+            return 2
+
+        await update.message.reply_text('Секундочку... это может занять некоторе время. '
+                                        'Я напишу, как только библиотеки будут добавлены.')
+        context.job_queue.run_repeating(callback=report_add_repos,
+                                        interval=ADD_REPOS_POLL_INTERVAL,
+                                        first=ADD_REPOS_POLL_INTERVAL,
+                                        chat_id=update.effective_chat.id,
+                                        user_id=update.message.from_user.id,
+                                        data={'job_id': job_id, 'polls': 0},
+                                        name=f'add_repos:{job_id}')
+        await add_subscription(update, context)
         return 2
 
+    def format_add_repos(job):
+        """
+        Format result of job of addition subscriptions as list of messages.
+        """
+        if not job or job['status'] != 'done':
+            if job and job['status'] != 'error':
+                return ['Библиотеки еще добавляются, загляни в список подписок чуть позже'
+                        '\U0001F552']
+            return ['Не удалось добавить подписки{}'.format('\U0001F47D')]
+
+        texts = []
+        libs = [(repo['owner'], repo['repo_name'])
+                for repo in job['repos'] if repo['status'] == 'subscribed']
+        not_found = [(repo['owner'], repo['repo_name'])
+                     for repo in job['repos'] if repo['status'] == 'not_found']
+        if len(libs) == 1:
+            text = 'Библиотека {}(by {}) добавлена в список отслеживания{}'
+            texts.append(text.format(libs[0][1], libs[0][0], '\U0001F44C'))
+        elif len(libs) > 1:
+            multi_libs = ', '.join([f'{lib[1]}(by {lib[0]})' for lib in libs])
+            text = 'Библиотеки {} добавлены к отслеживанию{}'
+            texts.append(text.format(multi_libs, '\U0001F44C'))
+        if not_found:
+            missed_libs = ', '.join([f'{lib[1]}(by {lib[0]})' for lib in not_found])
+            text = 'Не удалось найти релизы библиотек {}{}'
+            texts.append(text.format(missed_libs, '\U0001F61E'))
+        return texts
+
+    async def report_add_repos(context: ContextTypes.DEFAULT_TYPE):
+        """
+        Check job of addition subscriptions and send its result when it's finished.
+        Job is checked every ADD_REPOS_POLL_INTERVAL but not more than ADD_REPOS_POLLS times.
+        """
+        job = context.job
+        job.data['polls'] += 1
+        progress = await context.application.api.get_add_repos_job(job.data['job_id'])
+        finished = progress is not None and progress['status'] in ('done', 'error')
+        if not finished and job.data['polls'] < ADD_REPOS_POLLS:
+            return
+        job.schedule_removal()
+        for text in format_add_repos(progress):
+            for chunk in split_message(text):
+                await context.bot.send_message(chat_id=job.chat_id, text=chunk)
+
     async def delete_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Send instructions how delete list of repos subscriptions.
@@ -362,41 +597,41 @@ def create_bot():
         await context.bot.send_message(chat_id=update.effective_chat.id,
                                        text='\n'.join(replicas['delete_list']),
                                        reply_markup=reply_markup)
-        subscriptions_repos, _ = get_subscription(update.message.from_user.id)
-        await context.bot.send_message(chat_id=update.effective_chat.id,
-                                       text=subscriptions_repos,
-                                       parse_mode='Markdown', disable_web_page_preview=True)
+        await send_subscription_page(update, context)
 
         return 3
 
     async def delete_repos(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Send post request and delete repo(s) subscriptions by user.
-        """
-        _, repos = get_subscription(update.message.from_user.id)
-
-        parse_id_libs = re.findall(r'(\d)', update.message.text)
-        libs = []
-        repos_uri = []
-        for lib in parse_id_libs:
-            libs.append(repos[int(lib)])
-            repos_uri.append(repos[int(lib)][2])
-
-        send_repos = {'user_id': update.message.from_user.id,
-                      'repos': repos_uri}
-        uri = 'http://fastapi:8880/delete_subscriptions'
-        response = requests.post(uri, json=send_repos, timeout=60)
-
-        if response.status_code == 200:
-            if len(parse_id_libs) == 0:
-                text = 'Не удалось определить библиотеки для удаления из отслеживания{}'
-                await update.message.reply_text(text.format('\U0001F61E'))
-            elif len(parse_id_libs) == 1:
+        Numbers are taken from pages of list shown to user, so full list isn't requested
+        and number means the same repo as user saw even if list was changed after.
+        """
+        chat, user = update.effective_chat.id, update.message.from_user.id
+        async with context.application.sm() as session:
+            repos = await BotShownSubscriptionsQueryset.get(session, chat, user)
+
+        parse_id_libs = list(dict.fromkeys(int(lib) for lib in re.findall(r'(\d+)',
+                                                                         update.message.text)
+                                           if int(lib) in repos))
+        if not parse_id_libs:
+            text = 'Не удалось определить библиотеки для удаления из отслеживания{}'
+            await update.message.reply_text(text.format('\U0001F61E'))
+            return 3
+        libs = [repos[lib] for lib in parse_id_libs]
+        repos_uri = [lib[2] for lib in libs]
+
+        deleted = await context.application.api.delete_subscriptions(user, repos_uri)
+
+        if deleted:
+            async with context.application.sm.begin() as session:
+                await BotShownSubscriptionsQueryset.remove(session, chat, user, parse_id_libs)
+            if len(libs) == 1:
                 text = 'Библиотека {}(by {}) удалена из списка отслеживания{}'
                 await update.message.reply_text(text.format(libs[0][1],
                                                             libs[0][0],
                                                             '\U0001F44C'))
-            elif len(parse_id_libs) > 1:
+            else:
                 deleted_repos = ', '.join([f'{lib[1]}(by {lib[0]})' for lib in libs])
                 text = 'Библиотеки {} удалены из списка отслеживания{}'
                 await update.message.reply_text(text.format(deleted_repos,
@@ -410,9 +645,7 @@ def create_bot():
         Send post request for delete all subscriptions by user.
         """
         await update.message.reply_text('Список отслеживания очищен \U0001F44C')
-        send_repos = {'user_id': update.message.from_user.id}
-        uri = 'http://fastapi:8880/delete_all_subscriptions'
-        requests.post(uri, json=send_repos, timeout=60)
+        await context.application.api.delete_all_subscriptions(update.message.from_user.id)
 
         await manage_subscription(update, context)
         return 1
@@ -435,8 +668,13 @@ def create_bot():
         """
         application_telegram = (Application.builder()
                                 .token(os.environ.get("TELEGRAM_BOT_TOKEN"))
+                                .base_url(os.environ.get("TELEGRAM_API_URL",
+                                                         "https://api.telegram.org/bot"))
                                 .read_timeout(30).connect_timeout(30)
-                                .write_timeout(30).post_init(post_init).build())
+                                .write_timeout(30).post_init(post_init)
+                                .post_shutdown(post_shutdown)
+                                .concurrent_updates(PerUserUpdateProcessor())
+                                .rate_limiter(OutboundRateLimiter()).build())
 
         to_welcome = CommandHandler('start', welcome)
         to_start = CommandHandler('start', start_communication)
@@ -456,6 +694,8 @@ def create_bot():
                                                   set_time_notification)
         to_delete_notification = MessageHandler(Regex('^(Отключить уведомления)$'),
                                                 delete_notification)
+        to_instant_alerts = MessageHandler(Regex('^(Мгновенные уведомления)$'),
+                                           toggle_instant_alerts)
         to_add_one = MessageHandler(Regex('^(Добавить одну)$'), add_one)
         to_add_list = MessageHandler(Regex('^(Добавить списком)$'), add_list)
         to_delete_list = MessageHandler(Regex('^(Удалить списком)$'), delete_list)
@@ -464,7 +704,7 @@ def create_bot():
         to_unknown_message = MessageHandler(ALL, send_unknown_command)
         to_add_repos = MessageHandler(Regex(r'https://github.com/([^/]+)/([^/,]+)'),
                                       add_repos)
-        to_delete_repos = MessageHandler(Regex(r'(\d)'), delete_repos)
+        to_delete_repos = MessageHandler(Regex(r'(\d+)'), delete_repos)
         to_set_notification = MessageHandler(Regex(r'^(([0,1]?\d|[2][0-3]):([0-5]\d))$'),
                                              set_notification)
 
@@ -476,6 +716,7 @@ def create_bot():
                                                        to_delete_subscription,
                                                        to_set_time_notification,
                                                        to_delete_notification,
+                                                       to_instant_alerts,
                                                        to_add_one, to_add_list,
                                                        to_delete_list, to_delete_all],
                                          states={0: [to_start, to_check_releases,
@@ -487,6 +728,7 @@ def create_bot():
                                                      to_delete_subscription,
                                                      to_set_time_notification,
                                                      to_delete_notification,
+                                                     to_instant_alerts,
                                                      to_begining, cancel_command,
                                                      to_unknown_message],
                                                  2: [to_start, to_add_repos, to_add_one,
@@ -501,14 +743,21 @@ def create_bot():
                                                      to_backward, to_begining,
                                                      cancel_command, to_unknown_message]
                                                  },
-                                         fallbacks=[cancel_command])
+                                         fallbacks=[cancel_command],
+                                         name='start_conv')
         application_telegram.add_handler(start_conv)
+        application_telegram.add_handler(CallbackQueryHandler(turn_subscription_page,
+                                                              pattern=r'^subs:[ab]:\d+:\d+$'))
         application_telegram.sm = session_maker
         application_telegram.add_handler(CommandHandler('help',
                                                         help_command))
-        application_telegram.job_queue.start()
 
-        application_telegram.run_polling(allowed_updates=Update.ALL_TYPES)
+        start_metrics_server('BOT_METRICS_PORT', 9101, logging.getLogger(__name__))
+        if os.environ.get('TELEGRAM_BOT_MODE', 'polling') == 'webhook':
+            run_webhook(application_telegram, start_conv, session_maker)
+        else:
+            application_telegram.job_queue.start()
+            application_telegram.run_polling(allowed_updates=Update.ALL_TYPES)
 
     bot_start()
 
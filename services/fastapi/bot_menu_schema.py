@@ -7,6 +7,7 @@ menu_schema = {'start_communication': [[KeyboardButton('Проверить но
                                         KeyboardButton('Удалить подписки')],
                                        [KeyboardButton('Установить уведомления'),
                                         KeyboardButton('Отключить уведомления')],
+                                       [KeyboardButton('Мгновенные уведомления')],
                                        [KeyboardButton('В начало')]],
                'add_subscription': [[KeyboardButton('Добавить одну'),
                                      KeyboardButton('Добавить списком')],
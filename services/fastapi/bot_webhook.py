@@ -0,0 +1,145 @@
+"""
+Module of webhook mode of Telegram Bot.
+Updates are received by ASGI application and put to queue of application of bot,
+so many replicas of bot can work behind load balancer.
+State of conversation is kept in database and synced around every update.
+"""
+import os
+import hmac
+import logging
+import uvicorn
+from fastapi import FastAPI, Request, HTTPException
+from starlette import status
+from sqlalchemy.orm import sessionmaker
+from telegram import Update
+from telegram.ext import Application, ContextTypes, ConversationHandler, TypeHandler
+
+from querysets import BotConversationsQueryset
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class ConversationSync:
+    """
+    Keep state of conversation in database.
+    State of chat is loaded before handler of conversation (group -1)
+    and saved after it (group 1), so next update of chat can come to any replica.
+    """
+    def __init__(self, conversation: ConversationHandler, session_maker: sessionmaker):
+        """
+        :param conversation: handler of conversation, it must be per chat and per user
+        :param session_maker: maker of database sessions
+        """
+        self.conversation = conversation
+        self.session_maker = session_maker
+        self.name = conversation.name or 'conversation'
+
+    @staticmethod
+    def key(update: Update):
+        """
+        Key of conversation like ConversationHandler with per_chat and per_user.
+        """
+        if not isinstance(update, Update) or not update.effective_chat or not update.effective_user:
+            return None
+        return update.effective_chat.id, update.effective_user.id
+
+    def install(self, application: Application) -> None:
+        """
+        Add handlers of load and save of state around handler of conversation.
+        """
+        application.add_handler(TypeHandler(Update, self.load), group=-1)
+        application.add_handler(TypeHandler(Update, self.save), group=1)
+
+    async def load(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Put state of chat from database to handler of conversation.
+        """
+        key = self.key(update)
+        if key is None:
+            return
+        async with self.session_maker() as session:
+            state = await BotConversationsQueryset.get(session, self.name, *key)
+        conversations = self.conversation._conversations  # pylint: disable=protected-access
+        if state is None:
+            conversations.pop(key, None)
+        else:
+            conversations[key] = state
+
+    async def save(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Write state of chat after handler of conversation to database.
+        """
+        key = self.key(update)
+        if key is None:
+            return
+        state = self.conversation._conversations.get(key)  # pylint: disable=protected-access
+        async with self.session_maker.begin() as session:
+            await BotConversationsQueryset.set(session, self.name, *key,
+                                               state if isinstance(state, int) else None)
+
+
+def create_webhook_app(application: Application,
+                       secret_token: str,
+                       path: str = '/telegram',
+                       webhook_url: str = None) -> FastAPI:
+    """
+    Create ASGI application which receives updates of Telegram.
+    :param application: application of bot with handlers
+    :param secret_token: secret token of webhook, requests without it are rejected
+    :param path: path of route of updates
+    :param webhook_url: public URL of route, webhook is set on startup if it's given
+    :return: application FastAPI
+    """
+    async def lifespan(_: FastAPI):
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        if webhook_url:
+            await application.bot.set_webhook(webhook_url, secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES)
+            logging.info('Webhook of bot was set to %s.', webhook_url)
+        await application.start()
+        logging.info('Bot was started in webhook mode.')
+
+        yield
+
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+        logging.info('Bot was stopped.')
+
+    app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
+
+    @app.post(path)
+    async def receive_update(request: Request):
+        """
+        Check secret token and put update to queue of application of bot.
+        Response is sent at once, update is handled in background.
+        """
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return {'ok': True}
+
+    return app
+
+
+def run_webhook(application: Application, conversation: ConversationHandler,
+                session_maker: sessionmaker) -> None:
+    """
+    Run bot in webhook mode by uvicorn.
+    Settings are read from env: TELEGRAM_WEBHOOK_SECRET (required), TELEGRAM_WEBHOOK_URL,
+    TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_HOST and TELEGRAM_WEBHOOK_PORT.
+    """
+    secret_token = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
+    if not secret_token:
+        raise RuntimeError('TELEGRAM_WEBHOOK_SECRET is required in webhook mode.')
+    ConversationSync(conversation, session_maker).install(application)
+    app = create_webhook_app(application, secret_token,
+                             path=os.environ.get('TELEGRAM_WEBHOOK_PATH', '/telegram'),
+                             webhook_url=os.environ.get('TELEGRAM_WEBHOOK_URL'))
+    uvicorn.run(app,
+                host=os.environ.get('TELEGRAM_WEBHOOK_HOST', '0.0.0.0'),
+                port=int(os.environ.get('TELEGRAM_WEBHOOK_PORT', 8443)))
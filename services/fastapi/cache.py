@@ -0,0 +1,163 @@
+"""
+Module of in-process cache of subscriptions of users.
+Lists are invalidated by users and by repos whose release was changed,
+invalidation is sent to all workers by channel of Postgres.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Set
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from pubsub import Listener, notify
+
+CHANNEL = 'subscriptions_cache'
+NOTIFY_CHUNK = 50
+
+
+class SubscriptionCache:
+    """
+    LRU cache with TTL of lists of subscriptions by user id.
+    Every list is indexed by uri of its repos, so release update of repo
+    invalidates only lists of its subscribers.
+    Cache works only while channel of invalidation is listened,
+    otherwise change in other worker could be missed.
+    """
+    def __init__(self, engine: AsyncEngine,
+                 logger: logging.Logger,
+                 maxsize: int = None,
+                 ttl: float = None):
+        """
+        :param engine: engine of database for listen channel of invalidation
+        :param logger: logger
+        :param maxsize: max amount of users in cache, env SUBSCRIPTIONS_CACHE_SIZE by default
+        :param ttl: seconds of life of list, env SUBSCRIPTIONS_CACHE_TTL by default
+        """
+        if maxsize is None:
+            maxsize = int(os.environ.get('SUBSCRIPTIONS_CACHE_SIZE', 10000))
+        if ttl is None:
+            ttl = float(os.environ.get('SUBSCRIPTIONS_CACHE_TTL', 300))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.logger = logger
+        self.items: OrderedDict[int, tuple] = OrderedDict()
+        self.by_repo: Dict[str, Set[int]] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.listener = Listener(engine, CHANNEL, self.receive, logger,
+                                 on_connect=self.clear, on_disconnect=self.clear)
+
+    async def start(self) -> None:
+        """
+        Start listen channel of invalidation.
+        """
+        await self.listener.start()
+
+    async def stop(self) -> None:
+        """
+        Stop listen channel of invalidation.
+        """
+        await self.listener.stop()
+
+    def get(self, user: int) -> Any | None:
+        """
+        Get list of subscriptions of user.
+        :return: list as it was put or None if it isn't cached or expired
+        """
+        item = self.items.get(user)
+        if item is not None and item[0] > time.monotonic():
+            self.items.move_to_end(user)
+            self.hits += 1
+            return item[1]
+        if item is not None:
+            self.pop(user)
+        self.misses += 1
+        return None
+
+    def set(self, user: int, subscriptions: Any, uris: List[str], generation: int) -> None:
+        """
+        Put list of subscriptions of user.
+        List isn't put if something was invalidated after generation,
+        because it could be read before that change.
+        :param user: user id
+        :param subscriptions: list of subscriptions in any form, e.g. encoded JSON
+        :param uris: uri of repos of list
+        :param generation: value of generation before read of list
+        """
+        if generation != self.generation or not self.listener.listening:
+            return
+        self.pop(user)
+        self.items[user] = (time.monotonic() + self.ttl, subscriptions, uris)
+        for uri in uris:
+            self.by_repo.setdefault(uri, set()).add(user)
+        while len(self.items) > self.maxsize:
+            self.pop(next(iter(self.items)))
+
+    def pop(self, user: int) -> None:
+        """
+        Remove list of user and its index by repos.
+        """
+        item = self.items.pop(user, None)
+        if item is None:
+            return
+        for uri in item[2]:
+            users = self.by_repo.get(uri)
+            if users is not None:
+                users.discard(user)
+                if not users:
+                    del self.by_repo[uri]
+
+    def invalidate(self, users: Iterable[int] = (), uris: Iterable[str] = ()) -> None:
+        """
+        Remove lists of users and lists which have repos from uris in this worker.
+        """
+        self.generation += 1
+        self.invalidations += 1
+        affected = set(users)
+        for uri in uris:
+            affected.update(self.by_repo.get(uri, ()))
+        for user in affected:
+            self.pop(user)
+
+    def clear(self) -> None:
+        """
+        Remove all lists.
+        """
+        self.generation += 1
+        self.items.clear()
+        self.by_repo.clear()
+
+    async def publish(self, session: AsyncSession,
+                      users: Iterable[int] = (), uris: Iterable[str] = ()) -> None:
+        """
+        Send invalidation to all workers on commit of transaction of session.
+        Worker which made change should call invalidate() after commit too,
+        so its next read doesn't wait for message.
+        """
+        users, uris = list(users), list(uris)
+        for idx in range(0, max(len(users), len(uris)), NOTIFY_CHUNK):
+            await notify(session, CHANNEL, {'users': users[idx:idx + NOTIFY_CHUNK],
+                                            'uris': uris[idx:idx + NOTIFY_CHUNK]})
+
+    def receive(self, payload: Dict[str, List]) -> None:
+        """
+        Apply invalidation from channel.
+        """
+        self.invalidate(payload.get('users', ()), payload.get('uris', ()))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of cache.
+        """
+        requests = self.hits + self.misses
+        return {'size': len(self.items),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 3) if requests else None,
+                'invalidations': self.invalidations,
+                'listening': self.listener.listening}
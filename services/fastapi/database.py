@@ -1,9 +1,16 @@
 """
 Module for connect to database.
+Pool of connections is set by env of every service, so API, poller and bot
+can have pools of own size.
 """
 import os
+import time
+import threading
+from collections import deque
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 host = os.environ.get("DATABASE_HOST")
 port = int(os.environ.get("DATABASE_PORT"))
@@ -11,7 +18,96 @@ login = os.environ.get("DATABASE_USER")
 password = os.environ.get("DATABASE_PASSWORD")
 name = os.environ.get("DATABASE_NAME")
 
-engine = create_async_engine(f'postgresql+asyncpg://{login}:{password}@{host}:{port}/{name}')
+statement_cache_size = int(os.environ.get("DATABASE_STATEMENT_CACHE_SIZE", 500))
+pool_size = int(os.environ.get("DATABASE_POOL_SIZE", 5))
+max_overflow = int(os.environ.get("DATABASE_MAX_OVERFLOW", 10))
+pool_timeout = float(os.environ.get("DATABASE_POOL_TIMEOUT", 30))
+pool_recycle = int(os.environ.get("DATABASE_POOL_RECYCLE", -1))
+pool_pre_ping = os.environ.get("DATABASE_POOL_PRE_PING", "off") == "on"
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool which records time of waiting for connection on every checkout,
+    time includes opening of new connection.
+    Checkout is saturated when pool has no idle connection and can't open new one,
+    so request waits for return of connection by other request.
+    """
+    waits_window = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.waits = deque(maxlen=self.waits_window)
+        self.checkouts = 0
+        self.saturated = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.checked_out_max = 0
+
+    def _do_get(self):
+        saturated = (self.checkedin() == 0
+                     and -1 < self._max_overflow <= self.overflow())
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkouts += 1
+                self.saturated += saturated
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self.waits.append(wait)
+                self.checked_out_max = max(self.checked_out_max, self.checkedout())
+
+    def stats(self) -> dict:
+        """
+        Settings, current state and waits of checkouts of pool.
+        Percentiles are taken from last waits_window checkouts.
+        """
+        with self.stats_lock:
+            waits = sorted(self.waits)
+            checkouts, saturated = self.checkouts, self.saturated
+
+            def percentile(value):
+                return round(waits[min(int(len(waits) * value), len(waits) - 1)] * 1000, 3)
+
+            return {'pool_size': self.size(),
+                    'max_overflow': self._max_overflow,
+                    'timeout': self._timeout,
+                    'recycle': self._recycle,
+                    'pre_ping': self._pre_ping,
+                    'statement_cache_size': statement_cache_size,
+                    'checked_out': self.checkedout(),
+                    'checked_in': self.checkedin(),
+                    'overflow': self.overflow(),
+                    'checked_out_max': self.checked_out_max,
+                    'checkouts': checkouts,
+                    'saturated': saturated,
+                    'saturated_ratio': round(saturated / checkouts, 4) if checkouts else 0,
+                    'timeouts': self.timeouts,
+                    'wait_mean_ms': round(self.wait_total / checkouts * 1000, 3)
+                    if checkouts else 0,
+                    'wait_p50_ms': percentile(0.5) if waits else 0,
+                    'wait_p95_ms': percentile(0.95) if waits else 0,
+                    'wait_p99_ms': percentile(0.99) if waits else 0,
+                    'wait_max_ms': round(self.wait_max * 1000, 3)}
+
+
+engine = create_async_engine(f'postgresql+asyncpg://{login}:{password}@{host}:{port}/{name}'
+                             f'?prepared_statement_cache_size={statement_cache_size}',
+                             poolclass=TimedQueuePool,
+                             pool_size=pool_size,
+                             max_overflow=max_overflow,
+                             pool_timeout=pool_timeout,
+                             pool_recycle=pool_recycle,
+                             pool_pre_ping=pool_pre_ping)
 sm = sessionmaker(engine, autocommit=False, autoflush=False, class_=AsyncSession)
 
 Base = declarative_base()
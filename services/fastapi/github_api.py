@@ -0,0 +1,142 @@
+"""
+Module for communication with API GitHub.
+Keep one pooled async HTTP client for all requests to API GitHub.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import NamedTuple, Dict
+import httpx
+
+from github_budget import GitHubBudgeter
+from metrics import GITHUB_LATENCY, observe
+
+try:
+    import h2  # noqa: F401  pylint: disable=unused-import
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+GITHUB_HEADERS = {'Accept': 'application/vnd.github+json',
+                  'X-GitHub-Api-Version': '2022-11-28'}
+CONNECT_RETRIES = 10
+BACKOFF_FACTOR = 1
+BACKOFF_MAX = 120
+RATE_LIMIT_RETRIES = 3
+
+
+class ReleaseInfo(NamedTuple):
+    """
+    Result of request of latest release to API GitHub.
+    If not_modified - release wasn't parsed and cached validators are still actual.
+    """
+    release: str = None
+    release_date: str = None
+    etag: str = None
+    last_modified: str = None
+    not_modified: bool = False
+
+
+def create_client(max_connections: int = None, timeout: float = 10) -> httpx.AsyncClient:
+    """
+    Create pooled async HTTP client for API GitHub.
+    All requests go to one host, so max_connections is the connection cap per host.
+    Connections are kept alive between requests and multiplexed by HTTP/2 if h2 installed.
+    :param max_connections: max opened connections, env GITHUB_MAX_CONNECTIONS by default
+    :param timeout: timeout of one request in seconds
+    :return: httpx.AsyncClient
+    """
+    if max_connections is None:
+        max_connections = int(os.environ.get('GITHUB_MAX_CONNECTIONS', 20))
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections,
+                          keepalive_expiry=60)
+    return httpx.AsyncClient(http2=HTTP2,
+                             limits=limits,
+                             timeout=timeout,
+                             headers=GITHUB_HEADERS)
+
+
+async def send_to_api_github(client: httpx.AsyncClient,
+                             method: str,
+                             uri: str,
+                             budgeter: GitHubBudgeter = None,
+                             resource: str = 'core',
+                             headers: Dict[str, str] = None,
+                             **kwargs) -> httpx.Response:
+    """
+    Send request to API GitHub with token chosen by budgeter.
+    Retry connect errors with exponential backoff like urllib3 Retry(connect=10, backoff_factor=1).
+    Rate limited request is repeated after budgeter waits reset of limit.
+    :param client: pooled async HTTP client
+    :param method: HTTP method
+    :param uri: URL of API GitHub
+    :param budgeter: budgeter of tokens, env GITHUB_API_TOKEN is used without it
+    :param resource: resource of API GitHub for budgeter
+    :param headers: additional headers
+    :return: response
+    """
+    for _ in range(RATE_LIMIT_RETRIES + 1):
+        if budgeter:
+            token = await budgeter.acquire(resource)
+        else:
+            token = os.environ.get("GITHUB_API_TOKEN")
+        request_headers = {'Authorization': f'Bearer {token}', **(headers or {})}
+        for attempt in range(CONNECT_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, uri, headers=request_headers, **kwargs)
+                observe(GITHUB_LATENCY, started, resource, response.status_code)
+                break
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                observe(GITHUB_LATENCY, started, resource, 'error')
+                if attempt == CONNECT_RETRIES:
+                    raise
+                await asyncio.sleep(min(BACKOFF_FACTOR * 2 ** attempt, BACKOFF_MAX))
+        if budgeter is None or not budgeter.update(token, response, resource):
+            break
+    return response
+
+
+async def request_to_api_github(client: httpx.AsyncClient,
+                                api_uri: str,
+                                logger: logging.Logger,
+                                etag: str = None,
+                                last_modified: str = None,
+                                budgeter: GitHubBudgeter = None) -> ReleaseInfo:
+    """
+    Send GET request to API GitHub for getting latest repository release.
+    If validators of previous response are known - send conditional request,
+    answer 304 isn't parsed and isn't charged against the rate limit.
+    :param client: pooled async HTTP client
+    :param api_uri: URL of API GitHub.
+    :param logger: logger
+    :param etag: ETag of previous response
+    :param last_modified: Last-Modified of previous response
+    :param budgeter: budgeter of tokens
+    :return: ReleaseInfo
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    info = ReleaseInfo()
+    try:
+        response = await send_to_api_github(client, 'GET', api_uri,
+                                            budgeter=budgeter, headers=headers)
+        if response.status_code == 304:
+            info = ReleaseInfo(etag=etag, last_modified=last_modified, not_modified=True)
+        elif response.status_code == 200:
+            body = response.json()
+            info = ReleaseInfo(release=body['tag_name'],
+                               release_date=body['created_at'],
+                               etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'))
+            logger.info(f'Success parse release info by api_uri: {api_uri}')
+    except Exception as e:
+        logger.error(f"Wrong request API GitHub for api_uri: {api_uri}. Return error: {e}")
+
+    return info
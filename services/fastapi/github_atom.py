@@ -0,0 +1,99 @@
+"""
+Module for getting latest release from Atom feed of releases of GitHub.
+Feed doesn't need token and isn't charged against rate limit of API GitHub.
+Response is parsed by stream and read only till first entry.
+"""
+import os
+import time
+import logging
+from datetime import datetime as dt, timezone
+from urllib.parse import unquote
+from xml.etree.ElementTree import XMLPullParser
+import httpx
+
+from github_api import ReleaseInfo
+from metrics import GITHUB_LATENCY, observe
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+ATOM_HEADERS = {'Accept': 'application/atom+xml'}
+
+
+def atom_uri(owner: str, repo_name: str, base_uri: str = None) -> str:
+    """
+    URI of feed of releases, env GITHUB_ATOM_URI allows to use local stand-in server.
+    """
+    base_uri = base_uri or os.environ.get('GITHUB_ATOM_URI', 'https://github.com')
+    return f'{base_uri}/{owner}/{repo_name}/releases.atom'
+
+
+def parse_date(value: str) -> str:
+    """
+    Convert date of feed with any offset to UTC in format of API GitHub, like 2023-01-01T10:00:00Z.
+    """
+    date = dt.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_entry(entry) -> ReleaseInfo:
+    """
+    Get tag and date of release from entry of feed.
+    Tag is taken from link .../releases/tag/{tag}, title is release name and can differ.
+    Date is taken from updated with offset of timezone of feed and converted to UTC.
+    """
+    link = entry.find(f'{ATOM}link')
+    href = link.get('href', '') if link is not None else ''
+    if '/releases/tag/' in href:
+        release = unquote(href.rsplit('/releases/tag/', 1)[1])
+    else:
+        release = entry.findtext(f'{ATOM}title')
+    return ReleaseInfo(release=release, release_date=parse_date(entry.findtext(f'{ATOM}updated')))
+
+
+async def request_to_atom_feed(client: httpx.AsyncClient,
+                               feed_uri: str,
+                               logger: logging.Logger,
+                               etag: str = None,
+                               last_modified: str = None) -> ReleaseInfo | None:
+    """
+    Send conditional GET request of feed of releases and parse the newest entry.
+    Feed lists pre-releases too, so its latest entry can be newer than /releases/latest.
+    :param client: pooled async HTTP client
+    :param feed_uri: URI of feed
+    :param logger: logger
+    :param etag: ETag of previous response
+    :param last_modified: Last-Modified of previous response
+    :return: ReleaseInfo, empty ReleaseInfo if feed has no entries, None if request failed
+    """
+    headers = dict(ATOM_HEADERS)
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    started = time.perf_counter()
+    try:
+        async with client.stream('GET', feed_uri, headers=headers) as response:
+            observe(GITHUB_LATENCY, started, 'atom', response.status_code)
+            if response.status_code == 304:
+                return ReleaseInfo(etag=etag, last_modified=last_modified, not_modified=True)
+            if response.status_code != 200:
+                logger.error('Wrong request of feed %s. Return status: %s',
+                             feed_uri, response.status_code)
+                return None
+            validators = {'etag': response.headers.get('ETag'),
+                          'last_modified': response.headers.get('Last-Modified')}
+            parser = XMLPullParser(events=('end',))
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    if element.tag == f'{ATOM}entry':
+                        return parse_entry(element)._replace(**validators)
+            parser.close()
+            logger.info('Release not found in feed %s.', feed_uri)
+            return ReleaseInfo(**validators)
+    except Exception as e:
+        observe(GITHUB_LATENCY, started, 'atom', 'error')
+        logger.error('Wrong request of feed %s. Return error: %s', feed_uri, e)
+        return None
@@ -0,0 +1,192 @@
+"""
+Module of budget of requests to API GitHub.
+Track rate limit of every token from response headers, rotate tokens
+and pace requests by token bucket: bursts go at once, and spending is slowed down
+only when it would run out quota before reset.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List
+import httpx
+
+SECONDARY_LIMIT_WAIT = 60
+BURST = 100
+
+
+class TokenBudget:
+    """
+    Rate limit state of one token for one resource of API GitHub.
+    Requests are paced by token bucket of size burst, which is refilled
+    with rate spending remaining quota exactly till reset.
+    Tokens of bucket taken ahead are debt, so concurrent requests wait in turn.
+    """
+    def __init__(self, token: str, burst: int = BURST):
+        self.token = token
+        self.burst = burst
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        self.blocked_until = 0.0
+        self.tokens = float(burst)
+        self.filled_at = 0.0
+
+    def rate(self, now: float) -> float | None:
+        """
+        Requests per second which spend remaining quota till reset,
+        None if quota isn't known yet or reset has passed.
+        """
+        if self.remaining is None or self.reset <= now:
+            return None
+        return max(self.remaining, 1) / (self.reset - now)
+
+    def tokens_at(self, now: float) -> float:
+        """
+        Tokens of bucket refilled till now.
+        """
+        rate = self.rate(now)
+        if rate is None:
+            return float(self.burst)
+        return min(self.burst, self.tokens + max(now - self.filled_at, 0) * rate)
+
+    def available_at(self, now: float) -> float:
+        """
+        Time when token can send next request.
+        """
+        if self.remaining == 0 and self.reset > now:
+            return max(self.reset, self.blocked_until)
+        tokens = self.tokens_at(now)
+        ready = now if tokens >= 1 else now + (1 - tokens) / self.rate(now)
+        return max(ready, self.blocked_until)
+
+    def take(self, now: float) -> None:
+        """
+        Take token of bucket and request of quota for request sent by acquire.
+        """
+        self.tokens = self.tokens_at(now) - 1
+        self.filled_at = now
+        if self.remaining:
+            self.remaining -= 1
+
+    def refund(self, now: float) -> None:
+        """
+        Return token of request which wasn't charged by API GitHub, like answer 304.
+        """
+        self.tokens = min(self.burst, self.tokens_at(now) + 1)
+        self.filled_at = now
+        if self.remaining is not None:
+            self.remaining += 1
+
+    def to_dict(self, now: float) -> Dict:
+        """
+        Convert state to dict without secret token.
+        """
+        return {'token': f'...{self.token[-4:]}' if self.token else None,
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset_in': max(0, round(self.reset - now, 1)),
+                'tokens': round(self.tokens_at(now), 1),
+                'blocked_for': max(0, round(self.blocked_until - now, 1))}
+
+
+class GitHubBudgeter:
+    """
+    Pool of tokens of API GitHub.
+    acquire() return token with the nearest available time and wait it,
+    update() read headers X-RateLimit-* and Retry-After of response.
+    If all tokens are exhausted - work is parked till the nearest reset.
+    """
+    def __init__(self, tokens: List[str], logger: logging.Logger, burst: int = None):
+        """
+        :param tokens: list of tokens API GitHub
+        :param logger: logger
+        :param burst: requests of token sent at once without pacing,
+                      env GITHUB_BUDGET_BURST by default
+        """
+        self.tokens = tokens or [None]
+        self.logger = logger
+        self.burst = burst or int(os.environ.get('GITHUB_BUDGET_BURST', BURST))
+        self.budgets: Dict[str, Dict[str, TokenBudget]] = {}
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, logger: logging.Logger) -> 'GitHubBudgeter':
+        """
+        Create budgeter with tokens from env GITHUB_API_TOKENS (separated by comma)
+        or single GITHUB_API_TOKEN.
+        """
+        tokens = os.environ.get('GITHUB_API_TOKENS') or os.environ.get('GITHUB_API_TOKEN') or ''
+        return cls([token.strip() for token in tokens.split(',') if token.strip()], logger)
+
+    def resource(self, name: str) -> Dict[str, TokenBudget]:
+        """
+        Budgets of all tokens for resource of API GitHub(core, graphql, ...).
+        """
+        if name not in self.budgets:
+            self.budgets[name] = {token: TokenBudget(token, self.burst) for token in self.tokens}
+        return self.budgets[name]
+
+    async def acquire(self, resource: str = 'core') -> str:
+        """
+        Choose token for next request and wait till it can be used.
+        Of tokens available at once the one with fuller bucket is taken,
+        so load is spread over all tokens.
+        :param resource: resource of API GitHub
+        :return: token
+        """
+        async with self.lock:
+            now = time.time()
+            budget = min(self.resource(resource).values(),
+                         key=lambda b: (b.available_at(now), -b.tokens_at(now)))
+            wait = budget.available_at(now) - now
+            if wait > 0 and budget.remaining == 0:
+                self.logger.info('All tokens of API GitHub are exhausted, wait %.0f sec.', wait)
+            budget.take(now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return budget.token
+
+    def update(self, token: str, response: httpx.Response, resource: str = 'core') -> bool:
+        """
+        Update budget of token by headers of response.
+        Answer 304 isn't charged by API GitHub, so its token of bucket is returned.
+        :param token: token used for request
+        :param response: response of API GitHub
+        :param resource: resource of request if response hasn't header X-RateLimit-Resource
+        :return: True if request was rate limited and need to be repeated
+        """
+        now = time.time()
+        headers = response.headers
+        budget = self.resource(headers.get('X-RateLimit-Resource', resource)).get(token)
+        if budget is None:
+            return False
+        if response.status_code == 304:
+            budget.refund(now)
+        if 'X-RateLimit-Remaining' in headers:
+            budget.remaining = int(headers['X-RateLimit-Remaining'])
+            budget.limit = int(headers.get('X-RateLimit-Limit', 0)) or budget.limit
+            budget.reset = float(headers.get('X-RateLimit-Reset', 0))
+
+        if response.status_code not in (403, 429):
+            return False
+        if 'Retry-After' in headers:
+            budget.blocked_until = now + float(headers['Retry-After'])
+        elif budget.remaining == 0:
+            budget.blocked_until = budget.reset
+        elif response.status_code == 429 or 'rate limit' in response.text.lower():
+            budget.blocked_until = now + SECONDARY_LIMIT_WAIT
+        else:
+            return False
+        self.logger.error('Token ...%s of API GitHub is rate limited for %.0f sec.',
+                          (token or '')[-4:], budget.blocked_until - now)
+        return True
+
+    def state(self) -> Dict[str, List[Dict]]:
+        """
+        Current budget of all tokens by resources.
+        Dicts are copied before iteration, so state can be read by thread of metrics listener.
+        """
+        now = time.time()
+        return {name: [budget.to_dict(now) for budget in list(budgets.values())]
+                for name, budgets in list(self.budgets.items())}
@@ -0,0 +1,101 @@
+"""
+Module for batched requests of releases to API GitHub GraphQL.
+One aliased query gets latest releases of many repos in one round trip.
+"""
+import os
+import logging
+from typing import Dict, List, Tuple
+import httpx
+
+from github_api import ReleaseInfo, send_to_api_github
+from github_budget import GitHubBudgeter
+
+GRAPHQL_BATCH_SIZE_MAX = 100
+
+
+def graphql_uri() -> str:
+    """
+    URI of endpoint GraphQL, env GITHUB_GRAPHQL_URI allows to use local stand-in server.
+    """
+    return os.environ.get('GITHUB_GRAPHQL_URI', 'https://api.github.com/graphql')
+
+
+def graphql_batch_size() -> int:
+    """
+    Amount of repos in one query, env GITHUB_GRAPHQL_BATCH_SIZE limited by 100.
+    """
+    return min(int(os.environ.get('GITHUB_GRAPHQL_BATCH_SIZE', 50)), GRAPHQL_BATCH_SIZE_MAX)
+
+
+def build_query(repos: List[Tuple[str, str]]) -> Tuple[str, Dict[str, str]]:
+    """
+    Build aliased query of latest releases, owner and name are passed as variables.
+    :param repos: list of tuple(owner, repo_name)
+    :return: tuple(query, variables)
+    """
+    arguments, fields, variables = [], [], {}
+    for idx, (owner, repo_name) in enumerate(repos):
+        arguments.append(f'$o{idx}: String!, $n{idx}: String!')
+        fields.append(f'r{idx}: repository(owner: $o{idx}, name: $n{idx}) '
+                      '{ latestRelease { tagName createdAt } }')
+        variables[f'o{idx}'] = owner
+        variables[f'n{idx}'] = repo_name
+    query = (f'query({", ".join(arguments)}) {{ '
+             f'{" ".join(fields)} rateLimit {{ cost remaining resetAt }} }}')
+    return query, variables
+
+
+async def request_to_graphql_github(client: httpx.AsyncClient,
+                                    repos: List[Tuple[str, str]],
+                                    logger: logging.Logger,
+                                    budgeter: GitHubBudgeter = None
+                                    ) -> Tuple[List[ReleaseInfo | None], Dict]:
+    """
+    Send one POST request to API GitHub GraphQL for getting latest releases of repos.
+    Errors of single aliases don't break all batch, such repos get empty ReleaseInfo.
+    If all batch failed, repos get None, so they can be checked again by other source.
+    :param client: pooled async HTTP client
+    :param repos: list of tuple(owner, repo_name)
+    :param logger: logger
+    :param budgeter: budgeter of tokens
+    :return: tuple(list of ReleaseInfo or None in order of repos, rate limit info with query cost)
+    """
+    query, variables = build_query(repos)
+
+    failed = [None for _ in repos]
+    rate_limit = {}
+    try:
+        response = await send_to_api_github(client, 'POST', graphql_uri(),
+                                            budgeter=budgeter, resource='graphql',
+                                            json={'query': query, 'variables': variables})
+        if response.status_code != 200:
+            logger.error('Wrong request API GitHub GraphQL for %s repos. Return status: %s',
+                         len(repos), response.status_code)
+            return failed, rate_limit
+
+        body = response.json()
+        data = body.get('data')
+        if not data:
+            logger.error('Wrong request API GitHub GraphQL for %s repos. Return errors: %s',
+                         len(repos), body.get('errors'))
+            return failed, rate_limit
+        rate_limit = data.get('rateLimit') or {}
+        for error in body.get('errors') or []:
+            alias = (error.get('path') or ['?'])[0]
+            logger.error('Wrong GraphQL alias %s: %s', alias, error.get('message'))
+
+        infos = [ReleaseInfo() for _ in repos]
+        for idx, (owner, repo_name) in enumerate(repos):
+            latest = (data.get(f'r{idx}') or {}).get('latestRelease')
+            if latest:
+                infos[idx] = ReleaseInfo(release=latest['tagName'],
+                                         release_date=latest['createdAt'])
+            else:
+                logger.info('Release not found for %s(by %s) by GraphQL.', repo_name, owner)
+        logger.info('Success parse releases of %s repos by GraphQL, query cost: %s, remaining: %s',
+                    len(repos), rate_limit.get('cost'), rate_limit.get('remaining'))
+        return infos, rate_limit
+    except Exception as e:
+        logger.error('Wrong request API GitHub GraphQL for %s repos. Return error: %s',
+                     len(repos), e)
+        return failed, rate_limit
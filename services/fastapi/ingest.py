@@ -0,0 +1,267 @@
+"""
+Module of background addition of subscriptions.
+Request only enqueue job, repos are resolved concurrently by worker
+and progress of every repo is kept in database.
+Running job beats in database, jobs lost by restart of worker stop beating
+and are resumed by poller, jobs which nobody resumed are failed by reaper.
+Finished jobs are deleted after retention.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime as dt, timedelta
+from typing import List, Tuple
+from sqlalchemy.orm import sessionmaker
+from pydantic import ValidationError
+
+from github_api import request_to_api_github
+from release_poller import ReleasePoller
+from cache import SubscriptionCache
+from querysets import (ReposQueryset, ReposCacheQueryset, ReposScheduleQueryset,
+                       SubscriptionsQueryset, NotificationsQueryset, IngestJobsQueryset)
+from schemas import ReposSchema
+
+FLUSH_EVERY = 20
+
+
+class SubscriptionIngestor:
+    """
+    Run jobs of addition subscriptions of user by list of repos.
+    Releases are requested concurrently by client, budgeter and concurrency of poller.
+    """
+    def __init__(self, session_maker: sessionmaker,
+                 poller: ReleasePoller,
+                 logger: logging.Logger,
+                 cache: SubscriptionCache = None):
+        """
+        :param session_maker: maker of database sessions
+        :param poller: poller of releases
+        :param logger: logger
+        :param cache: cache of subscriptions invalidated by new subscriptions and releases
+        """
+        self.session_maker = session_maker
+        self.poller = poller
+        self.logger = logger
+        self.cache = cache
+        self.tasks = set()
+        self.job_timeout = timedelta(seconds=int(os.environ.get('INGEST_JOB_TIMEOUT', 10 * 60)))
+        self.job_retention = timedelta(seconds=int(os.environ.get('INGEST_JOB_RETENTION',
+                                                                  7 * 24 * 60 * 60)))
+        self.reap_interval = int(os.environ.get('INGEST_REAP_INTERVAL', 60))
+        self.heartbeat_interval = int(os.environ.get('INGEST_HEARTBEAT_INTERVAL', 30))
+        self.resume_after = timedelta(seconds=int(os.environ.get('INGEST_RESUME_AFTER', 2 * 60)))
+        self.resume_limit = int(os.environ.get('INGEST_RESUME_LIMIT', 10))
+        self.reaper = None
+
+    async def start(self) -> None:
+        """
+        Start reaper of stale and old jobs in background.
+        """
+        self.reaper = asyncio.create_task(self.reap_forever())
+
+    async def stop(self) -> None:
+        """
+        Stop reaper.
+        """
+        if self.reaper is not None:
+            self.reaper.cancel()
+            await asyncio.gather(self.reaper, return_exceptions=True)
+
+    async def reap(self) -> None:
+        """
+        Fail jobs which have no heartbeat for INGEST_JOB_TIMEOUT and delete jobs
+        finished earlier than INGEST_JOB_RETENTION.
+        Every worker can reap, statements are idempotent.
+        """
+        now = dt.utcnow()
+        async with self.session_maker.begin() as session:
+            failed = await IngestJobsQueryset.fail_stale(session, now - self.job_timeout, now)
+            deleted = await IngestJobsQueryset.delete_finished(session, now - self.job_retention)
+        if failed:
+            self.logger.error('Stale jobs of addition subscriptions were failed: %s.', failed)
+        if deleted:
+            self.logger.info('Deleted %s old jobs of addition subscriptions.', deleted)
+
+    async def reap_forever(self) -> None:
+        """
+        Run reap every INGEST_REAP_INTERVAL seconds.
+        """
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                self.logger.error('Wrong reap jobs of addition subscriptions with error: %s', e)
+            await asyncio.sleep(self.reap_interval)
+
+    async def enqueue(self, user: int, repos: List[Tuple[str, str]]) -> str:
+        """
+        Create job and run it in background.
+        :param user: user id
+        :param repos: list of tuple(owner, repo_name)
+        :return: job id
+        """
+        repos = list(dict.fromkeys((owner, repo_name) for owner, repo_name in repos))
+        job_id = uuid.uuid4().hex
+        async with self.session_maker.begin() as session:
+            await IngestJobsQueryset.create(session, job_id, user, repos, dt.utcnow())
+        self.spawn(job_id, user, repos)
+        return job_id
+
+    async def resume(self) -> List[str]:
+        """
+        Run again jobs which have no heartbeat for INGEST_RESUME_AFTER,
+        their worker was stopped. Job is taken with new heartbeat, so it's run only once.
+        Jobs older than INGEST_JOB_TIMEOUT aren't resumed, reaper fails them.
+        :return: ids of resumed jobs
+        """
+        now = dt.utcnow()
+        async with self.session_maker.begin() as session:
+            jobs = await IngestJobsQueryset.claim_lost(session, now - self.resume_after,
+                                                       now - self.job_timeout, now,
+                                                       self.resume_limit)
+        for job_id, user, repos in jobs:
+            self.logger.info('Job %s of addition subscriptions was resumed.', job_id)
+            self.spawn(job_id, user, repos)
+        return [job_id for job_id, _, _ in jobs]
+
+    def spawn(self, job_id: str, user: int, repos: List[Tuple[str, str]]) -> None:
+        """
+        Run job in background, task is kept until it's done.
+        """
+        task = asyncio.create_task(self.run(job_id, user, repos))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def beat(self, job_id: str) -> None:
+        """
+        Write heartbeat of job every INGEST_HEARTBEAT_INTERVAL seconds until cancel.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_maker.begin() as session:
+                    await IngestJobsQueryset.beat(session, job_id, dt.utcnow())
+            except Exception as e:
+                self.logger.error('Wrong heartbeat of job %s with error: %s', job_id, e)
+
+    async def run(self, job_id: str, user: int, repos: List[Tuple[str, str]]) -> None:
+        """
+        Get releases of repos, put them on table Repos and subscribe user.
+        If repos have in table Repos and have new release:
+        update for all user who can notifications on this repo.
+        :param job_id: job id
+        :param user: user id
+        :param repos: list of tuple(owner, repo_name)
+        :return: None
+        """
+        heartbeat = asyncio.create_task(self.beat(job_id))
+        try:
+            async with self.session_maker.begin() as session:
+                await IngestJobsQueryset.set_status(session, job_id, 'running')
+            resolved, not_modified, validators = await self.resolve(job_id, repos)
+
+            now = dt.utcnow()
+            try:
+                await self.poller.history.maintain(self.session_maker, now)
+            except Exception as e:
+                self.logger.error('Wrong maintenance of history of releases with error: %s', e)
+            async with self.session_maker.begin() as session:
+                upserted = await ReposQueryset.upsert(session, resolved)
+                await ReposScheduleQueryset.create(
+                    session, [(upserted[repo['uri']][0],
+                               self.poller.next_check_at(now, repo['release_date']))
+                              for repo in resolved if upserted[repo['uri']][1]])
+                await ReposCacheQueryset.update(session, validators)
+                await self.poller.history.record(session,
+                                                 [(upserted[repo['uri']][0], repo['release'],
+                                                   repo['release_date'])
+                                                  for repo in resolved
+                                                  if any(upserted[repo['uri']][1:])], now)
+                await NotificationsQueryset.bulk_create(session, [id_repo for id_repo, _, is_update
+                                                                  in upserted.values()
+                                                                  if is_update])
+                await self.poller.publish_releases(session,
+                                                   [(upserted[repo['uri']][0], repo['release'])
+                                                    for repo in resolved
+                                                    if upserted[repo['uri']][2]])
+                ids = await ReposQueryset.get_ids(session, [uri for uri, _ in not_modified])
+                ids.update({uri: id_repo for uri, (id_repo, _, _) in upserted.items()})
+                await SubscriptionsQueryset.bulk_create(session, user, ids.values())
+                await IngestJobsQueryset.update_repos(
+                    session, job_id,
+                    [(repo['owner'], repo['repo_name'], 'subscribed', repo['release'])
+                     for repo in resolved] +
+                    [(owner, repo_name, 'subscribed', release)
+                     for _, (owner, repo_name, release) in not_modified])
+                await IngestJobsQueryset.set_status(session, job_id, 'done', dt.utcnow())
+                updated = [uri for uri, (_, _, is_update) in upserted.items() if is_update]
+                if self.cache:
+                    await self.cache.publish(session, users=[user], uris=updated)
+            if self.cache:
+                self.cache.invalidate(users=[user], uris=updated)
+            self.logger.info('Success create %s repos in table Repos and '
+                             'subscriptions for user_id %s.', len(ids), user)
+        except Exception as e:
+            self.logger.error('Wrong create repos of job %s with error: %s', job_id, e)
+            async with self.session_maker.begin() as session:
+                await IngestJobsQueryset.set_status(session, job_id, 'error', dt.utcnow())
+        finally:
+            heartbeat.cancel()
+
+    async def resolve(self, job_id: str, repos: List[Tuple[str, str]]):
+        """
+        Request latest releases of repos concurrently.
+        Status of every repo is written to job as soon as it's known.
+        :param job_id: job id
+        :param repos: list of tuple(owner, repo_name)
+        :return: tuple(resolved repos as dicts, not modified repos, validators of responses)
+        """
+        repos = {f'https://api.github.com/repos/{owner}/{repo_name}/releases/latest':
+                 (f'https://github.com/{owner}/{repo_name}', owner, repo_name)
+                 for owner, repo_name in repos}
+        async with self.session_maker() as session:
+            cache = await ReposCacheQueryset.get_by_api_uris(session, repos)
+            known = await ReposQueryset.get_releases(session, [uri for uri, _, _ in repos.values()])
+        semaphore = asyncio.Semaphore(self.poller.concurrency)
+
+        async def fetch(api_uri):
+            etag, last_modified = cache.get(api_uri, (None, None))
+            async with semaphore:
+                info = await request_to_api_github(self.poller.client, api_uri, self.logger,
+                                                   etag=etag, last_modified=last_modified,
+                                                   budgeter=self.poller.budgeter)
+            return api_uri, info
+
+        resolved, not_modified, validators, statuses = [], [], [], []
+        for done in asyncio.as_completed([fetch(api_uri) for api_uri in repos]):
+            api_uri, info = await done
+            uri, owner, repo_name = repos[api_uri]
+            if info.not_modified and uri in known:
+                not_modified.append((uri, (owner, repo_name, known[uri])))
+                statuses.append((owner, repo_name, 'resolved', known[uri]))
+            elif info.release and info.release_date:
+                keys_repo = ['uri', 'api_uri', 'owner',
+                             'repo_name', 'release', 'release_date']
+                values_repo = [uri, api_uri, owner, repo_name,
+                               info.release, info.release_date]
+                try:
+                    resolved.append(ReposSchema.model_validate(dict(zip(keys_repo,
+                                                                        values_repo))
+                                                               ).model_dump())
+                    validators.append((api_uri, info.etag, info.last_modified))
+                    statuses.append((owner, repo_name, 'resolved', info.release))
+                except ValidationError as e:
+                    self.logger.error('Wrong release of %s(by %s): %s', repo_name, owner, e)
+                    statuses.append((owner, repo_name, 'not_found', None))
+            else:
+                statuses.append((owner, repo_name, 'not_found', None))
+
+            if len(statuses) >= FLUSH_EVERY:
+                async with self.session_maker.begin() as session:
+                    await IngestJobsQueryset.update_repos(session, job_id, statuses)
+                statuses = []
+        async with self.session_maker.begin() as session:
+            await IngestJobsQueryset.update_repos(session, job_id, statuses)
+
+        return resolved, not_modified, validators
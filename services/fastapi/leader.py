@@ -0,0 +1,83 @@
+"""
+Module of leadership of one instance among many by advisory lock of Postgres.
+Lock is held by dedicated connection, so it's released by Postgres at once
+when leader stops or its connection breaks, and standby takes it on next try.
+"""
+import logging
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+POLLER_LOCK = 7_264_310_513
+KEEPALIVE_SETTINGS = {'tcp_keepalives_idle': '10',
+                      'tcp_keepalives_interval': '5',
+                      'tcp_keepalives_count': '3'}
+
+
+class LeaderLease:
+    """
+    Leadership by session advisory lock on dedicated asyncpg connection.
+    Server keepalives drop connection of unreachable leader in ~25 seconds,
+    so lock doesn't stay with lost instance.
+    """
+    def __init__(self, engine: AsyncEngine, logger: logging.Logger,
+                 key: int = POLLER_LOCK, name: str = 'poller'):
+        """
+        :param engine: engine of database, its URL is used for connection
+        :param logger: logger
+        :param key: key of advisory lock
+        :param name: name of role in logs
+        """
+        self.engine = engine
+        self.logger = logger
+        self.key = key
+        self.name = name
+        self.connection = None
+        self.is_leader = False
+
+    async def connect(self) -> None:
+        """
+        Open dedicated connection if it isn't opened.
+        """
+        if self.connection is None or self.connection.is_closed():
+            url = self.engine.url
+            self.is_leader = False
+            self.connection = await asyncpg.connect(host=url.host, port=url.port,
+                                                    user=url.username,
+                                                    password=url.password,
+                                                    database=url.database,
+                                                    server_settings=KEEPALIVE_SETTINGS)
+
+    async def acquire(self) -> bool:
+        """
+        Take leadership or check that it's still held.
+        Should be called before every piece of work of leader.
+        :return: True if this instance is leader
+        """
+        try:
+            await self.connect()
+            if self.is_leader:
+                await self.connection.fetchval("""SELECT 1;""")
+            else:
+                self.is_leader = await self.connection.fetchval(
+                    """SELECT pg_try_advisory_lock($1);""", self.key)
+                if self.is_leader:
+                    self.logger.info('Leadership of %s was taken.', self.name)
+        except Exception as e:
+            if self.is_leader:
+                self.logger.error('Leadership of %s was lost with error: %s', self.name, e)
+            else:
+                self.logger.error('Wrong take leadership of %s with error: %s', self.name, e)
+            await self.close()
+        return self.is_leader
+
+    async def close(self) -> None:
+        """
+        Give up leadership and close connection.
+        """
+        self.is_leader = False
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=5)
+            except Exception:
+                connection.terminate()
@@ -0,0 +1,172 @@
+"""
+Module of metrics of services in format of Prometheus.
+API serves them by /metrics, poller and bot by own HTTP listener.
+With uvicorn workers set env PROMETHEUS_MULTIPROC_DIR to empty directory,
+so /metrics of any worker collects metrics of all workers.
+"""
+import os
+import time
+import logging
+import functools
+import inspect
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess, start_http_server)
+from prometheus_client.core import GaugeMetricFamily
+
+HTTP_LATENCY = Histogram('http_request_duration_seconds',
+                         'Latency of requests to API by route',
+                         ['method', 'route', 'status'])
+GITHUB_LATENCY = Histogram('github_request_duration_seconds',
+                           'Latency of requests to GitHub by API and status code',
+                           ['api', 'status'])
+QUERY_LATENCY = Histogram('db_query_duration_seconds',
+                          'Time of methods of querysets',
+                          ['queryset', 'method'],
+                          buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+POLL_DURATION = Histogram('poll_cycle_duration_seconds',
+                          'Duration of one check of due repos',
+                          buckets=(.1, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+POLL_CHECKED = Counter('poll_repos_checked_total', 'Repos checked by poller')
+POLL_CHANGED = Counter('poll_repos_changed_total', 'Repos with new release found by poller')
+FASTAPI_LATENCY = Histogram('fastapi_client_request_duration_seconds',
+                            'Latency of requests of bot to API by path and status',
+                            ['method', 'path', 'status'])
+TELEGRAM_LATENCY = Histogram('telegram_send_duration_seconds',
+                             'Time of send to Bot API with waits of rate limiter',
+                             ['priority'])
+TELEGRAM_RETRIES = Counter('telegram_retry_after_total',
+                           'Requests to Bot API repeated after flood control')
+TELEGRAM_QUEUED = Gauge('telegram_send_queued',
+                        'Messages waiting in rate limiter of bot by priority',
+                        ['priority'])
+TELEGRAM_PAUSED = Gauge('telegram_flood_pause_seconds',
+                        'Seconds left of pause of bot after flood control')
+
+
+def observe(histogram: Histogram, started: float, *labels) -> None:
+    """
+    Observe time since started (time.perf_counter) in histogram with labels.
+    """
+    metric = histogram.labels(*labels) if labels else histogram
+    metric.observe(time.perf_counter() - started)
+
+
+class LatencyMiddleware:
+    """
+    ASGI middleware which observes latency of requests in HTTP_LATENCY by template of route,
+    so ids in path don't make new series. Latency is taken till last part of body is sent,
+    so streamed responses are measured whole, and response isn't wrapped by middleware.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = {'status': 500, 'observed': False}
+
+        def finish():
+            if state['observed']:
+                return
+            state['observed'] = True
+            route = scope.get('route')
+            observe(HTTP_LATENCY, started, scope['method'],
+                    route.path if route else 'unmatched', state['status'])
+
+        async def send_measured(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            finish()
+
+
+def timed(queryset):
+    """
+    Decorator of class of queryset: time of every async classmethod is observed
+    in QUERY_LATENCY with names of queryset and method.
+    """
+    for method_name, method in list(vars(queryset).items()):
+        if not (isinstance(method, classmethod) and inspect.iscoroutinefunction(method.__func__)):
+            continue
+
+        def wrap(func, labels):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(QUERY_LATENCY, started, *labels)
+            return wrapper
+
+        setattr(queryset, method_name,
+                classmethod(wrap(method.__func__, (queryset.__name__, method_name))))
+    return queryset
+
+
+class GitHubBudgetCollector:
+    """
+    Collector of budget of tokens API GitHub: state of budgeter is read on every scrape,
+    so gauges show tokens and resources added after start without updates by poller.
+    Tokens are labeled by last 4 chars like in state of budgeter.
+    """
+    GAUGES = (('remaining', 'github_budget_remaining', 'Requests left till reset of rate limit'),
+              ('limit', 'github_budget_limit', 'Rate limit of token'),
+              ('reset_in', 'github_budget_reset_seconds', 'Seconds till reset of rate limit'),
+              ('blocked_for', 'github_budget_blocked_seconds',
+               'Seconds left of block of token after rate limited response'))
+
+    def __init__(self, budgeter):
+        """
+        :param budgeter: github_budget.GitHubBudgeter
+        """
+        self.budgeter = budgeter
+
+    def collect(self):
+        families = {key: GaugeMetricFamily(name, documentation, labels=['resource', 'token'])
+                    for key, name, documentation in self.GAUGES}
+        for resource, budgets in self.budgeter.state().items():
+            for budget in budgets:
+                for key, family in families.items():
+                    if budget[key] is not None:
+                        family.add_metric([resource, budget['token'] or 'anonymous'],
+                                          budget[key])
+        return list(families.values())
+
+
+def register_github_budget(budgeter) -> None:
+    """
+    Export budget of budgeter with metrics of process.
+    """
+    REGISTRY.register(GitHubBudgetCollector(budgeter))
+
+
+def render() -> tuple:
+    """
+    Metrics in text format of Prometheus.
+    :return: tuple(body, content type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(env_port: str, default_port: int, logger: logging.Logger) -> None:
+    """
+    Serve metrics by HTTP listener in background thread of process.
+    Port is taken from env_port, 0 turns listener off.
+    """
+    port = int(os.environ.get(env_port, default_port))
+    if port:
+        start_http_server(port)
+        logger.info('Metrics are served on port %s.', port)
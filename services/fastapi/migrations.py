@@ -0,0 +1,152 @@
+"""
+Module of versioned migrations of database schema.
+Tables of models are created by create_all, migrations add what create_all
+can't do on existing tables: indexes and constraints are built online
+by CREATE INDEX CONCURRENTLY, so tables aren't locked for writes.
+Applied versions are kept in table schema_migrations.
+"""
+import logging
+from typing import List, NamedTuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+MIGRATIONS_LOCK = 7_264_310_512
+
+
+class Migration(NamedTuple):
+    """
+    One version of schema.
+    index_name is set for migrations which build index concurrently:
+    invalid index left by failed build is dropped before new try.
+    """
+    version: int
+    name: str
+    statements: List[str]
+    index_name: str = None
+
+
+def create_index(version: int, name: str, table: str, columns: str,
+                 unique: bool = False, before: List[str] = None) -> Migration:
+    """
+    Migration which creates index without lock of writes to table.
+    :param version: version of schema
+    :param name: name of index
+    :param table: name of table
+    :param columns: columns of index separated by comma
+    :param unique: create unique index
+    :param before: idempotent statements run before build of index
+    :return: migration
+    """
+    statement = (f'CREATE {"UNIQUE " if unique else ""}INDEX CONCURRENTLY IF NOT EXISTS '
+                 f'{name} ON {table} ({columns});')
+    return Migration(version, f'create index {name}', (before or []) + [statement], name)
+
+
+# Копии репозитория с одинаковым uri, остается строка с наименьшим id
+DUPLICATE_REPOS = """(SELECT d.id, d.keep_id FROM (SELECT r.id, min(r.id) OVER (PARTITION BY r.uri) 
+AS keep_id FROM repos AS r) AS d WHERE d.id <> d.keep_id)"""
+
+# Старая схема (первичный ключ (id, uri) и проверка перед вставкой) допускала копии uri:
+# подписки, уведомления и история релизов копий переносятся на оставшийся репозиторий,
+# копии удаляются.
+# Каждый шаг идемпотентен, поэтому прерванная миграция повторяется с начала.
+DEDUPLICATE_REPOS_URI = [
+    *[f"""INSERT INTO {table} (user_id, repo_id) SELECT t.user_id, d.keep_id 
+    FROM {table} AS t JOIN {DUPLICATE_REPOS} AS d ON d.id=t.repo_id ON CONFLICT DO NOTHING;"""
+      for table in ('subscriptions', 'notifications')],
+    f"""INSERT INTO releases (repo_id, tag, release_date, created_at) 
+    SELECT d.keep_id, t.tag, t.release_date, t.created_at 
+    FROM releases AS t JOIN {DUPLICATE_REPOS} AS d ON d.id=t.repo_id ON CONFLICT DO NOTHING;""",
+    *[f"""DELETE FROM {table} AS t USING {DUPLICATE_REPOS} AS d WHERE d.id=t.repo_id;"""
+      for table in ('subscriptions', 'notifications', 'repos_schedule', 'releases')],
+    f"""DELETE FROM repos AS r USING {DUPLICATE_REPOS} AS d WHERE d.id=r.id;""",
+]
+
+
+MIGRATIONS = [
+    # Поиск репозитория по ссылке и ON CONFLICT (uri) при upsert
+    create_index(1, 'ix_repos_uri', 'repos', 'uri', unique=True, before=DEDUPLICATE_REPOS_URI),
+    # Рассылка уведомлений всем подписчикам обновленных репозиториев
+    create_index(2, 'ix_subscriptions_repo_id', 'subscriptions', 'repo_id'),
+    # Выбор пользователей для рассылки по времени
+    create_index(3, 'ix_notificationjobs_hour_minute', 'notificationjobs', 'hour, minute'),
+    # Выбор репозиториев, которые пора проверить
+    create_index(4, 'ix_repos_schedule_next_check_at', 'repos_schedule', 'next_check_at'),
+    # Источник релизов репозитория, NULL - общий источник поллера
+    Migration(5, 'add column repos.release_source',
+              ['ALTER TABLE repos ADD COLUMN IF NOT EXISTS release_source TEXT;']),
+    # Постраничный список подписок по ключу (repo_name, owner, id)
+    create_index(6, 'ix_repos_repo_name_owner_id', 'repos', 'repo_name, owner, id'),
+    # Постраничный список подписок пользователя по ключу (repo_name, owner, repo_id):
+    # ключи сортировки копируются из Repos в Subscriptions рядом с user_id,
+    # индекс версии 6 не используется запросом страницы и удаляется
+    create_index(7, 'ix_subscriptions_user_id_repo_name_owner', 'subscriptions',
+                 'user_id, repo_name, owner, repo_id', before=[
+                     'DROP INDEX CONCURRENTLY IF EXISTS ix_repos_repo_name_owner_id;',
+                     'ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS repo_name TEXT, '
+                     'ADD COLUMN IF NOT EXISTS owner TEXT;',
+                     'UPDATE subscriptions AS s SET repo_name=r.repo_name, owner=r.owner '
+                     'FROM repos AS r WHERE r.id=s.repo_id AND s.repo_name IS NULL;']),
+    # Сигнал обработчика задачи добавления подписок, задачи без сигнала перезапускаются поллером
+    Migration(8, 'add column ingest_jobs.heartbeat_at',
+              ['ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;']),
+]
+
+
+async def applied_versions(connection) -> set:
+    """
+    Versions of schema already applied to database.
+    """
+    await connection.execute(text("""CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY, name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'));"""))
+    versions = await connection.execute(text("""SELECT version FROM schema_migrations;"""))
+    return {version for version, in versions}
+
+
+async def drop_invalid_index(connection, name: str) -> None:
+    """
+    Drop index which was left invalid by interrupted CREATE INDEX CONCURRENTLY.
+    """
+    query = text("""SELECT 1 FROM pg_index AS i JOIN pg_class AS c ON c.oid=i.indexrelid
+    WHERE c.relname=:name AND pg_table_is_visible(c.oid) AND NOT i.indisvalid;""")
+    invalid = await connection.execute(query, {'name': name})
+    if invalid.first():
+        await connection.execute(text(f"""DROP INDEX CONCURRENTLY IF EXISTS {name};"""))
+
+
+async def run_migrations(engine: AsyncEngine, logger: logging.Logger,
+                         migrations: List[Migration] = None) -> List[int]:
+    """
+    Apply all not applied migrations in order of versions.
+    Connection works in autocommit, because CREATE INDEX CONCURRENTLY can't run in transaction.
+    Advisory lock lets only one worker of application migrate at the same time.
+    :param engine: engine of database
+    :param logger: logger
+    :param migrations: list of migrations, MIGRATIONS by default
+    :return: list of applied versions
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+    applied = []
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level='AUTOCOMMIT')
+        await connection.execute(text("""SELECT pg_advisory_lock(:key);"""),
+                                 {'key': MIGRATIONS_LOCK})
+        try:
+            versions = await applied_versions(connection)
+            for migration in migrations:
+                if migration.version in versions:
+                    continue
+                if migration.index_name:
+                    await drop_invalid_index(connection, migration.index_name)
+                for statement in migration.statements:
+                    await connection.execute(text(statement))
+                await connection.execute(text("""INSERT INTO schema_migrations (version, name)
+                VALUES (:version, :name);"""), {'version': migration.version,
+                                                'name': migration.name})
+                applied.append(migration.version)
+                logger.info('Success apply migration %s: %s.', migration.version, migration.name)
+        finally:
+            await connection.execute(text("""SELECT pg_advisory_unlock(:key);"""),
+                                     {'key': MIGRATIONS_LOCK})
+    return applied
@@ -2,7 +2,8 @@
 Declare tables to database from class of model.
 """
 from datetime import datetime as dt
-from sqlalchemy import Column, BigInteger, Text, DateTime, Integer
+from sqlalchemy import Column, BigInteger, Text, DateTime, Integer, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm.collections import InstrumentedList
 from database import Base
 
@@ -53,12 +54,15 @@ class Repos(BaseModel):
 
     id = Column(Integer(), nullable=False, autoincrement=True, primary_key=True,
                 comment='ID в базе данных')
-    uri = Column(Text(), nullable=False, primary_key=True, comment='Ссылка на репозиторий')
+    uri = Column(Text(), nullable=False, primary_key=True, unique=True, index=True,
+                 comment='Ссылка на репозиторий')
     api_uri = Column(Text(), nullable=False, comment='Ссылка на репозиторий')
     owner = Column(Text(), nullable=False, comment='Владелец репозитория')
     repo_name = Column(Text(), nullable=False, comment='Название репозитория')
     release = Column(Text(), nullable=False, comment='Номер последнего релиза')
     release_date = Column(DateTime(), nullable=False, comment='Дата последнего релиза')
+    release_source = Column(Text(), nullable=True,
+                            comment='Источник релизов: rest, graphql или atom')
 
 
 class Subscriptions(BaseModel):
@@ -66,10 +70,16 @@ class Subscriptions(BaseModel):
     Declare Subscriptions table
     """
     __tablename__ = "subscriptions"
-    __table_args__ = {'comment': 'Таблица подписок.'}
+    __table_args__ = (Index('ix_subscriptions_user_id_repo_name_owner',
+                            'user_id', 'repo_name', 'owner', 'repo_id'),
+                      {'comment': 'Таблица подписок.'})
 
     user_id = Column(Integer(), nullable=False, primary_key=True, comment='ID пользователя')
-    repo_id = Column(Integer(), nullable=False, primary_key=True, comment='ID репозитория')
+    repo_id = Column(Integer(), nullable=False, primary_key=True, index=True,
+                     comment='ID репозитория')
+    # Копии из Repos для постраничного списка подписок пользователя по индексу
+    repo_name = Column(Text(), nullable=True, comment='Название репозитория')
+    owner = Column(Text(), nullable=True, comment='Владелец репозитория')
 
 
 class Notifications(BaseModel):
@@ -88,9 +98,131 @@ class NotificationJobs(BaseModel):
     Declare NotificationJobs table.
     """
     __tablename__ = "notificationjobs"
-    __table_args__ = {'comment': 'Таблица для рассылок подписанным юзерам.'}
+    __table_args__ = (Index('ix_notificationjobs_hour_minute', 'hour', 'minute'),
+                      {'comment': 'Таблица для рассылок подписанным юзерам.'})
 
     user_id = Column(Integer(), nullable=False, primary_key=True, comment='ID пользователя')
     chat_id = Column(Integer(), nullable=False, primary_key=True, comment='ID чата')
     hour = Column(Integer(), nullable=False, comment='Час уведомления')
     minute = Column(Integer(), nullable=False, comment='Минута уведомления')
+
+
+class InstantAlerts(BaseModel):
+    """
+    Declare InstantAlerts table.
+    """
+    __tablename__ = "instant_alerts"
+    __table_args__ = {'comment': 'Таблица пользователей с мгновенными уведомлениями.'}
+
+    user_id = Column(BigInteger(), nullable=False, primary_key=True, comment='ID пользователя')
+    chat_id = Column(BigInteger(), nullable=False, comment='ID чата')
+
+
+class BotConversations(BaseModel):
+    """
+    Declare BotConversations table.
+    """
+    __tablename__ = "bot_conversations"
+    __table_args__ = {'comment': 'Таблица состояний диалогов бота, общая для всех реплик.'}
+
+    name = Column(Text(), nullable=False, primary_key=True, comment='Название диалога')
+    chat_id = Column(BigInteger(), nullable=False, primary_key=True, comment='ID чата')
+    user_id = Column(BigInteger(), nullable=False, primary_key=True, comment='ID пользователя')
+    state = Column(Integer(), nullable=False, comment='Состояние диалога')
+
+
+class BotShownSubscriptions(BaseModel):
+    """
+    Declare BotShownSubscriptions table.
+    """
+    __tablename__ = "bot_shown_subscriptions"
+    __table_args__ = {'comment': 'Таблица номеров подписок, показанных пользователю в списке, '
+                                 'общая для всех реплик бота.'}
+
+    chat_id = Column(BigInteger(), nullable=False, primary_key=True, comment='ID чата')
+    user_id = Column(BigInteger(), nullable=False, primary_key=True, comment='ID пользователя')
+    shown = Column(JSONB(), nullable=False,
+                   comment='Номер в списке: [владелец, название, ссылка на репозиторий]')
+
+
+class BotDispatches(BaseModel):
+    """
+    Declare BotDispatches table.
+    """
+    __tablename__ = "bot_dispatches"
+    __table_args__ = {'comment': 'Таблица разосланных минут уведомлений.'}
+
+    minute = Column(DateTime(), nullable=False, primary_key=True, comment='Минута рассылки')
+
+
+class ReposCache(BaseModel):
+    """
+    Declare ReposCache table.
+    """
+    __tablename__ = "repos_cache"
+    __table_args__ = {'comment': 'Таблица валидаторов кэша ответов API GitHub.'}
+
+    api_uri = Column(Text(), nullable=False, primary_key=True, comment='Ссылка на API репозитория')
+    etag = Column(Text(), nullable=True, comment='ETag последнего ответа')
+    last_modified = Column(Text(), nullable=True, comment='Last-Modified последнего ответа')
+
+
+class ReposSchedule(BaseModel):
+    """
+    Declare ReposSchedule table.
+    """
+    __tablename__ = "repos_schedule"
+    __table_args__ = {'comment': 'Таблица расписания проверок релизов.'}
+
+    repo_id = Column(Integer(), nullable=False, primary_key=True, comment='ID репозитория')
+    next_check_at = Column(DateTime(), nullable=False, index=True,
+                           comment='Время следующей проверки')
+    release_cadence = Column(Integer(), nullable=True,
+                             comment='Средний интервал между релизами в секундах')
+
+
+class Releases(BaseModel):
+    """
+    Declare Releases table.
+    Table is partitioned by month of release_date, partitions are created and dropped
+    by release_history.ReleaseHistory.
+    """
+    __tablename__ = "releases"
+    __table_args__ = (Index('ix_releases_repo_id_release_date', 'repo_id', 'release_date'),
+                      Index('ix_releases_release_date', 'release_date'),
+                      {'comment': 'Таблица истории релизов библиотек.',
+                       'postgresql_partition_by': 'RANGE (release_date)'})
+
+    repo_id = Column(Integer(), nullable=False, primary_key=True, comment='ID репозитория')
+    tag = Column(Text(), nullable=False, primary_key=True, comment='Номер релиза')
+    release_date = Column(DateTime(), nullable=False, primary_key=True, comment='Дата релиза')
+    created_at = Column(DateTime(), nullable=False, comment='Время записи релиза')
+
+
+class IngestJobs(BaseModel):
+    """
+    Declare IngestJobs table.
+    """
+    __tablename__ = "ingest_jobs"
+    __table_args__ = {'comment': 'Таблица задач добавления подписок.'}
+
+    id = Column(Text(), nullable=False, primary_key=True, comment='ID задачи')
+    user_id = Column(BigInteger(), nullable=False, comment='ID пользователя')
+    status = Column(Text(), nullable=False, comment='Статус задачи')
+    created_at = Column(DateTime(), nullable=False, comment='Время создания задачи')
+    finished_at = Column(DateTime(), nullable=True, comment='Время завершения задачи')
+    heartbeat_at = Column(DateTime(), nullable=True, comment='Время сигнала обработчика')
+
+
+class IngestJobRepos(BaseModel):
+    """
+    Declare IngestJobRepos table.
+    """
+    __tablename__ = "ingest_job_repos"
+    __table_args__ = {'comment': 'Таблица репозиториев задач добавления подписок.'}
+
+    job_id = Column(Text(), nullable=False, primary_key=True, comment='ID задачи')
+    owner = Column(Text(), nullable=False, primary_key=True, comment='Владелец репозитория')
+    repo_name = Column(Text(), nullable=False, primary_key=True, comment='Название репозитория')
+    status = Column(Text(), nullable=False, comment='Статус репозитория')
+    release = Column(Text(), nullable=True, comment='Номер последнего релиза')
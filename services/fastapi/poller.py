@@ -0,0 +1,92 @@
+"""
+Module for start poller of releases as separate service.
+Any amount of instances can run: only leader polls, others wait for leadership
+and take it when leader stops. Workers of API don't poll unless FASTAPI_SCHEDULER=on.
+Leader also resumes jobs of addition subscriptions lost by restart of workers of API.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime as dt
+import click
+
+from getlogger import get_logger
+from database import Base, engine
+from database import sm as session_maker
+from github_api import create_client
+from github_budget import GitHubBudgeter
+from release_poller import ReleasePoller
+from ingest import SubscriptionIngestor
+from cache import SubscriptionCache
+from leader import LeaderLease
+from metrics import register_github_budget, start_metrics_server
+from migrations import run_migrations
+from querysets import ReposScheduleQueryset
+
+
+async def run(tick: int, retry: int) -> None:
+    """
+    Poll releases every tick while instance is leader, try to take leadership every retry.
+    :param tick: seconds between checks of due repos
+    :param retry: seconds between tries of standby to take leadership
+    :return: None
+    """
+    logger = get_logger('poller')
+    start_metrics_server('POLLER_METRICS_PORT', 9102, logger)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine, logger)
+
+    github = create_client()
+    lease = LeaderLease(engine, logger)
+    budgeter = GitHubBudgeter.from_env(logger)
+    register_github_budget(budgeter)
+    cache = SubscriptionCache(engine, logger)
+    poller = ReleasePoller(session_maker, github, logger, budgeter=budgeter, cache=cache)
+    ingestor = SubscriptionIngestor(session_maker, poller, logger, cache=cache)
+    logger.info('Poller was started.')
+    try:
+        leading = False
+        while True:
+            if not await lease.acquire():
+                leading = False
+                await asyncio.sleep(retry)
+                continue
+            start = time.monotonic()
+            try:
+                if not leading:
+                    async with session_maker.begin() as session:
+                        await ReposScheduleQueryset.create_missing(session, dt.utcnow())
+                    leading = True
+                await poller.check_releases()
+            except Exception as e:
+                logger.error('Wrong check releases with error: %s', e)
+            try:
+                await ingestor.resume()
+            except Exception as e:
+                logger.error('Wrong resume jobs of addition subscriptions with error: %s', e)
+            await asyncio.sleep(max(tick - (time.monotonic() - start), 0))
+    finally:
+        await lease.close()
+        await github.aclose()
+        await engine.dispose()
+        logger.info('Poller was stopped.')
+
+
+@click.command()
+@click.option('--tick', '-t', default=None, type=int)
+@click.option('--retry', '-r', default=None, type=int)
+def main(tick: int, retry: int) -> None:
+    """
+    Run poller of releases.
+    :param tick: seconds between checks, env POLL_TICK_SECONDS by default
+    :param retry: seconds between tries to take leadership, env POLLER_LEASE_RETRY by default
+    :return: None
+    """
+    tick = tick or int(os.environ.get('POLL_TICK_SECONDS', 60))
+    retry = retry or int(os.environ.get('POLLER_LEASE_RETRY', 5))
+    asyncio.run(run(tick, retry))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Module of messages between workers of application by LISTEN/NOTIFY of Postgres.
+Message is sent in transaction of change, so listeners get it only after commit.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+RECONNECT_DELAY = 5
+PING_INTERVAL = float(os.environ.get('PUBSUB_PING_INTERVAL', 30))
+PING_TIMEOUT = float(os.environ.get('PUBSUB_PING_TIMEOUT', 5))
+
+
+async def notify(session: AsyncSession, channel: str, payload: Dict[str, Any]) -> None:
+    """
+    Send message to channel on commit of transaction of session.
+    :param session: session of transaction of change
+    :param channel: name of channel
+    :param payload: message as dict, JSON of it must be shorter than 8000 bytes
+    :return: None
+    """
+    query = text("""SELECT pg_notify(:channel, :payload);""")
+    await session.execute(query, {'channel': channel, 'payload': json.dumps(payload)})
+
+
+class Listener:
+    """
+    Dedicated connection of asyncpg which listens channel and calls callback on every message.
+    Connection is checked by SELECT 1 every PING_INTERVAL, so half-open connection
+    isn't taken as listening. Lost connection is restored after RECONNECT_DELAY,
+    on_connect is called on every (re)connection and on_disconnect on every loss,
+    so subscriber can drop state which could miss messages.
+    """
+    def __init__(self, engine: AsyncEngine, channel: str,
+                 callback: Callable[[Dict[str, Any]], None],
+                 logger: logging.Logger,
+                 on_connect: Callable[[], None] = None,
+                 on_disconnect: Callable[[], None] = None):
+        """
+        :param engine: engine of database, its URL is used for connection
+        :param channel: name of channel
+        :param callback: function of message as dict
+        :param logger: logger
+        :param on_connect: function called when channel is listened
+        :param on_disconnect: function called when connection is lost
+        """
+        self.engine = engine
+        self.channel = channel
+        self.callback = callback
+        self.logger = logger
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.connection = None
+        self.task = None
+
+    @property
+    def listening(self) -> bool:
+        """
+        Channel is listened now.
+        """
+        return self.connection is not None and not self.connection.is_closed()
+
+    async def start(self) -> None:
+        """
+        Connect and listen channel in background.
+        """
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop listen channel and close connection.
+        """
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.listening:
+            await self.connection.close()
+        self.connection = None
+
+    async def run(self) -> None:
+        """
+        Keep connection listening channel.
+        """
+        url = self.engine.url
+        while True:
+            try:
+                self.connection = await asyncpg.connect(host=url.host, port=url.port,
+                                                        user=url.username,
+                                                        password=url.password,
+                                                        database=url.database)
+                closed = asyncio.Event()
+                self.connection.add_termination_listener(lambda _: closed.set())
+                await self.connection.add_listener(self.channel, self.receive)
+                if self.on_connect:
+                    self.on_connect()
+                self.logger.info('Success listen channel %s.', self.channel)
+                await self.watch(closed)
+                self.logger.error('Connection of channel %s was lost.', self.channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error('Wrong listen channel %s with error: %s', self.channel, e)
+            self.drop()
+            if self.on_disconnect:
+                self.on_disconnect()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def watch(self, closed: asyncio.Event) -> None:
+        """
+        Wait until connection is closed, ping it every PING_INTERVAL.
+        :param closed: event set by termination listener of connection
+        :raise: error of ping if server doesn't answer in PING_TIMEOUT
+        """
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(closed.wait(), PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await asyncio.wait_for(self.connection.fetchval("""SELECT 1;"""), PING_TIMEOUT)
+
+    def drop(self) -> None:
+        """
+        Abort connection at once, so listener is down until reconnection.
+        """
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed():
+            connection.terminate()
+
+    def receive(self, _, __, channel: str, payload: str) -> None:
+        """
+        Handler of asyncpg for messages of channel.
+        """
+        try:
+            self.callback(json.loads(payload))
+        except Exception as e:
+            self.logger.error('Wrong message of channel %s with error: %s', channel, e)
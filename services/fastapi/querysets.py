@@ -2,11 +2,19 @@
 Module with querysets of models.
 Declare logic CRUD.
 """
+import json
 from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
-from models import Users, Repos, Subscriptions, Notifications, NotificationJobs
+from metrics import timed
+from models import (Users, Repos, Subscriptions, Notifications, NotificationJobs,
+                    InstantAlerts, BotConversations, BotShownSubscriptions, BotDispatches,
+                    ReposCache, ReposSchedule, IngestJobs, Releases)
 
+RELEASES_PARTITIONS_LOCK = 7_264_310_514
 
+
+@timed
 class UsersQueryset:
     """
     Manage table Users.
@@ -23,6 +31,7 @@ class UsersQueryset:
         await session.flush([created])
 
 
+@timed
 class ReposQueryset:
     """
     Manage table Repos.
@@ -59,6 +68,36 @@ class ReposQueryset:
                 id_, is_create, is_update = to_update.id, False, False
         return id_, is_create, is_update
 
+    @classmethod
+    async def select_by_ids(cls, session: AsyncSession, ids):
+        """
+        Select repos by list of id.
+        """
+        query = text("""SELECT r.id, r.uri, r.api_uri, r.owner, r.repo_name, 
+        r.release, r.release_date, r.release_source FROM repos AS r WHERE r.id = ANY(:ids);""")
+        repos = await session.execute(query, {'ids': list(ids)})
+        return repos.all()
+
+    @classmethod
+    async def get_releases(cls, session: AsyncSession, uris):
+        """
+        Select latest release of repos by list of uri.
+        Return dict uri: release.
+        """
+        query = text("""SELECT r.uri, r.release FROM repos AS r WHERE r.uri = ANY(:uris);""")
+        releases = await session.execute(query, {'uris': list(uris)})
+        return dict(releases.all())
+
+    @classmethod
+    async def get_ids(cls, session: AsyncSession, uris):
+        """
+        Select id of repos by list of uri.
+        Return dict uri: id.
+        """
+        query = text("""SELECT r.uri, r.id FROM repos AS r WHERE r.uri = ANY(:uris);""")
+        ids = await session.execute(query, {'uris': list(uris)})
+        return dict(ids.all())
+
     @classmethod
     async def update(cls, session: AsyncSession, data_dict):
         """
@@ -68,11 +107,170 @@ class ReposQueryset:
         release_date = data_dict['release_date']
         uri = data_dict['uri']
 
-        query = text(f"""UPDATE repos SET release='{release}', 
-        release_date='{release_date}' WHERE uri='{uri}';""")
-        await session.execute(query)
+        query = text("""UPDATE repos SET release=:release, 
+        release_date=:release_date WHERE uri=:uri;""")
+        await session.execute(query, {'release': release,
+                                      'release_date': release_date,
+                                      'uri': uri})
 
+    @classmethod
+    async def set_source(cls, session: AsyncSession, uris, source):
+        """
+        Set source of releases of repos by list of uri, None returns repos to global source.
+        Return amount of updated repos.
+        """
+        query = text("""UPDATE repos SET release_source=:source WHERE uri = ANY(:uris);""")
+        updated = await session.execute(query, {'source': source, 'uris': list(uris)})
+        return updated.rowcount
+
+    @classmethod
+    async def bulk_update(cls, session: AsyncSession, changes):
+        """
+        Set new release and release_date of many repos by one statement.
+        :param changes: list of tuple(repo_id, release, release_date)
+        """
+        if not changes:
+            return
+        ids, releases, release_dates = map(list, zip(*changes))
+        query = text("""UPDATE repos AS r SET release=v.release, release_date=v.release_date 
+        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:releases AS TEXT[]), 
+        CAST(:release_dates AS TIMESTAMP[])) AS v(id, release, release_date) 
+        WHERE r.id=v.id;""")
+        await session.execute(query, {'ids': ids, 'releases': releases,
+                                      'release_dates': release_dates})
 
+    @classmethod
+    async def upsert(cls, session: AsyncSession, data_dicts):
+        """
+        Create new repos and update release of existing repos if it's newer by one statement.
+        Return dict uri: tuple(id, is_create, is_update) for all repos of data_dicts.
+        """
+        data_dicts = list({data_dict['uri']: data_dict for data_dict in data_dicts}.values())
+        if not data_dicts:
+            return {}
+        columns = ['uri', 'api_uri', 'owner', 'repo_name', 'release', 'release_date']
+        values = {column: [data_dict[column] for data_dict in data_dicts] for column in columns}
+        query = text("""INSERT INTO repos (uri, api_uri, owner, repo_name, release, release_date) 
+        SELECT * FROM unnest(CAST(:uri AS TEXT[]), CAST(:api_uri AS TEXT[]), 
+        CAST(:owner AS TEXT[]), CAST(:repo_name AS TEXT[]), CAST(:release AS TEXT[]), 
+        CAST(:release_date AS TIMESTAMP[])) 
+        ON CONFLICT (uri) DO UPDATE SET release=EXCLUDED.release, 
+        release_date=EXCLUDED.release_date WHERE repos.release_date < EXCLUDED.release_date 
+        RETURNING repos.uri, (xmax = 0) AS is_create;""")
+        changed = dict((await session.execute(query, values)).all())
+        ids = await cls.get_ids(session, values['uri'])
+        return {uri: (id_, changed.get(uri) is True, changed.get(uri) is False)
+                for uri, id_ in ids.items()}
+
+
+@timed
+class ReposCacheQueryset:
+    """
+    Manage table ReposCache.
+    Keep validators ETag and Last-Modified for conditional requests to API GitHub.
+    """
+    model = ReposCache
+
+    @classmethod
+    async def get_by_api_uris(cls, session: AsyncSession, api_uris):
+        """
+        Select validators by list of api_uri or URI of feeds.
+        Return dict api_uri: (etag, last_modified).
+        """
+        query = text("""SELECT c.api_uri, c.etag, c.last_modified FROM repos_cache AS c
+        WHERE c.api_uri = ANY(:api_uris);""")
+        cache = await session.execute(query, {'api_uris': list(api_uris)})
+        return {api_uri: (etag, last_modified) for api_uri, etag, last_modified in cache}
+
+    @classmethod
+    async def update(cls, session: AsyncSession, validators):
+        """
+        Create or update validators by list of tuple(api_uri, etag, last_modified).
+        Responses without validators are skipped.
+        """
+        validators = [row for row in validators if row[1] or row[2]]
+        if not validators:
+            return
+        query = text("""INSERT INTO repos_cache (api_uri, etag, last_modified) 
+        VALUES (:api_uri, :etag, :last_modified) ON CONFLICT (api_uri) 
+        DO UPDATE SET etag=EXCLUDED.etag, last_modified=EXCLUDED.last_modified;""")
+        await session.execute(query, [{'api_uri': api_uri, 'etag': etag,
+                                       'last_modified': last_modified}
+                                      for api_uri, etag, last_modified in validators])
+
+
+@timed
+class ReposScheduleQueryset:
+    """
+    Manage table ReposSchedule.
+    Queue of repos by time of next check of release.
+    """
+    model = ReposSchedule
+
+    @classmethod
+    async def create_missing(cls, session: AsyncSession, next_check_at):
+        """
+        Put to schedule all repos which haven't time of next check.
+        """
+        query = text("""INSERT INTO repos_schedule (repo_id, next_check_at) 
+        SELECT r.id, :next_check_at FROM repos AS r ON CONFLICT DO NOTHING;""")
+        await session.execute(query, {'next_check_at': next_check_at})
+
+    @classmethod
+    async def create(cls, session: AsyncSession, schedule):
+        """
+        Put new repos to schedule by list of tuple(repo_id, next_check_at).
+        If repo is already in schedule - do nothing.
+        """
+        if not schedule:
+            return
+        query = text("""INSERT INTO repos_schedule (repo_id, next_check_at) 
+        VALUES (:repo_id, :next_check_at) ON CONFLICT DO NOTHING;""")
+        await session.execute(query, [{'repo_id': id_repo, 'next_check_at': next_check_at}
+                                      for id_repo, next_check_at in schedule])
+
+    @classmethod
+    async def claim_due(cls, session: AsyncSession, now, limit, lease_until):
+        """
+        Take slice of repos whose time of check has come.
+        Time of next check is moved to lease_until, so repo is checked again
+        if poller falls before write of result.
+        Return list of repo id.
+        """
+        query = text("""UPDATE repos_schedule AS s SET next_check_at=:lease_until 
+        WHERE s.repo_id IN (SELECT d.repo_id FROM repos_schedule AS d 
+        WHERE d.next_check_at <= :now ORDER BY d.next_check_at LIMIT :limit 
+        FOR UPDATE SKIP LOCKED) RETURNING s.repo_id;""")
+        ids = await session.execute(query, {'now': now, 'limit': limit,
+                                            'lease_until': lease_until})
+        return ids.scalars().all()
+
+    @classmethod
+    async def get_cadences(cls, session: AsyncSession, ids):
+        """
+        Select known release cadence by list of repo id.
+        Return dict repo_id: release_cadence.
+        """
+        query = text("""SELECT s.repo_id, s.release_cadence FROM repos_schedule AS s 
+        WHERE s.repo_id = ANY(:ids);""")
+        cadences = await session.execute(query, {'ids': list(ids)})
+        return dict(cadences.all())
+
+    @classmethod
+    async def update(cls, session: AsyncSession, schedule):
+        """
+        Set time of next check by list of tuple(repo_id, next_check_at, release_cadence).
+        """
+        if not schedule:
+            return
+        query = text("""UPDATE repos_schedule SET next_check_at=:next_check_at, 
+        release_cadence=:release_cadence WHERE repo_id=:repo_id;""")
+        await session.execute(query, [{'repo_id': id_repo, 'next_check_at': next_check_at,
+                                       'release_cadence': cadence}
+                                      for id_repo, next_check_at, cadence in schedule])
+
+
+@timed
 class SubscriptionsQueryset:
     """
     Manage table Subscriptions.
@@ -83,47 +281,100 @@ class SubscriptionsQueryset:
     async def create(cls, session: AsyncSession, data_dict):
         """
         Create new subscriptions. If user already have subscription on repos - do nothing.
+        Name and owner of repo are copied from table Repos.
         """
         to_update = await session.scalar(select(cls.model)
                                          .where((cls.model.user_id == data_dict['user_id']) &
                                                 (cls.model.repo_id == data_dict['repo_id'])))
         if not to_update:
-            created = cls.model(**data_dict)
+            repo = (await session.execute(select(Repos.repo_name, Repos.owner)
+                                          .where(Repos.id == data_dict['repo_id']))).first()
+            created = cls.model(**data_dict, **(repo._asdict() if repo else {}))
             await session.merge(created)
             await session.flush([created])
             # return created.id
 
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, user, ids):
+        """
+        Create subscriptions of user on many repos by one statement.
+        Name and owner of repo are copied from table Repos.
+        If user already have subscription on repo - do nothing.
+        """
+        if not ids:
+            return
+        query = text("""INSERT INTO subscriptions (user_id, repo_id, repo_name, owner) 
+        SELECT :user, r.id, r.repo_name, r.owner FROM repos AS r 
+        WHERE r.id = ANY(:ids) ON CONFLICT DO NOTHING;""")
+        await session.execute(query, {'user': user, 'ids': list(ids)})
+
     @classmethod
     async def get_repos_by_user(cls, session, user):
         """
         Select all repos and info of them by user.
+        Date of release is formatted by database, so rows are ready for JSON.
         """
-        query = text(f"""SELECT s.user_id, r.owner, r.repo_name, 
-        r.uri, r.release, r.release_date FROM subscriptions AS s
-        JOIN repos AS r ON s.repo_id=r.id WHERE s.user_id={user} 
-        ORDER BY (r.repo_name, r.owner) ASC;""")
-        repos = await session.execute(query)
+        query = text("""SELECT s.user_id, r.owner, r.repo_name, r.uri, r.release, 
+        to_char(r.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date FROM subscriptions AS s
+        JOIN repos AS r ON s.repo_id=r.id WHERE s.user_id=:user 
+        ORDER BY r.repo_name, r.owner ASC;""")
+        repos = await session.execute(query, {'user': user})
         return repos
 
+    @classmethod
+    async def get_page(cls, session, user, limit, after=None, before=None):
+        """
+        Select page of repos of user by keyset (repo_name, owner, id) in order of full list.
+        Keys are taken from copies in Subscriptions, so page is read by index
+        (user_id, repo_name, owner, repo_id) and only repos of page are joined.
+        Page starts after repo with id after, ends before repo with id before
+        or is the first page if both are None.
+        Return tuple(rows in order of list with id of repo first,
+        flag that there are more repos in direction of page).
+        """
+        columns = """SELECT s.repo_id AS id, s.user_id, s.owner, s.repo_name, r.uri, r.release, 
+        to_char(r.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date 
+        FROM subscriptions AS s JOIN repos AS r ON s.repo_id=r.id WHERE s.user_id=:user """
+        if before is not None:
+            query = text(columns + """AND (s.repo_name, s.owner, s.repo_id) < 
+            (SELECT c.repo_name, c.owner, c.id FROM repos AS c WHERE c.id=:cursor) 
+            ORDER BY s.repo_name DESC, s.owner DESC, s.repo_id DESC LIMIT :limit;""")
+        elif after is not None:
+            query = text(columns + """AND (s.repo_name, s.owner, s.repo_id) > 
+            (SELECT c.repo_name, c.owner, c.id FROM repos AS c WHERE c.id=:cursor) 
+            ORDER BY s.repo_name, s.owner, s.repo_id LIMIT :limit;""")
+        else:
+            query = text(columns + """ORDER BY s.repo_name, s.owner, s.repo_id LIMIT :limit;""")
+        params = {'user': user, 'limit': limit + 1}
+        if before is not None or after is not None:
+            params['cursor'] = after if before is None else before
+        repos = (await session.execute(query, params)).all()
+        more = len(repos) > limit
+        repos = repos[:limit]
+        if before is not None:
+            repos.reverse()
+        return repos, more
+
     @classmethod
     async def delete_by_user(cls, session, user):
         """
         Delete all subscriptions from table by user.
         """
-        query = text(f"""DELETE FROM subscriptions AS s WHERE s.user_id={user};""")
-        await session.execute(query)
+        query = text("""DELETE FROM subscriptions AS s WHERE s.user_id=:user;""")
+        await session.execute(query, {'user': user})
 
     @classmethod
     async def delete_by_user_and_repos(cls, session, user, repos):
         """
         Delete concrete repos from subscriptions of user.
         """
-        query = text(f"""DELETE FROM subscriptions AS s WHERE s.user_id={user} 
+        query = text("""DELETE FROM subscriptions AS s WHERE s.user_id=:user 
         AND s.repo_id IN (SELECT r.id FROM repos AS r 
-        WHERE r.uri IN ({', '.join(repos)}));""")
-        await session.execute(query)
+        WHERE r.uri = ANY(:uris));""")
+        await session.execute(query, {'user': user, 'uris': list(repos)})
 
 
+@timed
 class NotificationsQueryset:
     """
     Manage table Notifications.
@@ -135,43 +386,88 @@ class NotificationsQueryset:
         """
         Create notifications if user have subscriptions by repo_id.
         """
-        query = text(f"""INSERT INTO notifications (user_id, repo_id) 
+        query = text("""INSERT INTO notifications (user_id, repo_id) 
+        (SELECT s.user_id, s.repo_id FROM subscriptions AS s 
+        WHERE s.repo_id=:id_repo) ON CONFLICT DO NOTHING;""")
+        await session.execute(query, {'id_repo': id_repo})
+
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, ids):
+        """
+        Create notifications for all users who have subscriptions on repos from list of id.
+        """
+        if not ids:
+            return
+        query = text("""INSERT INTO notifications (user_id, repo_id) 
         (SELECT s.user_id, s.repo_id FROM subscriptions AS s 
-        WHERE s.repo_id={id_repo}) ON CONFLICT DO NOTHING;""")
-        await session.execute(query)
+        WHERE s.repo_id = ANY(:ids)) ON CONFLICT DO NOTHING;""")
+        await session.execute(query, {'ids': list(ids)})
 
     @classmethod
     async def get_repos_by_user(cls, session, user):
         """
-        Select all notifications by user and delete them after send message.
+        Select all notifications by user and delete them by one statement.
+        Date of release is formatted by database, so rows are ready for JSON.
         """
-        query = text(f"""SELECT n.user_id, r.owner, r.repo_name, 
-        r.uri, r.release, r.release_date FROM notifications AS n
-        JOIN repos AS r ON n.repo_id=r.id WHERE n.user_id={user} 
-        ORDER BY (r.repo_name, r.owner) ASC;""")
-        repos = await session.execute(query)
-        await cls.delete_by_user(session, user)
+        query = text("""WITH claimed AS (DELETE FROM notifications AS n 
+        WHERE n.user_id=:user RETURNING n.user_id, n.repo_id) 
+        SELECT c.user_id, r.owner, r.repo_name, r.uri, r.release, 
+        to_char(r.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date 
+        FROM claimed AS c JOIN repos AS r ON c.repo_id=r.id 
+        ORDER BY r.repo_name, r.owner ASC;""")
+        repos = await session.execute(query, {'user': user})
         return repos
 
+    @classmethod
+    async def claim_by_users(cls, session: AsyncSession, users):
+        """
+        Delete all notifications by list of users and return them with info of repos
+        by one statement. Rows are streamed by server-side cursor ordered by user.
+        """
+        query = text("""WITH claimed AS (DELETE FROM notifications AS n 
+        WHERE n.user_id = ANY(:users) RETURNING n.user_id, n.repo_id) 
+        SELECT c.user_id, r.owner, r.repo_name, r.uri, r.release, 
+        to_char(r.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date 
+        FROM claimed AS c JOIN repos AS r ON c.repo_id=r.id 
+        ORDER BY c.user_id, r.repo_name, r.owner;""")
+        return await session.stream(query, {'users': list(users)})
+
+    @classmethod
+    async def claim_by_time(cls, session: AsyncSession, hour, minute):
+        """
+        Delete all notifications of users whose notifications are set on time
+        and return them with info of repos by one statement.
+        Rows are streamed by server-side cursor ordered by user.
+        """
+        query = text("""WITH claimed AS (DELETE FROM notifications AS n 
+        WHERE n.user_id IN (SELECT j.user_id FROM notificationjobs AS j 
+        WHERE j.hour=:hour AND j.minute=:minute) RETURNING n.user_id, n.repo_id) 
+        SELECT c.user_id, r.owner, r.repo_name, r.uri, r.release, 
+        to_char(r.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date 
+        FROM claimed AS c JOIN repos AS r ON c.repo_id=r.id 
+        ORDER BY c.user_id, r.repo_name, r.owner;""")
+        return await session.stream(query, {'hour': hour, 'minute': minute})
+
     @classmethod
     async def delete_by_user(cls, session, user):
         """
         Delete all notifications by user.
         """
-        query = text(f"""DELETE FROM notifications AS n WHERE n.user_id={user};""")
-        await session.execute(query)
+        query = text("""DELETE FROM notifications AS n WHERE n.user_id=:user;""")
+        await session.execute(query, {'user': user})
 
     @classmethod
     async def delete_by_user_and_repos(cls, session, user, repos):
         """
         Delete concrete notifications by user and repos_id.
         """
-        query = text(f"""DELETE FROM notifications AS n WHERE n.user_id={user} 
+        query = text("""DELETE FROM notifications AS n WHERE n.user_id=:user 
         AND n.repo_id IN (SELECT r.id FROM repos AS r 
-        WHERE r.uri IN ({', '.join(repos)}));""")
-        await session.execute(query)
+        WHERE r.uri = ANY(:uris));""")
+        await session.execute(query, {'user': user, 'uris': list(repos)})
 
 
+@timed
 class NotificationJobsQueryset:
     """
     Manage table NotificationJobs.
@@ -184,10 +480,10 @@ class NotificationJobsQueryset:
         """
         Create new time of job notifications.
         """
-        query = text(f"""INSERT INTO notificationjobs 
+        query = text("""INSERT INTO notificationjobs 
         (user_id, chat_id, hour, minute) 
-        VALUES ({', '.join(map(str, job))});""")
-        await session.execute(query)
+        VALUES (:user_id, :chat_id, :hour, :minute);""")
+        await session.execute(query, dict(zip(['user_id', 'chat_id', 'hour', 'minute'], job)))
 
     @classmethod
     async def select(cls, session: AsyncSession):
@@ -199,10 +495,367 @@ class NotificationJobsQueryset:
         jobs = await session.execute(query)
         return jobs
 
+    @classmethod
+    async def select_by_time(cls, session: AsyncSession, hour, minute):
+        """
+        Select users and chats whose notifications are set on time.
+        """
+        query = text("""SELECT j.user_id, j.chat_id FROM notificationjobs AS j 
+        WHERE j.hour=:hour AND j.minute=:minute;""")
+        jobs = await session.execute(query, {'hour': hour, 'minute': minute})
+        return jobs.all()
+
     @classmethod
     async def delete(cls, session: AsyncSession, user):
         """
         Delete notification job by user.
         """
-        query = text(f"""DELETE FROM notificationjobs WHERE user_id={user};""")
-        await session.execute(query)
+        query = text("""DELETE FROM notificationjobs WHERE user_id=:user;""")
+        await session.execute(query, {'user': user})
+
+
+@timed
+class InstantAlertsQueryset:
+    """
+    Manage table InstantAlerts.
+    In this table have users who get notifications as soon as release is found.
+    """
+    model = InstantAlerts
+
+    @classmethod
+    async def create(cls, session: AsyncSession, user, chat):
+        """
+        Turn on instant notifications of user.
+        """
+        query = text("""INSERT INTO instant_alerts (user_id, chat_id) VALUES (:user, :chat) 
+        ON CONFLICT (user_id) DO UPDATE SET chat_id=EXCLUDED.chat_id;""")
+        await session.execute(query, {'user': user, 'chat': chat})
+
+    @classmethod
+    async def delete(cls, session: AsyncSession, user):
+        """
+        Turn off instant notifications of user.
+        Return True if they were turned on.
+        """
+        query = text("""DELETE FROM instant_alerts WHERE user_id=:user RETURNING user_id;""")
+        deleted = await session.execute(query, {'user': user})
+        return deleted.first() is not None
+
+    @classmethod
+    async def select_by_repos(cls, session: AsyncSession, ids):
+        """
+        Select users and chats with instant notifications who have subscriptions
+        on repos from list of id.
+        """
+        query = text("""SELECT DISTINCT a.user_id, a.chat_id FROM instant_alerts AS a 
+        JOIN subscriptions AS s ON s.user_id=a.user_id WHERE s.repo_id = ANY(:ids);""")
+        users = await session.execute(query, {'ids': list(ids)})
+        return users.all()
+
+
+@timed
+class BotConversationsQueryset:
+    """
+    Manage table BotConversations.
+    """
+    model = BotConversations
+
+    @classmethod
+    async def get(cls, session: AsyncSession, name, chat, user):
+        """
+        Select state of conversation of user in chat.
+        Return None if conversation isn't started.
+        """
+        query = text("""SELECT c.state FROM bot_conversations AS c 
+        WHERE c.name=:name AND c.chat_id=:chat AND c.user_id=:user;""")
+        return await session.scalar(query, {'name': name, 'chat': chat, 'user': user})
+
+    @classmethod
+    async def set(cls, session: AsyncSession, name, chat, user, state):
+        """
+        Save state of conversation of user in chat, None ends conversation.
+        """
+        params = {'name': name, 'chat': chat, 'user': user, 'state': state}
+        if state is None:
+            query = text("""DELETE FROM bot_conversations 
+            WHERE name=:name AND chat_id=:chat AND user_id=:user;""")
+        else:
+            query = text("""INSERT INTO bot_conversations (name, chat_id, user_id, state) 
+            VALUES (:name, :chat, :user, :state) 
+            ON CONFLICT (name, chat_id, user_id) DO UPDATE SET state=EXCLUDED.state;""")
+        await session.execute(query, params)
+
+
+@timed
+class BotShownSubscriptionsQueryset:
+    """
+    Manage table BotShownSubscriptions.
+    """
+    model = BotShownSubscriptions
+
+    @classmethod
+    async def get(cls, session: AsyncSession, chat, user):
+        """
+        Select repos shown to user in chat as number: [owner, repo_name, uri].
+        """
+        query = text("""SELECT b.shown FROM bot_shown_subscriptions AS b 
+        WHERE b.chat_id=:chat AND b.user_id=:user;""").columns(shown=JSONB)
+        shown = await session.scalar(query, {'chat': chat, 'user': user})
+        return {int(number): repo for number, repo in (shown or {}).items()}
+
+    @classmethod
+    async def add(cls, session: AsyncSession, chat, user, shown, replace=False):
+        """
+        Add repos of shown page to repos shown to user in chat,
+        replace all shown repos if replace is True.
+        """
+        query = text(f"""INSERT INTO bot_shown_subscriptions (chat_id, user_id, shown) 
+        VALUES (:chat, :user, CAST(:shown AS JSONB)) ON CONFLICT (chat_id, user_id) 
+        DO UPDATE SET shown={'' if replace else 'bot_shown_subscriptions.shown || '}EXCLUDED.shown;""")
+        await session.execute(query, {'chat': chat, 'user': user,
+                                      'shown': json.dumps({str(number): repo
+                                                           for number, repo in shown.items()})})
+
+    @classmethod
+    async def remove(cls, session: AsyncSession, chat, user, numbers):
+        """
+        Forget repos of numbers shown to user in chat.
+        """
+        query = text("""UPDATE bot_shown_subscriptions SET shown=shown - CAST(:numbers AS TEXT[]) 
+        WHERE chat_id=:chat AND user_id=:user;""")
+        await session.execute(query, {'chat': chat, 'user': user,
+                                      'numbers': [str(number) for number in numbers]})
+
+
+@timed
+class BotDispatchesQueryset:
+    """
+    Manage table BotDispatches.
+    """
+    model = BotDispatches
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, minute, keep_since):
+        """
+        Take minute of notifications for dispatch, only one replica of bot gets it.
+        Minutes older than keep_since are deleted.
+        Return True if minute was taken by this call.
+        """
+        await session.execute(text("""DELETE FROM bot_dispatches WHERE minute < :keep_since;"""),
+                              {'keep_since': keep_since})
+        query = text("""INSERT INTO bot_dispatches (minute) VALUES (:minute) 
+        ON CONFLICT DO NOTHING RETURNING minute;""")
+        claimed = await session.execute(query, {'minute': minute})
+        return claimed.first() is not None
+
+
+@timed
+class IngestJobsQueryset:
+    """
+    Manage tables IngestJobs and IngestJobRepos.
+    Keep progress of jobs of addition subscriptions.
+    """
+    model = IngestJobs
+
+    @classmethod
+    async def create(cls, session: AsyncSession, job_id, user, repos, created_at):
+        """
+        Create new job with all its repos as pending.
+        """
+        query = text("""INSERT INTO ingest_jobs (id, user_id, status, created_at, heartbeat_at) 
+        VALUES (:job_id, :user, 'pending', :created_at, :created_at);""")
+        await session.execute(query, {'job_id': job_id, 'user': user, 'created_at': created_at})
+        if repos:
+            query = text("""INSERT INTO ingest_job_repos (job_id, owner, repo_name, status) 
+            VALUES (:job_id, :owner, :repo_name, 'pending') ON CONFLICT DO NOTHING;""")
+            await session.execute(query, [{'job_id': job_id, 'owner': owner,
+                                           'repo_name': repo_name}
+                                          for owner, repo_name in repos])
+
+    @classmethod
+    async def update_repos(cls, session: AsyncSession, job_id, statuses):
+        """
+        Set status of repos of job by list of tuple(owner, repo_name, status, release).
+        """
+        if not statuses:
+            return
+        query = text("""UPDATE ingest_job_repos SET status=:status, release=:release 
+        WHERE job_id=:job_id AND owner=:owner AND repo_name=:repo_name;""")
+        await session.execute(query, [{'job_id': job_id, 'owner': owner, 'repo_name': repo_name,
+                                       'status': status, 'release': release}
+                                      for owner, repo_name, status, release in statuses])
+
+    @classmethod
+    async def set_status(cls, session: AsyncSession, job_id, status, finished_at=None):
+        """
+        Set status of job.
+        """
+        query = text("""UPDATE ingest_jobs SET status=:status, finished_at=:finished_at 
+        WHERE id=:job_id;""")
+        await session.execute(query, {'job_id': job_id, 'status': status,
+                                      'finished_at': finished_at})
+
+    @classmethod
+    async def beat(cls, session: AsyncSession, job_id, heartbeat_at):
+        """
+        Mark job as still run by its worker.
+        """
+        query = text("""UPDATE ingest_jobs SET heartbeat_at=:heartbeat_at 
+        WHERE id=:job_id AND status IN ('pending', 'running');""")
+        await session.execute(query, {'job_id': job_id, 'heartbeat_at': heartbeat_at})
+
+    @classmethod
+    async def claim_lost(cls, session: AsyncSession, alive_before, created_after, heartbeat_at,
+                         limit):
+        """
+        Take jobs which are pending or running without heartbeat since alive_before
+        and were created after created_after, such jobs were lost by restart of worker.
+        Heartbeat of taken jobs is set, so other worker doesn't take them.
+        Return list of tuple(job id, user id, list of tuple(owner, repo_name)).
+        """
+        query = text("""UPDATE ingest_jobs SET heartbeat_at=:heartbeat_at 
+        WHERE id IN (SELECT j.id FROM ingest_jobs AS j 
+        WHERE j.status IN ('pending', 'running') 
+        AND COALESCE(j.heartbeat_at, j.created_at) < :alive_before 
+        AND j.created_at > :created_after 
+        ORDER BY j.created_at LIMIT :limit FOR UPDATE SKIP LOCKED) RETURNING id, user_id;""")
+        jobs = (await session.execute(query, {'alive_before': alive_before,
+                                              'created_after': created_after,
+                                              'heartbeat_at': heartbeat_at,
+                                              'limit': limit})).all()
+        if not jobs:
+            return []
+        query = text("""SELECT r.job_id, r.owner, r.repo_name FROM ingest_job_repos AS r 
+        WHERE r.job_id = ANY(:ids);""")
+        repos = {}
+        for job_id, owner, repo_name in await session.execute(query, {'ids': [job_id for job_id, _
+                                                                              in jobs]}):
+            repos.setdefault(job_id, []).append((owner, repo_name))
+        return [(job_id, user, repos.get(job_id, [])) for job_id, user in jobs]
+
+    @classmethod
+    async def fail_stale(cls, session: AsyncSession, alive_before, finished_at):
+        """
+        Set status error to jobs which are pending or running without heartbeat
+        since alive_before, such jobs were lost by restart of worker and weren't resumed.
+        Return ids of failed jobs.
+        """
+        query = text("""UPDATE ingest_jobs SET status='error', finished_at=:finished_at 
+        WHERE status IN ('pending', 'running') 
+        AND COALESCE(heartbeat_at, created_at) < :alive_before RETURNING id;""")
+        failed = await session.execute(query, {'alive_before': alive_before,
+                                               'finished_at': finished_at})
+        return [job_id for job_id, in failed]
+
+    @classmethod
+    async def delete_finished(cls, session: AsyncSession, finished_before):
+        """
+        Delete jobs finished before finished_before with all their repos.
+        Return amount of deleted jobs.
+        """
+        query = text("""WITH jobs AS (DELETE FROM ingest_jobs 
+        WHERE finished_at < :finished_before RETURNING id), 
+        repos AS (DELETE FROM ingest_job_repos AS r USING jobs WHERE r.job_id=jobs.id) 
+        SELECT count(*) FROM jobs;""")
+        deleted = await session.execute(query, {'finished_before': finished_before})
+        return deleted.scalar()
+
+    @classmethod
+    async def get(cls, session: AsyncSession, job_id):
+        """
+        Select job and all its repos.
+        Return tuple(job, repos) or None if job not exist.
+        """
+        query = text("""SELECT j.id, j.user_id, j.status, j.created_at, j.finished_at 
+        FROM ingest_jobs AS j WHERE j.id=:job_id;""")
+        job = (await session.execute(query, {'job_id': job_id})).first()
+        if job is None:
+            return None
+        query = text("""SELECT r.owner, r.repo_name, r.status, r.release 
+        FROM ingest_job_repos AS r WHERE r.job_id=:job_id ORDER BY r.repo_name, r.owner;""")
+        repos = (await session.execute(query, {'job_id': job_id})).all()
+        return job, repos
+
+
+@timed
+class ReleasesQueryset:
+    """
+    Manage partitioned table Releases.
+    """
+    model = Releases
+
+    @classmethod
+    async def get_partitions(cls, session: AsyncSession):
+        """
+        Select names of existing partitions of table.
+        """
+        query = text("""SELECT c.relname FROM pg_inherits AS i 
+        JOIN pg_class AS c ON c.oid=i.inhrelid WHERE i.inhparent=CAST('releases' AS REGCLASS);""")
+        partitions = await session.execute(query)
+        return {name for name, in partitions}
+
+    @classmethod
+    async def create_partition(cls, session: AsyncSession, name, start, end):
+        """
+        Create partition for release dates from start to end.
+        Concurrent creators are serialized by advisory lock of transaction.
+        """
+        await session.execute(text("""SELECT pg_advisory_xact_lock(:key);"""),
+                              {'key': RELEASES_PARTITIONS_LOCK})
+        await session.execute(text(f"""CREATE TABLE IF NOT EXISTS {name} PARTITION OF releases 
+        FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}');"""))
+
+    @classmethod
+    async def drop_partition(cls, session: AsyncSession, name):
+        """
+        Drop partition with all its releases.
+        """
+        await session.execute(text("""SELECT pg_advisory_xact_lock(:key);"""),
+                              {'key': RELEASES_PARTITIONS_LOCK})
+        await session.execute(text(f"""DROP TABLE IF EXISTS {name};"""))
+
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, releases, created_at):
+        """
+        Append releases to history by one statement.
+        Release is known by (repo_id, tag): sources give different dates of one release,
+        so tag already kept with any date is skipped. Releases of repo are found
+        by index (repo_id, release_date) of every partition.
+        Return amount of new releases.
+        :param releases: list of tuple(repo_id, tag, release_date)
+        """
+        if not releases:
+            return 0
+        ids, tags, release_dates = map(list, zip(*releases))
+        query = text("""INSERT INTO releases (repo_id, tag, release_date, created_at) 
+        SELECT DISTINCT ON (v.repo_id, v.tag) v.repo_id, v.tag, v.release_date, :created_at 
+        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:tags AS TEXT[]), 
+        CAST(:release_dates AS TIMESTAMP[])) AS v(repo_id, tag, release_date) 
+        WHERE NOT EXISTS (SELECT 1 FROM releases AS h WHERE h.repo_id=v.repo_id AND h.tag=v.tag) 
+        ON CONFLICT DO NOTHING;""")
+        created = await session.execute(query, {'ids': ids, 'tags': tags,
+                                                'release_dates': release_dates,
+                                                'created_at': created_at})
+        return created.rowcount
+
+    @classmethod
+    async def get_range(cls, session: AsyncSession, since, until, limit, user=None, uri=None):
+        """
+        Select releases from since till until, newest first.
+        Releases can be filtered by subscriptions of user and by uri of repo.
+        Only partitions of range are scanned. Date of release is formatted by database.
+        """
+        query = """SELECT r.owner, r.repo_name, r.uri, h.tag, 
+        to_char(h.release_date, 'YYYY.MM.DD HH24:MI:SS') AS release_date 
+        FROM releases AS h JOIN repos AS r ON r.id=h.repo_id """
+        params = {'since': since, 'until': until, 'limit': limit}
+        if user is not None:
+            query += """JOIN subscriptions AS s ON s.repo_id=h.repo_id AND s.user_id=:user """
+            params['user'] = user
+        query += """WHERE h.release_date >= :since AND h.release_date < :until """
+        if uri is not None:
+            query += """AND r.uri=:uri """
+            params['uri'] = uri
+        query += """ORDER BY h.release_date DESC, h.repo_id LIMIT :limit;"""
+        releases = await session.execute(text(query), params)
+        return releases.all()
@@ -0,0 +1,123 @@
+"""
+Module of history of releases.
+Every release seen by poller or by addition of repos is appended to table Releases,
+which is partitioned by month of release date. Partitions are created ahead
+by daily maintenance in own short transactions, so writes of releases never run DDL
+and don't lock table Releases, and partitions older than retention are dropped
+as whole tables instead of DELETE of rows.
+"""
+import os
+import re
+import logging
+from datetime import datetime as dt
+from typing import List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from querysets import ReleasesQueryset
+
+PARTITION_NAME = 'releases_y{:04d}m{:02d}'
+PARTITION_PATTERN = re.compile(r'^releases_y(\d{4})m(\d{2})$')
+
+
+def month_start(date: dt, shift: int = 0) -> dt:
+    """
+    First moment of month of date shifted by amount of months.
+    """
+    months = date.year * 12 + date.month - 1 + shift
+    return dt(months // 12, months % 12 + 1, 1)
+
+
+class ReleaseHistory:
+    """
+    Append-only history of releases with monthly partitions and retention.
+    Names of existing partitions are cached and read again from catalog
+    only when release of unknown month comes. Releases of months without partition
+    are skipped till maintenance creates it.
+    """
+    def __init__(self, logger: logging.Logger, retention_months: int = None,
+                 months_ahead: int = None):
+        """
+        :param logger: logger
+        :param retention_months: months of history including current,
+                                 env RELEASES_RETENTION_MONTHS by default
+        :param months_ahead: months after current with created partitions,
+                             env RELEASES_MONTHS_AHEAD by default
+        """
+        self.logger = logger
+        self.retention_months = (retention_months or
+                                 int(os.environ.get('RELEASES_RETENTION_MONTHS', 24)))
+        self.months_ahead = months_ahead or int(os.environ.get('RELEASES_MONTHS_AHEAD', 2))
+        self.partitions = set()
+        self.maintained_on = None
+
+    def keep_since(self, now: dt) -> dt:
+        """
+        Oldest release date kept in history.
+        """
+        return month_start(now, 1 - self.retention_months)
+
+    @staticmethod
+    def partition_of(date: dt) -> str:
+        """
+        Name of partition of month of date.
+        """
+        return PARTITION_NAME.format(date.year, date.month)
+
+    async def record(self, session: AsyncSession, releases: List[Tuple], now: dt = None) -> int:
+        """
+        Append releases to history in transaction of session.
+        Releases older than retention or of months without partition are skipped,
+        known releases are skipped by database.
+        :param session: session of transaction which writes releases of repos
+        :param releases: list of tuple(repo_id, tag, release_date)
+        :param now: current time
+        :return: amount of new releases in history
+        """
+        now = now or dt.utcnow()
+        keep_since = self.keep_since(now)
+        releases = [release for release in releases if release[2] >= keep_since]
+        if any(self.partition_of(release[2]) not in self.partitions for release in releases):
+            self.partitions = await ReleasesQueryset.get_partitions(session)
+        missing = {self.partition_of(release[2]) for release in releases} - self.partitions
+        if missing:
+            self.logger.warning('Releases are skipped without partitions: %s.', sorted(missing))
+            releases = [release for release in releases
+                        if self.partition_of(release[2]) not in missing]
+        if not releases:
+            return 0
+        return await ReleasesQueryset.bulk_create(session, releases, now)
+
+    async def maintain(self, session_maker: sessionmaker, now: dt = None) -> None:
+        """
+        Create partitions from start of retention till months ahead
+        and drop partitions older than retention. Runs once a day.
+        Every partition is created or dropped in own short transaction,
+        so lock of table Releases by DDL isn't held by writes of releases.
+        :param session_maker: maker of database sessions
+        :param now: current time
+        :return: None
+        """
+        now = now or dt.utcnow()
+        if self.maintained_on == now.date():
+            return
+        keep_since = self.keep_since(now)
+        async with session_maker() as session:
+            self.partitions = await ReleasesQueryset.get_partitions(session)
+        for shift in range(self.retention_months + self.months_ahead):
+            month = month_start(keep_since, shift)
+            name = self.partition_of(month)
+            if name not in self.partitions:
+                async with session_maker.begin() as session:
+                    await ReleasesQueryset.create_partition(session, name, month,
+                                                            month_start(month, 1))
+                self.partitions.add(name)
+                self.logger.info('Partition %s of releases was created.', name)
+        for name in sorted(self.partitions):
+            match = PARTITION_PATTERN.match(name)
+            if match and dt(int(match[1]), int(match[2]), 1) < keep_since:
+                async with session_maker.begin() as session:
+                    await ReleasesQueryset.drop_partition(session, name)
+                self.partitions.discard(name)
+                self.logger.info('Partition %s of releases was dropped by retention.', name)
+        self.maintained_on = now.date()
@@ -0,0 +1,237 @@
+"""
+Module of async poller of releases.
+Check many repos concurrently on one pooled HTTP client and write changes to database.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime as dt, timedelta
+from typing import List, Tuple, Dict
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from pydantic import ValidationError
+
+from github_api import ReleaseInfo
+from github_budget import GitHubBudgeter
+from release_sources import ReleaseSource, create_sources, FALLBACK_SOURCE
+from release_history import ReleaseHistory
+from cache import SubscriptionCache
+from metrics import POLL_CHANGED, POLL_CHECKED, POLL_DURATION, observe
+from pubsub import notify
+from querysets import (ReposQueryset, ReposCacheQueryset,
+                       ReposScheduleQueryset, NotificationsQueryset)
+from schemas import ReposSchema
+
+RELEASES_CHANNEL = 'releases'
+RELEASES_CHUNK = 50
+
+
+class ReleasePoller:
+    """
+    Poll API GitHub for latest releases of due repos.
+    Requests run concurrently but not more than concurrency at once,
+    database is used only for take slice of due repos and write changes of it.
+    """
+    def __init__(self, session_maker: sessionmaker,
+                 client: httpx.AsyncClient,
+                 logger: logging.Logger,
+                 budgeter: GitHubBudgeter = None,
+                 concurrency: int = None,
+                 slice_size: int = None,
+                 source: str = None,
+                 cache: SubscriptionCache = None):
+        """
+        :param session_maker: maker of database sessions
+        :param client: pooled async HTTP client of API GitHub
+        :param logger: logger
+        :param budgeter: budgeter of tokens API GitHub
+        :param concurrency: max requests at once, env GITHUB_POLL_CONCURRENCY by default
+        :param slice_size: amount of due repos taken at once, env POLL_SLICE_SIZE by default
+        :param source: 'rest', 'graphql' or 'atom' for repos without own source,
+                       env GITHUB_RELEASE_SOURCE by default
+        :param cache: cache of subscriptions invalidated by changed repos
+        """
+        self.session_maker = session_maker
+        self.client = client
+        self.logger = logger
+        self.budgeter = budgeter
+        if concurrency is None:
+            concurrency = int(os.environ.get('GITHUB_POLL_CONCURRENCY', 50))
+        self.concurrency = concurrency
+        self.slice_size = slice_size or int(os.environ.get('POLL_SLICE_SIZE', 500))
+        self.interval_min = int(os.environ.get('POLL_INTERVAL_MIN', 60 * 60))
+        self.interval_max = int(os.environ.get('POLL_INTERVAL_MAX', 7 * 24 * 60 * 60))
+        self.interval_divisor = int(os.environ.get('POLL_INTERVAL_DIVISOR', 24))
+        self.lease = int(os.environ.get('POLL_LEASE', 15 * 60))
+        self.source = source or os.environ.get('GITHUB_RELEASE_SOURCE', FALLBACK_SOURCE)
+        self.sources = create_sources(client, logger, budgeter)
+        self.cache = cache
+        self.history = ReleaseHistory(logger)
+
+    def source_of(self, repo: Tuple) -> ReleaseSource:
+        """
+        Source of releases chosen for repo or global source.
+        """
+        name = getattr(repo, 'release_source', None) or self.source
+        return self.sources.get(name) or self.sources[FALLBACK_SOURCE]
+
+    async def fetch_many(self, repos: List[Tuple],
+                         cache: Dict[str, Tuple[str, str]] = None
+                         ) -> List[Tuple[Tuple, ReleaseInfo, str]]:
+        """
+        Get latest releases of repos concurrently by their sources.
+        Repos failed by their source are checked again by REST API
+        with validators of REST responses, which are read from database if they aren't in cache.
+        :param repos: rows of table Repos
+        :param cache: validators of previous responses as cache_key: (etag, last_modified)
+        :return: list of tuple(repo, release_info, cache_key of validators of release_info)
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cache = cache or {}
+        groups = {}
+        for repo in repos:
+            groups.setdefault(self.source_of(repo), []).append(repo)
+
+        sources = list(groups)
+        results = await asyncio.gather(*(source.fetch_many(groups[source], semaphore, cache)
+                                         for source in sources))
+        checked, failed = [], []
+        for source, checked_by_source in zip(sources, results):
+            for repo, info in checked_by_source:
+                if info is None:
+                    failed.append(repo)
+                else:
+                    checked.append((repo, info, source.cache_key(repo)))
+
+        if failed:
+            self.logger.info('Releases of %s repos are checked again by %s.',
+                             len(failed), FALLBACK_SOURCE)
+            fallback = self.sources[FALLBACK_SOURCE]
+            keys = [fallback.cache_key(repo) for repo in failed]
+            missing = [key for key in keys if key not in cache]
+            if missing:
+                async with self.session_maker() as session:
+                    cache = {**cache,
+                             **await ReposCacheQueryset.get_by_api_uris(session, missing)}
+            for repo, info in await fallback.fetch_many(failed, semaphore, cache):
+                checked.append((repo, info or ReleaseInfo(), fallback.cache_key(repo)))
+        return checked
+
+    async def publish_releases(self, session: AsyncSession, changes: List[Tuple]) -> None:
+        """
+        Send events of new releases to channel RELEASES_CHANNEL on commit of transaction,
+        so bot can alert users at once.
+        :param session: session of transaction which creates notifications
+        :param changes: list of tuple(repo_id, release, ...)
+        :return: None
+        """
+        for idx in range(0, len(changes), RELEASES_CHUNK):
+            await notify(session, RELEASES_CHANNEL,
+                         {'releases': [[change[0], change[1]]
+                                       for change in changes[idx:idx + RELEASES_CHUNK]]})
+
+    def next_check_at(self, now: dt, release_date: dt, cadence: int = None) -> dt:
+        """
+        Time of next check of repo by its release cadence.
+        Repo with fresh or frequent releases is checked often, dormant repo - rarely.
+        Known cadence is mixed with time since latest release by geometric mean.
+        :param now: current time
+        :param release_date: date of latest release
+        :param cadence: average seconds between releases if it's known
+        :return: datetime of next check
+        """
+        quiet = max((now - release_date).total_seconds(), 0)
+        if cadence:
+            quiet = (quiet * cadence) ** 0.5
+        interval = min(max(quiet / self.interval_divisor, self.interval_min), self.interval_max)
+        return now + timedelta(seconds=interval)
+
+    async def check_releases(self) -> None:
+        """
+        Take due repos from schedule by slices and run getting info of release.
+        If repository has new release - do update in table Repos, append it to history
+        and create new notification for users who have subscriptions.
+        Every checked repo gets next time of check by its release cadence.
+        :return: None
+        """
+        started = time.perf_counter()
+        await self.history.maintain(self.session_maker)
+        self.sources['graphql'].cost = 0
+        checked_amount = 0
+        while True:
+            now = dt.utcnow()
+            async with self.session_maker.begin() as session:
+                ids = await ReposScheduleQueryset.claim_due(session, now, self.slice_size,
+                                                            now + timedelta(seconds=self.lease))
+                repos = await ReposQueryset.select_by_ids(session, ids)
+            if repos:
+                await self.check_slice(repos)
+                checked_amount += len(repos)
+                POLL_CHECKED.inc(len(repos))
+            if len(ids) < self.slice_size:
+                break
+
+        if checked_amount:
+            self.logger.info('Checked releases of %s repos by %s.', checked_amount, self.source)
+        if self.sources['graphql'].cost:
+            self.logger.info('Total cost of GraphQL queries: %s.', self.sources['graphql'].cost)
+        observe(POLL_DURATION, started)
+
+    async def check_slice(self, repos: List[Tuple]) -> None:
+        """
+        Check releases of slice of repos and write changes in one transaction.
+        :param repos: rows of table Repos
+        :return: None
+        """
+        keys = [self.source_of(repo).cache_key(repo) for repo in repos]
+        async with self.session_maker() as session:
+            cache = await ReposCacheQueryset.get_by_api_uris(session,
+                                                             [key for key in keys if key])
+        checked = await self.fetch_many(repos, cache)
+        now = dt.utcnow()
+        async with self.session_maker.begin() as session:
+            cadences = await ReposScheduleQueryset.get_cadences(session,
+                                                                [repo.id for repo in repos])
+            await ReposCacheQueryset.update(session,
+                                            [(key, info.etag, info.last_modified)
+                                             for _, info, key in checked
+                                             if key and not info.not_modified])
+            schedule, changes, changed_uris = [], [], []
+            for repo, info, _ in checked:
+                id_repo, uri, api_uri, owner, repo_name, release, release_date, _ = repo
+                cadence = cadences.get(id_repo)
+                # Тот же тег не новый релиз: дата в Atom меняется при правке релиза,
+                # а источники дают разное время одного релиза
+                if info.release and info.release_date and info.release != release:
+                    keys_repo = ['uri', 'api_uri', 'owner',
+                                 'repo_name', 'release', 'release_date']
+                    values_repo = [uri, api_uri, owner, repo_name,
+                                   info.release, info.release_date]
+                    try:
+                        repo_as_dict = ReposSchema.model_validate(dict(zip(keys_repo,
+                                                                           values_repo))
+                                                                  ).model_dump()
+                    except ValidationError as e:
+                        self.logger.error('Wrong release of %s(by %s): %s', repo_name, owner, e)
+                        repo_as_dict = None
+
+                    if repo_as_dict and release_date < repo_as_dict['release_date']:
+                        gap = (repo_as_dict['release_date'] - release_date).total_seconds()
+                        cadence = int(gap if cadence is None else (cadence + gap) / 2)
+                        release_date = repo_as_dict['release_date']
+                        changes.append((id_repo, repo_as_dict['release'], release_date))
+                        changed_uris.append(uri)
+                        self.logger.info(f'Repo {repo_name}(by {owner}) was update success.')
+                schedule.append((id_repo, self.next_check_at(now, release_date, cadence), cadence))
+            await ReposQueryset.bulk_update(session, changes)
+            await self.history.record(session, changes, now)
+            await NotificationsQueryset.bulk_create(session, [change[0] for change in changes])
+            await self.publish_releases(session, changes)
+            await ReposScheduleQueryset.update(session, schedule)
+            if self.cache and changed_uris:
+                await self.cache.publish(session, uris=changed_uris)
+        POLL_CHANGED.inc(len(changes))
+        if self.cache and changed_uris:
+            self.cache.invalidate(uris=changed_uris)
@@ -0,0 +1,148 @@
+"""
+Module of sources of latest releases of repos.
+Every source gets releases of many repos concurrently, poller chooses source
+by repo or globally and repeats failed repos by REST API.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+import httpx
+
+from github_api import ReleaseInfo, request_to_api_github
+from github_atom import atom_uri, request_to_atom_feed
+from github_budget import GitHubBudgeter
+from github_graphql import request_to_graphql_github, graphql_batch_size
+
+FALLBACK_SOURCE = 'rest'
+
+
+class ReleaseSource:
+    """
+    Base source of releases.
+    fetch_many() returns ReleaseInfo for every repo or None if source failed for it,
+    such repos are checked again by fallback source.
+    """
+    name = None
+
+    def __init__(self, client: httpx.AsyncClient,
+                 logger: logging.Logger,
+                 budgeter: GitHubBudgeter = None):
+        """
+        :param client: pooled async HTTP client
+        :param logger: logger
+        :param budgeter: budgeter of tokens API GitHub
+        """
+        self.client = client
+        self.logger = logger
+        self.budgeter = budgeter
+
+    def cache_key(self, repo: Tuple) -> str | None:
+        """
+        Key of validators of conditional request of repo in table ReposCache.
+        None if source doesn't make conditional requests.
+        """
+        return None
+
+    async def fetch_many(self, repos: List[Tuple],
+                         semaphore: asyncio.Semaphore,
+                         cache: Dict[str, Tuple[str, str]]
+                         ) -> List[Tuple[Tuple, ReleaseInfo | None]]:
+        """
+        Get latest releases of repos.
+        :param repos: rows of table Repos
+        :param semaphore: limit of requests at once
+        :param cache: validators of previous responses as cache_key: (etag, last_modified)
+        :return: list of tuple(repo, release_info)
+        """
+        raise NotImplementedError
+
+
+class RestSource(ReleaseSource):
+    """
+    Latest release by REST API GitHub, one request by repo with token.
+    """
+    name = 'rest'
+
+    def cache_key(self, repo: Tuple) -> str:
+        return repo.api_uri
+
+    async def fetch_many(self, repos, semaphore, cache):
+        async def fetch(repo):
+            etag, last_modified = cache.get(repo.api_uri, (None, None))
+            async with semaphore:
+                info = await request_to_api_github(self.client,
+                                                   repo.api_uri,
+                                                   logger=self.logger,
+                                                   etag=etag,
+                                                   last_modified=last_modified,
+                                                   budgeter=self.budgeter)
+            return repo, info
+
+        return await asyncio.gather(*(fetch(repo) for repo in repos))
+
+
+class GraphQLSource(ReleaseSource):
+    """
+    Latest releases by batched queries to API GitHub GraphQL.
+    Cost of queries is summed in cost.
+    """
+    name = 'graphql'
+
+    def __init__(self, client, logger, budgeter=None):
+        super().__init__(client, logger, budgeter)
+        self.cost = 0
+
+    async def fetch_many(self, repos, semaphore, cache):
+        batch_size = graphql_batch_size()
+
+        async def fetch(batch):
+            async with semaphore:
+                infos, rate_limit = await request_to_graphql_github(
+                    self.client,
+                    [(repo.owner, repo.repo_name) for repo in batch],
+                    logger=self.logger,
+                    budgeter=self.budgeter)
+            self.cost += rate_limit.get('cost') or 0
+            return list(zip(batch, infos))
+
+        batches = await asyncio.gather(*(fetch(repos[start:start + batch_size])
+                                         for start in range(0, len(repos), batch_size)))
+        return [checked for batch in batches for checked in batch]
+
+
+class AtomSource(ReleaseSource):
+    """
+    Latest release from Atom feed of releases, without token and rate limit of API.
+    """
+    name = 'atom'
+
+    def __init__(self, client, logger, budgeter=None, base_uri: str = None):
+        """
+        :param base_uri: base URI of feeds, env GITHUB_ATOM_URI by default
+        """
+        super().__init__(client, logger, budgeter)
+        self.base_uri = base_uri
+
+    def cache_key(self, repo: Tuple) -> str:
+        return atom_uri(repo.owner, repo.repo_name, self.base_uri)
+
+    async def fetch_many(self, repos, semaphore, cache):
+        async def fetch(repo):
+            feed_uri = self.cache_key(repo)
+            etag, last_modified = cache.get(feed_uri, (None, None))
+            async with semaphore:
+                info = await request_to_atom_feed(self.client, feed_uri, self.logger,
+                                                  etag=etag, last_modified=last_modified)
+            return repo, info
+
+        return await asyncio.gather(*(fetch(repo) for repo in repos))
+
+
+def create_sources(client: httpx.AsyncClient,
+                   logger: logging.Logger,
+                   budgeter: GitHubBudgeter = None) -> Dict[str, ReleaseSource]:
+    """
+    Create all sources of releases by name.
+    """
+    return {source.name: source(client, logger, budgeter)
+            for source in (RestSource, GraphQLSource, AtomSource)}
@@ -0,0 +1,39 @@
+"""
+Module of fast JSON responses of lists of repos.
+Rows of queries are encoded to bytes at once by orjson without models of pydantic
+and second validation by response_model, dates are already formatted by database.
+"""
+import json
+from typing import Any, Iterable, List, Sequence
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SUBSCRIPTION_KEYS = ('user_id', 'owner', 'repo_name', 'repo_uri', 'release', 'release_date')
+RELEASE_KEYS = SUBSCRIPTION_KEYS[1:]
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode value to JSON bytes by orjson or by json if orjson isn't installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def rows_to_dicts(rows: Iterable[Sequence], keys: Sequence[str] = SUBSCRIPTION_KEYS) -> List[dict]:
+    """
+    Convert rows of query to dicts by keys.
+    """
+    return [dict(zip(keys, row)) for row in rows]
+
+
+class JSONBytesResponse(Response):
+    """
+    Response of JSON already encoded to bytes.
+    """
+    media_type = 'application/json'
@@ -2,7 +2,8 @@
 Module with all schemas data in application FastAPI
 """
 from datetime import datetime
-from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class UsersSchema(BaseModel):
@@ -61,8 +62,84 @@ class SubscriptionsByUserSchema(BaseModel):
     @classmethod
     def validate_release_date(cls, value):
         """
-        Validation and transform Field release_date from datetime format to string
+        Validation and transform Field release_date from datetime format to string,
+        string formatted by database is kept as is
         :param value: release_date
         :return:
         """
+        if isinstance(value, str):
+            return value
         return datetime.strftime(value, '%Y.%m.%d %H:%M:%S', )
+
+
+class ReleaseHistorySchema(BaseModel):
+    """
+    Schema of release from history of releases.
+    """
+    owner: str = Field(..., description='repo owner')
+    repo_name: str = Field(..., description='repo name')
+    repo_uri: str = Field(..., description='repo URI')
+    release: str = Field(..., description='release number')
+    release_date: str = Field(..., description='release datetime')
+
+
+class SubscriptionsPageSchema(BaseModel):
+    """
+    Schema of page of subscriptions of user.
+    Cursors are id of repos for next request of page by after or before.
+    """
+    repos: List[SubscriptionsByUserSchema]
+    next: int | None = Field(None, description='cursor of next page, null if page is last')
+    prev: int | None = Field(None, description='cursor of previous page, null if page is first')
+
+
+class IngestJobRepoSchema(BaseModel):
+    """
+    Schema of progress of one repo in job of addition subscriptions.
+    """
+    owner: str = Field(..., description='repo owner')
+    repo_name: str = Field(..., description='repo name')
+    status: str = Field(..., description='pending, resolved, not_found or subscribed')
+    release: str | None = Field(None, description='release number')
+
+
+class IngestJobSchema(BaseModel):
+    """
+    Schema of job of addition subscriptions.
+    """
+    job_id: str = Field(..., description='job id')
+    user_id: int = Field(..., description='user id')
+    status: str = Field(..., description='pending, running, done or error')
+    total: int = Field(..., description='amount of repos')
+    done: int = Field(..., description='amount of processed repos')
+    repos: List[IngestJobRepoSchema] = Field(..., description='progress by repos')
+
+
+class ReleasesClaimSchema(BaseModel):
+    """
+    Schema of bulk request of new releases.
+    Need list of users or time of notifications.
+    """
+    users: List[int] | None = Field(None, description='list of user id')
+    hour: int | None = Field(None, ge=0, le=23, description='hour of notifications')
+    minute: int | None = Field(None, ge=0, le=59, description='minute of notifications')
+
+    @model_validator(mode='after')
+    def validate_target(self):
+        """
+        Validation that request has list of users or full time of notifications.
+        :return: schema
+        """
+        if self.users is None and (self.hour is None or self.minute is None):
+            raise ValueError('users or hour and minute are required')
+        return self
+
+
+class ReleaseSourceSchema(BaseModel):
+    """
+    Schema of choice of source of releases for repos.
+    Source None returns repos to global source of poller.
+    """
+    repos: List[str] = Field(..., min_length=1, description='list of uri of repos')
+    source: Literal['rest', 'graphql', 'atom'] | None = Field(None,
+                                                              description='source of releases')
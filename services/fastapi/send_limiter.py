@@ -0,0 +1,281 @@
+"""
+Module of outbound rate limiter of Telegram Bot.
+Keep global limit of Telegram by token bucket, limit messages of every chat by own bucket
+with short burst, wait retry_after of answers 429 and let interactive replies jump ahead
+of bulk digests, also of the same chat. Depth of queues and pause are exported as gauges of Prometheus.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import contextlib
+import functools
+import itertools
+from collections import deque
+from typing import Any, Callable, Coroutine, Dict, List, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import TELEGRAM_LATENCY, TELEGRAM_PAUSED, TELEGRAM_QUEUED, TELEGRAM_RETRIES
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+LATENCY_SAMPLES = 1000
+
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """
+    Rate limiter of requests to Bot API.
+    Request with chat_id waits in queue of its chat by priority(rate_limit_args):
+    INTERACTIVE before BULK. Granter gives tokens of global bucket to heads of queues
+    of chats whose bucket allows message now, so reply to chat goes before bulk digests
+    of the same chat and chat waiting own bucket doesn't hold other chats.
+    Bucket of chat allows chat_burst messages at once and one message per chat_interval
+    after them, so reply of few messages isn't slowed down.
+    Answer 429 pauses all requests for retry_after seconds and request is repeated.
+    """
+    def __init__(self, overall_rate: float = None,
+                 chat_interval: float = None,
+                 chat_burst: int = None,
+                 max_retries: int = 3):
+        """
+        :param overall_rate: messages per second of bot, env TELEGRAM_RATE by default
+        :param chat_interval: seconds between messages of one chat after burst,
+                              env TELEGRAM_CHAT_INTERVAL by default
+        :param chat_burst: messages of one chat sent at once, env TELEGRAM_CHAT_BURST by default
+        :param max_retries: max repeats of request after answer 429
+        """
+        if overall_rate is None:
+            overall_rate = float(os.environ.get('TELEGRAM_RATE', 30))
+        if chat_interval is None:
+            chat_interval = float(os.environ.get('TELEGRAM_CHAT_INTERVAL', 1))
+        if chat_burst is None:
+            chat_burst = int(os.environ.get('TELEGRAM_CHAT_BURST', 3))
+        self.rate = overall_rate
+        self.chat_interval = chat_interval
+        self.chat_burst = max(chat_burst, 1)
+        self.max_retries = max_retries
+
+        self.tokens = overall_rate
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.chat_next: Dict[int | str, float] = {}
+        self.chats: Dict[int | str, List] = {}
+        self.ready: List = []
+        self.delayed: List = []
+        self.delayed_chats = set()
+        self.order = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.granter = None
+
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.sent = {priority: 0 for priority in PRIORITIES}
+        self.retried = 0
+        self.latencies = {priority: deque(maxlen=LATENCY_SAMPLES) for priority in PRIORITIES}
+        for priority, name in PRIORITIES.items():
+            TELEGRAM_QUEUED.labels(name).set_function(functools.partial(self.queued, priority))
+        TELEGRAM_PAUSED.set_function(self.paused_for)
+
+    def queued(self, priority: int) -> int:
+        """
+        Amount of messages of priority waiting their turn.
+        """
+        return self.waiting[priority]
+
+    def paused_for(self) -> float:
+        """
+        Seconds left of pause after answer 429.
+        """
+        return max(0.0, self.paused_until - time.monotonic())
+
+    async def initialize(self) -> None:
+        """
+        Start granter of tokens.
+        """
+        self.wakeup = asyncio.Event()
+        self.granter = asyncio.create_task(self.grant())
+
+    async def shutdown(self) -> None:
+        """
+        Stop granter of tokens.
+        """
+        if self.granter:
+            self.granter.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.granter
+            self.granter = None
+
+    def refill(self, now: float) -> None:
+        """
+        Add tokens to bucket by time passed from last refill.
+        """
+        self.tokens = min(self.rate, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def chat_send_at(self, chat_id: int | str, now: float) -> float:
+        """
+        Time when bucket of chat allows next message.
+        Bucket is kept as theoretical time of arrival of next message (GCRA):
+        message is sent at once while it's not later than burst of intervals from now.
+        """
+        arrival = max(now, self.chat_next.get(chat_id, 0.0))
+        return max(now, arrival - (self.chat_burst - 1) * self.chat_interval)
+
+    def schedule_chat(self, chat_id: int | str, now: float) -> None:
+        """
+        Put head of queue of chat to ready heap or chat to delayed heap till its bucket allows.
+        """
+        send_at = self.chat_send_at(chat_id, now)
+        if send_at > now:
+            heapq.heappush(self.delayed, (send_at, chat_id))
+            self.delayed_chats.add(chat_id)
+        else:
+            priority, order, _ = self.chats[chat_id][0]
+            heapq.heappush(self.ready, (priority, order, chat_id))
+
+    def next_ready(self, now: float):
+        """
+        Head of queue of chat which goes next, None if no chat can send now.
+        Outdated entries of ready heap and cancelled requests are dropped.
+        """
+        while self.delayed and self.delayed[0][0] <= now:
+            _, chat_id = heapq.heappop(self.delayed)
+            self.delayed_chats.discard(chat_id)
+            heapq.heappush(self.ready, (*self.chats[chat_id][0][:2], chat_id))
+        while self.ready:
+            priority, order, chat_id = self.ready[0]
+            queue = self.chats.get(chat_id)
+            if queue is None or chat_id in self.delayed_chats or queue[0][:2] != (priority, order):
+                heapq.heappop(self.ready)
+            elif queue[0][2].done():
+                heapq.heappop(self.ready)
+                heapq.heappop(queue)
+                if queue:
+                    heapq.heappush(self.ready, (*queue[0][:2], chat_id))
+                else:
+                    del self.chats[chat_id]
+            else:
+                return chat_id
+        return None
+
+    async def grant(self) -> None:
+        """
+        Give tokens of global bucket to heads of queues of ready chats by priority.
+        Bucket of chat is charged when its request is granted.
+        """
+        while True:
+            self.wakeup.clear()
+            now = time.monotonic()
+            chat_id = self.next_ready(now)
+            if chat_id is None:
+                timeout = self.delayed[0][0] - now if self.delayed else None
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                continue
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            self.tokens -= 1
+            heapq.heappop(self.ready)
+            queue = self.chats[chat_id]
+            _, _, future = heapq.heappop(queue)
+            self.chat_next[chat_id] = max(now, self.chat_next.get(chat_id, 0.0)) + self.chat_interval
+            future.set_result(None)
+            if queue:
+                self.schedule_chat(chat_id, now)
+            else:
+                del self.chats[chat_id]
+            if len(self.chat_next) > 10000:
+                self.chat_next = {chat: at for chat, at in self.chat_next.items()
+                                  if at > now or chat in self.chats}
+
+    async def wait_turn(self, chat_id: int | str, priority: int) -> None:
+        """
+        Wait token of bucket of chat and of global bucket in queue of chat by priority.
+        Token granted to cancelled caller is returned to both buckets.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.chats.get(chat_id)
+        entry = (priority, next(self.order), future)
+        if queue is None:
+            self.chats[chat_id] = [entry]
+            self.schedule_chat(chat_id, time.monotonic())
+        else:
+            heapq.heappush(queue, entry)
+            if chat_id not in self.delayed_chats:
+                heapq.heappush(self.ready, (*entry[:2], chat_id))
+        self.wakeup.set()
+        self.waiting[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.tokens = min(self.rate, self.tokens + 1)
+                self.chat_next[chat_id] = self.chat_next.get(chat_id, 0.0) - self.chat_interval
+                self.wakeup.set()
+            raise
+        finally:
+            self.waiting[priority] -= 1
+
+    async def process_request(self,
+                              callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict, None]]],
+                              args: Any,
+                              kwargs: Dict[str, Any],
+                              endpoint: str,
+                              data: Dict[str, Any],
+                              rate_limit_args: int | None) -> Union[bool, Dict, None]:
+        """
+        Send request to Bot API when limits allow it.
+        Requests without chat (getUpdates, setMyCommands, ...) only wait pause after 429.
+        """
+        priority = INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get('chat_id')
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            if chat_id is None:
+                if self.paused_until > time.monotonic():
+                    await asyncio.sleep(self.paused_until - time.monotonic())
+                return await callback(*args, **kwargs)
+
+            await self.wait_turn(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                TELEGRAM_RETRIES.inc()
+                self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+                logging.error('Flood control of Telegram on %s, pause %s sec.',
+                              endpoint, e.retry_after)
+                continue
+            self.sent[priority] += 1
+            self.latencies[priority].append(time.monotonic() - started)
+            TELEGRAM_LATENCY.labels(PRIORITIES[priority]).observe(time.monotonic() - started)
+            return result
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Depth of queues, amount of sent messages and latency of send by priorities.
+        """
+        stats = {'retried': self.retried,
+                 'paused_for': round(self.paused_for(), 1)}
+        for priority, name in PRIORITIES.items():
+            latencies = sorted(self.latencies[priority])
+            stats[name] = {
+                'queued': self.queued(priority),
+                'sent': self.sent[priority],
+                'latency_p50': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                'latency_p95': (round(latencies[int(len(latencies) * 0.95)], 3)
+                                if latencies else None),
+                'latency_max': round(latencies[-1], 3) if latencies else None,
+            }
+        return stats
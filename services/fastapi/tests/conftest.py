@@ -0,0 +1,12 @@
+"""
+Unit tests of services. Modules of service are flat, so its directory is put to path,
+and database settings are set to dummy values: tests don't connect to database.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name, value in (('DATABASE_HOST', 'localhost'), ('DATABASE_PORT', '5432'),
+                    ('DATABASE_USER', 'test'), ('DATABASE_PASSWORD', 'test'),
+                    ('DATABASE_NAME', 'test')):
+    os.environ.setdefault(name, value)
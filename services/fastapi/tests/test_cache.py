@@ -0,0 +1,169 @@
+"""
+Tests of generation and invalidation of cache.SubscriptionCache
+and of ping of pubsub.Listener. Connection to database is faked.
+"""
+import asyncio
+import logging
+
+import pytest
+
+import cache
+import pubsub
+from cache import SubscriptionCache
+from pubsub import Listener
+
+LOGGER = logging.getLogger('test')
+
+
+class Connection:
+    """
+    Fake connection of asyncpg, ping hangs when it's half-open.
+    """
+    def __init__(self, half_open=False):
+        self.half_open = half_open
+        self.closed = False
+        self.pings = 0
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+    def add_termination_listener(self, callback):
+        pass
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    async def fetchval(self, query):
+        self.pings += 1
+        if self.half_open:
+            await asyncio.Event().wait()
+        return 1
+
+
+@pytest.fixture
+def subscriptions():
+    fake = SubscriptionCache(None, LOGGER, maxsize=3, ttl=60)
+    fake.listener.connection = Connection()
+    return fake
+
+
+def test_set_get(subscriptions):
+    subscriptions.set(1, 'list', ['a/b'], subscriptions.generation)
+    assert subscriptions.get(1) == 'list'
+    assert subscriptions.get(2) is None
+    assert (subscriptions.hits, subscriptions.misses) == (1, 1)
+
+
+def test_set_of_old_generation_is_ignored(subscriptions):
+    generation = subscriptions.generation
+    subscriptions.invalidate(users=[2])
+    subscriptions.set(1, 'stale', ['a/b'], generation)
+    assert subscriptions.get(1) is None
+
+
+def test_set_after_clear_is_ignored(subscriptions):
+    generation = subscriptions.generation
+    subscriptions.clear()
+    subscriptions.set(1, 'stale', ['a/b'], generation)
+    assert subscriptions.get(1) is None
+
+
+def test_set_is_ignored_while_not_listening(subscriptions):
+    subscriptions.listener.connection.terminate()
+    subscriptions.set(1, 'list', ['a/b'], subscriptions.generation)
+    assert subscriptions.get(1) is None
+
+
+def test_invalidate_by_users(subscriptions):
+    subscriptions.set(1, 'one', ['a/b'], subscriptions.generation)
+    subscriptions.set(2, 'two', ['a/b'], subscriptions.generation)
+    subscriptions.invalidate(users=[1])
+    assert subscriptions.get(1) is None
+    assert subscriptions.get(2) == 'two'
+    assert subscriptions.by_repo == {'a/b': {2}}
+
+
+def test_invalidate_by_uris(subscriptions):
+    subscriptions.set(1, 'one', ['a/b', 'c/d'], subscriptions.generation)
+    subscriptions.set(2, 'two', ['c/d'], subscriptions.generation)
+    subscriptions.set(3, 'three', ['e/f'], subscriptions.generation)
+    subscriptions.receive({'uris': ['c/d']})
+    assert subscriptions.get(1) is None
+    assert subscriptions.get(2) is None
+    assert subscriptions.get(3) == 'three'
+    assert subscriptions.by_repo == {'e/f': {3}}
+    assert subscriptions.invalidations == 1
+
+
+def test_lru_eviction(subscriptions):
+    for user in (1, 2, 3):
+        subscriptions.set(user, user, [f'r/{user}'], subscriptions.generation)
+    subscriptions.get(1)
+    subscriptions.set(4, 4, ['r/4'], subscriptions.generation)
+    assert list(subscriptions.items) == [3, 1, 4]
+    assert 'r/2' not in subscriptions.by_repo
+
+
+def test_ttl_expiry(subscriptions, monkeypatch):
+    subscriptions.set(1, 'list', ['a/b'], subscriptions.generation)
+    now = cache.time.monotonic()
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now + 61)
+    assert subscriptions.get(1) is None
+    assert subscriptions.by_repo == {}
+
+
+def test_clear_on_disconnect(subscriptions):
+    subscriptions.set(1, 'list', ['a/b'], subscriptions.generation)
+    generation = subscriptions.generation
+    subscriptions.listener.on_disconnect()
+    assert subscriptions.items == {}
+    assert subscriptions.generation == generation + 1
+
+
+def test_listener_watch_pings(monkeypatch):
+    monkeypatch.setattr(pubsub, 'PING_INTERVAL', 0.01)
+    listener = Listener(None, 'channel', lambda _: None, LOGGER)
+    listener.connection = Connection()
+    closed = asyncio.Event()
+
+    async def run():
+        task = asyncio.create_task(listener.watch(closed))
+        await asyncio.sleep(0.05)
+        closed.set()
+        await task
+
+    asyncio.run(run())
+    assert listener.connection.pings >= 2
+
+
+def test_listener_reconnects_after_half_open_connection(monkeypatch):
+    monkeypatch.setattr(pubsub, 'PING_INTERVAL', 0.01)
+    monkeypatch.setattr(pubsub, 'PING_TIMEOUT', 0.01)
+    monkeypatch.setattr(pubsub, 'RECONNECT_DELAY', 0)
+    connections = [Connection(half_open=True), Connection()]
+    events = []
+
+    async def connect(**_):
+        return connections[len(events) // 2]
+
+    monkeypatch.setattr(pubsub.asyncpg, 'connect', connect)
+    engine = type('Engine', (), {'url': type('URL', (), dict.fromkeys(
+        ('host', 'port', 'username', 'password', 'database')))})
+    listener = Listener(engine, 'channel', lambda _: None, LOGGER,
+                        on_connect=lambda: events.append('connect'),
+                        on_disconnect=lambda: events.append('disconnect'))
+
+    async def run():
+        task = asyncio.create_task(listener.run())
+        await asyncio.sleep(0.1)
+        listening = listener.listening
+        task.cancel()
+        return listening
+
+    assert asyncio.run(run())
+    assert events == ['connect', 'disconnect', 'connect']
+    assert connections[0].closed
+    assert listener.connection is connections[1]
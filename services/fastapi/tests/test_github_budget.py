@@ -0,0 +1,128 @@
+"""
+Tests of pacing and rotation of tokens by github_budget.GitHubBudgeter.
+Time is faked: sleep moves clock instead of waiting.
+"""
+import asyncio
+import logging
+
+import httpx
+import pytest
+
+import github_budget
+from github_budget import GitHubBudgeter
+
+NOW = 1_700_000_000.0
+
+
+class Clock:
+    """
+    Fake time.time and asyncio.sleep, waits are recorded.
+    """
+    def __init__(self):
+        self.now = NOW
+        self.waits = []
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.waits.append(delay)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(github_budget.time, 'time', fake.time)
+    monkeypatch.setattr(github_budget.asyncio, 'sleep', fake.sleep)
+    return fake
+
+
+def response(status=200, remaining=None, reset=None, limit=5000, **headers):
+    if remaining is not None:
+        headers.update({'X-RateLimit-Remaining': str(remaining),
+                        'X-RateLimit-Limit': str(limit),
+                        'X-RateLimit-Reset': str(reset)})
+    return httpx.Response(status, headers=headers)
+
+
+def acquire_many(budgeter, amount, resource='core'):
+    async def run():
+        return await asyncio.gather(*(budgeter.acquire(resource) for _ in range(amount)))
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_are_not_paced_with_full_quota(clock):
+    budgeter = GitHubBudgeter(['a'], logging.getLogger(), burst=10)
+    budgeter.update('a', response(remaining=5000, reset=NOW + 3600))
+
+    assert acquire_many(budgeter, 6) == ['a'] * 6
+    assert clock.waits == []
+
+
+def test_requests_over_burst_are_paced_by_quota_till_reset(clock):
+    budgeter = GitHubBudgeter(['a'], logging.getLogger(), burst=2)
+    budgeter.update('a', response(remaining=100, reset=NOW + 100))
+
+    acquire_many(budgeter, 4)
+
+    # 2 requests of burst go at once, next ones get about 1 request per second
+    assert len(clock.waits) == 2
+    assert clock.waits[0] == pytest.approx(1.0, rel=0.05)
+    assert clock.waits[1] == pytest.approx(2.0, rel=0.05)
+
+
+def test_not_modified_answers_are_refunded(clock):
+    budgeter = GitHubBudgeter(['a'], logging.getLogger(), burst=2)
+    budgeter.update('a', response(remaining=100, reset=NOW + 100))
+
+    for _ in range(10):
+        token = acquire_many(budgeter, 1)[0]
+        budgeter.update(token, response(304, remaining=100, reset=NOW + 100))
+
+    assert clock.waits == []
+
+
+def test_tokens_are_rotated_when_bucket_is_empty(clock):
+    budgeter = GitHubBudgeter(['a', 'b'], logging.getLogger(), burst=2)
+    for token in ('a', 'b'):
+        budgeter.update(token, response(remaining=100, reset=NOW + 100))
+
+    assert sorted(acquire_many(budgeter, 4)) == ['a', 'a', 'b', 'b']
+    assert clock.waits == []
+
+
+def test_exhausted_tokens_are_parked_till_reset(clock):
+    budgeter = GitHubBudgeter(['a', 'b'], logging.getLogger())
+    budgeter.update('a', response(remaining=0, reset=NOW + 50))
+    budgeter.update('b', response(remaining=0, reset=NOW + 30))
+
+    assert acquire_many(budgeter, 1) == ['b']
+    assert clock.waits == [pytest.approx(30)]
+
+
+def test_retry_after_blocks_token(clock):
+    budgeter = GitHubBudgeter(['a', 'b'], logging.getLogger())
+
+    assert budgeter.update('a', response(429, **{'Retry-After': '20'})) is True
+    assert acquire_many(budgeter, 3) == ['b'] * 3
+    assert clock.waits == []
+
+    clock.now += 21
+    assert 'a' in acquire_many(budgeter, 2)
+
+
+def test_secondary_rate_limit_blocks_token(clock):
+    budgeter = GitHubBudgeter(['a'], logging.getLogger())
+    limited = httpx.Response(403, text='You have exceeded a secondary rate limit.')
+
+    assert budgeter.update('a', limited) is True
+    acquire_many(budgeter, 1)
+    assert clock.waits == [pytest.approx(github_budget.SECONDARY_LIMIT_WAIT)]
+
+
+def test_forbidden_answer_is_not_repeated(clock):
+    budgeter = GitHubBudgeter(['a'], logging.getLogger())
+
+    assert budgeter.update('a', httpx.Response(403, text='Resource not accessible.')) is False
+    acquire_many(budgeter, 1)
+    assert clock.waits == []
@@ -0,0 +1,85 @@
+"""
+Tests of resume and heartbeat of jobs by ingest.SubscriptionIngestor.
+Database is faked: querysets are replaced and sessions do nothing.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import ingest
+from ingest import SubscriptionIngestor
+
+
+class SessionMaker:
+    """
+    Fake maker of sessions, session is None.
+    """
+    def __call__(self):
+        return self.begin()
+
+    @asynccontextmanager
+    async def begin(self):
+        yield None
+
+
+def make_ingestor(monkeypatch):
+    monkeypatch.setenv('INGEST_HEARTBEAT_INTERVAL', '0')
+    return SubscriptionIngestor(SessionMaker(), None, logging.getLogger('test'))
+
+
+def test_resume_runs_claimed_jobs(monkeypatch):
+    ingestor = make_ingestor(monkeypatch)
+    claims = []
+    runs = []
+
+    async def claim_lost(session, alive_before, created_after, heartbeat_at, limit):
+        claims.append((heartbeat_at - alive_before, heartbeat_at - created_after, limit))
+        return [('job', 7, [('owner', 'repo')])]
+
+    async def run(job_id, user, repos):
+        runs.append((job_id, user, repos))
+
+    monkeypatch.setattr(ingest.IngestJobsQueryset, 'claim_lost', claim_lost)
+    monkeypatch.setattr(ingestor, 'run', run)
+
+    async def resume():
+        resumed = await ingestor.resume()
+        await asyncio.gather(*ingestor.tasks)
+        return resumed
+
+    assert asyncio.run(resume()) == ['job']
+    assert claims == [(ingestor.resume_after, ingestor.job_timeout, ingestor.resume_limit)]
+    assert runs == [('job', 7, [('owner', 'repo')])]
+
+
+def test_run_beats_until_job_ends(monkeypatch):
+    ingestor = make_ingestor(monkeypatch)
+    beats = []
+    statuses = []
+
+    async def beat(session, job_id, heartbeat_at):
+        beats.append(job_id)
+
+    async def set_status(session, job_id, status, finished_at=None):
+        statuses.append(status)
+
+    async def resolve(job_id, repos):
+        while len(beats) < 2:
+            await asyncio.sleep(0)
+        raise RuntimeError('GitHub is down')
+
+    monkeypatch.setattr(ingest.IngestJobsQueryset, 'beat', beat)
+    monkeypatch.setattr(ingest.IngestJobsQueryset, 'set_status', set_status)
+    monkeypatch.setattr(ingestor, 'resolve', resolve)
+
+    async def run():
+        await ingestor.run('job', 7, [('owner', 'repo')])
+        amount = len(beats)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return amount
+
+    amount = asyncio.run(run())
+    assert statuses == ['running', 'error']
+    assert amount >= 2
+    assert len(beats) == amount
@@ -0,0 +1,53 @@
+"""
+Tests of cursors of pages of subscriptions and of split of long messages of bot.
+"""
+import pytest
+
+from app import page_cursors
+from bot import split_message
+
+
+@pytest.mark.parametrize('ids, more, after, before, expected', [
+    # первая страница
+    ([1, 2, 3], True, None, None, {'next': 3, 'prev': None}),
+    ([1, 2], False, None, None, {'next': None, 'prev': None}),
+    # страница вперед: в середине списка и последняя
+    ([4, 5, 6], True, 3, None, {'next': 6, 'prev': 4}),
+    ([7, 8], False, 6, None, {'next': None, 'prev': 7}),
+    # страница назад: в середине списка и первая
+    ([4, 5, 6], True, None, 7, {'next': 6, 'prev': 4}),
+    ([1, 2, 3], False, None, 4, {'next': 3, 'prev': None}),
+    # пустые страницы
+    ([], False, None, None, {'next': None, 'prev': None}),
+    ([], False, 9, None, {'next': None, 'prev': None}),
+    ([], False, None, 1, {'next': None, 'prev': None}),
+])
+def test_page_cursors(ids, more, after, before, expected):
+    assert page_cursors(ids, more, after=after, before=before) == expected
+
+
+def test_short_message_is_not_split():
+    assert split_message('one\ntwo', limit=20) == ['one\ntwo']
+
+
+def test_message_is_split_by_lines():
+    lines = [f'line {idx}' for idx in range(10)]
+    messages = split_message('\n'.join(lines), limit=20)
+
+    assert all(len(message) <= 20 for message in messages)
+    assert '\n'.join(messages).split('\n') == lines
+    assert messages[0] == 'line 0\nline 1\nline 2'
+
+
+def test_line_of_limit_length_fits():
+    assert split_message('a' * 10 + '\n' + 'b' * 10, limit=10) == ['a' * 10, 'b' * 10]
+
+
+def test_too_long_line_is_cut():
+    messages = split_message('head\n' + 'x' * 25 + '\ntail', limit=10)
+
+    assert messages == ['head', 'x' * 10, 'x' * 10, 'x' * 5 + '\ntail']
+
+
+def test_empty_message():
+    assert split_message('') == ['']
@@ -0,0 +1,72 @@
+"""
+Module of processor of updates of Telegram Bot.
+Updates of different users are handled concurrently, updates of one user
+are handled one by one in order of arrival, so state of ConversationHandler
+of user is changed by one handler at a time.
+"""
+import os
+import logging
+from collections import deque
+from typing import Any, Awaitable, Dict, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Concurrent processor of updates with order of updates of every user.
+    Update of user with update in progress is queued and handled after it
+    in the same slot, so busy user takes one slot of max_concurrent_updates
+    and can't stall other users.
+    """
+    def __init__(self, max_concurrent_updates: int = None):
+        """
+        :param max_concurrent_updates: updates handled at once,
+                                       env BOT_CONCURRENT_UPDATES by default
+        """
+        if max_concurrent_updates is None:
+            max_concurrent_updates = int(os.environ.get('BOT_CONCURRENT_UPDATES', 32))
+        super().__init__(max_concurrent_updates)
+        self.queues: Dict[Tuple, deque] = {}
+
+    @staticmethod
+    def key(update: object) -> Tuple | None:
+        """
+        Key of conversation of update like key of ConversationHandler: chat and user.
+        None for updates without chat and user, they are handled without order.
+        """
+        if not isinstance(update, Update):
+            return None
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None and user is None:
+            return None
+        return chat.id if chat else None, user.id if user else None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.key(update)
+        if key is None:
+            await coroutine
+            return
+        queue = self.queues.get(key)
+        if queue is not None:
+            queue.append(coroutine)
+            return
+
+        self.queues[key] = queue = deque([coroutine])
+        try:
+            while queue:
+                try:
+                    await queue.popleft()
+                except Exception as e:
+                    logging.error('Wrong process update of %s with error: %s', key, e)
+        finally:
+            del self.queues[key]
+            for rest in queue:
+                rest.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass